@@ -0,0 +1,469 @@
+"""
+Coordinator for a crawl spread over several machines.
+
+The coordinator owns the prefix frontier, the license dedup set and the output files.
+Worker processes (worker.py), on this host or others, lease prefixes over HTTP, run the
+search and detail pages themselves, and post the outcome back:
+
+    POST /lease     {"worker", "count"}          -> {"leases": [{"prefix", "depth", "lease_id"}], "finished"}
+    POST /extend    {"lease_ids"}                -> {"held": [...]}       heartbeat for long prefixes
+    POST /release   {"lease_id"}                 -> put a prefix the worker could not finish back in the queue
+    POST /known     {"licenses"}                 -> {"known": [...]}      licenses not worth fetching again
+    POST /complete  {"lease_id", "prefix", "outcome", "total", "records"}
+    GET  /status
+
+Leases expire after `lease_seconds` without a heartbeat and are handed to the next
+worker that asks, up to `max_attempts` times. A completion is accepted only from the
+current lease holder, and its records, its children and the node's final state are
+committed in one SQLite transaction keyed by License_Number. A retried or stale
+completion therefore changes nothing. Records are exported to the sinks from that
+table and flagged once written, so every license reaches results.csv exactly once,
+even across a coordinator restart.
+
+Run `python coordinator.py --bench` to measure throughput with 1, 2 and 4 worker
+processes against fixture_server.py.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sqlite3
+import string
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from functools import partial
+
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+from crawlstate import DONE, EMPTY, IN_PROGRESS, PENDING
+from dedup import LicenseIndex
+from licensestore import STORE_FILE, LicenseStore
+from splitting import AdaptiveSplitter, PrefixPrior
+from writer import FIELDNAMES, ResultWriter, create_sinks
+
+logger = logging.getLogger(__name__)
+
+FAILED = 'failed'
+
+# Outcomes a worker reports for a prefix.
+OUTCOME_EMPTY = 'empty'
+OUTCOME_FEW = 'few'
+OUTCOME_MANY = 'many'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    prefix TEXT PRIMARY KEY,
+    depth INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    lease_id TEXT,
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS nodes_state ON nodes (state, depth);
+CREATE TABLE IF NOT EXISTS records (
+    record_key TEXT PRIMARY KEY,
+    prefix TEXT NOT NULL,
+    row TEXT NOT NULL,
+    exported INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS records_unexported ON records (exported) WHERE exported = 0;
+"""
+
+
+def record_key(row):
+    """
+    Dedup key of a results row: its license number, or the whole row if it has none.
+
+    Missing and None fields key as '', as they read back from the CSV, so a row keys the same
+    before and after it is written.
+    """
+    return row.get('License_Number') or '|'.join(str(row.get(name) or '') for name in FIELDNAMES)
+
+
+class ExportedRecords:
+    """
+    Record keys already present in the output CSV, for Coordinator.start.
+
+    Licensed records are looked up in the license index. Records without a license number are
+    keyed by the whole row, which the index cannot answer for, so the output is read once for
+    them, and only if such a record is actually checked.
+
+    :param licenses: LicenseIndex over the licenses already written.
+    :param output_file: Results CSV the rows without a license were written to.
+    """
+
+    def __init__(self, licenses, output_file):
+        self.licenses = licenses
+        self.output_file = output_file
+        self.unlicensed = None
+
+    def _unlicensed(self):
+        if self.unlicensed is None:
+            try:
+                with open(self.output_file, newline='', encoding='utf-8') as csvfile:
+                    self.unlicensed = {record_key(row) for row in csv.DictReader(csvfile)
+                                       if not row.get('License_Number')}
+            except FileNotFoundError:
+                self.unlicensed = set()
+        return self.unlicensed
+
+    def __contains__(self, key):
+        return key in self.licenses or key in self._unlicensed()
+
+
+class Coordinator:
+    """
+    Lease-based frontier and exactly-once result store shared by all workers.
+
+    :param path: SQLite database holding the frontier and every accepted record.
+    :param splitter: AdaptiveSplitter used to expand MANY prefixes and skip covered ones.
+    :param writer: ResultWriter the accepted records are exported through.
+    :param lease_seconds: How long a worker may hold a prefix without a heartbeat.
+    :param max_attempts: Leases per prefix before it is marked failed.
+    """
+
+    def __init__(self, path='results/coordinator.sqlite3', splitter=None, writer=None, lease_seconds=120,
+                 max_attempts=5):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.splitter = splitter or AdaptiveSplitter(string.ascii_uppercase)
+        self.writer = writer
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+
+    def _execute(self, sql, parameters=()):
+        with self.lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def unfinished(self):
+        return self._execute('SELECT COUNT(*) FROM nodes WHERE state IN (?, ?)', (PENDING, IN_PROGRESS))[0][0]
+
+    def recorded(self):
+        """Number of prefixes recorded by the last crawl, finished or not; 0 before the first crawl."""
+        return self._execute('SELECT COUNT(*) FROM nodes')[0][0]
+
+    def start(self, seeds, fresh=False, exported=()):
+        """
+        Seed a new crawl or resume the previous one.
+
+        :param exported: Record keys already present in the output, so records accepted but not yet
+            flagged as exported before a crash are not written twice.
+        """
+        with self.lock:
+            if fresh or not self.connection.execute(
+                    'SELECT 1 FROM nodes WHERE state IN (?, ?) LIMIT 1', (PENDING, IN_PROGRESS)).fetchall():
+                self.connection.execute('DELETE FROM nodes')
+                self.connection.execute('DELETE FROM records')
+            self.connection.executemany('INSERT OR IGNORE INTO nodes (prefix, depth, state, updated) VALUES (?, 0, ?, ?)',
+                                        [(seed, PENDING, time.time()) for seed in seeds])
+            unexported = self.connection.execute('SELECT record_key, row FROM records WHERE exported = 0').fetchall()
+        for key, row in unexported:
+            if key in exported:
+                self.mark_exported(key)
+            else:
+                self.writer.put(json.loads(row), partial(self.mark_exported, key))
+        logger.info(f"Coordinator has {self.unfinished()} unfinished prefixes, re-exporting {len(unexported)} records")
+
+    def lease(self, worker, count=1):
+        """Hand out up to count prefixes: pending ones first, then ones whose lease expired."""
+        now = time.time()
+        leases = []
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                while len(leases) < count:
+                    # Deepest first, like the local LIFO scheduler, so the frontier stays small; siblings
+                    # in insertion order, which is the splitter's most-likely-first order.
+                    candidates = self.connection.execute(
+                        'SELECT prefix, depth, attempts FROM nodes WHERE state = ? OR (state = ? AND lease_expires < ?) '
+                        'ORDER BY depth DESC, rowid LIMIT ?', (PENDING, IN_PROGRESS, now, count - len(leases))).fetchall()
+                    if not candidates:
+                        break
+                    for prefix, depth, attempts in candidates:
+                        if self.splitter.skip(prefix):
+                            self.connection.execute('UPDATE nodes SET state = ?, lease_id = NULL, updated = ? WHERE prefix = ?',
+                                                    (DONE, now, prefix))
+                        elif attempts >= self.max_attempts:
+                            logger.error(f"Giving up on prefix {prefix!r} after {attempts} leases")
+                            self.connection.execute('UPDATE nodes SET state = ?, lease_id = NULL, updated = ? WHERE prefix = ?',
+                                                    (FAILED, now, prefix))
+                        else:
+                            lease_id = uuid.uuid4().hex
+                            self.connection.execute(
+                                'UPDATE nodes SET state = ?, lease_id = ?, worker = ?, lease_expires = ?, '
+                                'attempts = attempts + 1, updated = ? WHERE prefix = ?',
+                                (IN_PROGRESS, lease_id, worker, now + self.lease_seconds, now, prefix))
+                            leases.append({'prefix': prefix, 'depth': depth, 'lease_id': lease_id})
+                self.connection.execute('COMMIT')
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+        return leases
+
+    def extend(self, lease_ids):
+        """Push back the expiry of leases the worker still holds; return the ones it still holds."""
+        held = []
+        expires = time.time() + self.lease_seconds
+        with self.lock:
+            for lease_id in lease_ids:
+                if self.connection.execute('UPDATE nodes SET lease_expires = ? WHERE lease_id = ? AND state = ?',
+                                           (expires, lease_id, IN_PROGRESS)).rowcount:
+                    held.append(lease_id)
+        return held
+
+    def release(self, lease_id):
+        """Give a prefix back without completing it, so the next worker can retry it right away."""
+        self._execute('UPDATE nodes SET state = ?, lease_id = NULL, lease_expires = NULL WHERE lease_id = ? AND state = ?',
+                      (PENDING, lease_id, IN_PROGRESS))
+
+    def known(self, licenses):
+        """The subset of licenses already accepted."""
+        licenses = [license for license in licenses if license]
+        known = []
+        with self.lock:
+            for start in range(0, len(licenses), 500):
+                chunk = licenses[start:start + 500]
+                known += [key for key, in self.connection.execute(
+                    f'SELECT record_key FROM records WHERE record_key IN ({",".join("?" * len(chunk))})', chunk)]
+        return known
+
+    def complete(self, lease_id, prefix, outcome, total=None, records=()):
+        """
+        Accept a worker's result for a leased prefix.
+
+        :return: 'ok' if applied, 'duplicate' if this lease was already completed (a retried request),
+            or 'lost' if the lease expired and the prefix now belongs to another worker.
+        """
+        now = time.time()
+        accepted = []
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                node = self.connection.execute('SELECT state, lease_id, depth FROM nodes WHERE prefix = ?', (prefix,)).fetchone()
+                if node is None:
+                    raise ValueError(f'Unknown prefix {prefix!r}')
+                state, current_lease, depth = node
+                if current_lease == lease_id and state in (DONE, EMPTY):
+                    self.connection.execute('COMMIT')
+                    return 'duplicate'
+                if current_lease != lease_id or state != IN_PROGRESS:
+                    self.connection.execute('COMMIT')
+                    return 'lost'
+
+                if outcome == OUTCOME_EMPTY:
+                    final = EMPTY
+                    self.splitter.observe(prefix, 0)
+                elif outcome == OUTCOME_FEW:
+                    final = DONE
+                    for row in records:
+                        key = record_key(row)
+                        if self.connection.execute('INSERT OR IGNORE INTO records VALUES (?, ?, ?, 0)',
+                                                   (key, prefix, json.dumps(row))).rowcount:
+                            accepted.append((key, row))
+                    self.splitter.observe(prefix, len(records))
+                elif outcome == OUTCOME_MANY:
+                    final = DONE
+                    self.splitter.observe(prefix, total)
+                    children = self.splitter.children(prefix, total)
+                    self.connection.executemany('INSERT OR IGNORE INTO nodes (prefix, depth, state, updated) VALUES (?, ?, ?, ?)',
+                                                [(child, depth + 1, PENDING, now) for child in children])
+                else:
+                    raise ValueError(f'Unknown outcome {outcome!r}')
+                # The lease id stays on the node so a retried completion is recognised as a duplicate.
+                self.connection.execute('UPDATE nodes SET state = ?, lease_expires = NULL, updated = ? WHERE prefix = ?',
+                                        (final, now, prefix))
+                self.connection.execute('COMMIT')
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+        for key, row in accepted:
+            self.splitter.note_license(row.get('License_Number'))
+            self.writer.put(row, partial(self.mark_exported, key))
+        return 'ok'
+
+    def mark_exported(self, key):
+        self._execute('UPDATE records SET exported = 1 WHERE record_key = ?', (key,))
+
+    def status(self):
+        with self.lock:
+            nodes = dict(self.connection.execute('SELECT state, COUNT(*) FROM nodes GROUP BY state').fetchall())
+            records, exported = self.connection.execute('SELECT COUNT(*), COALESCE(SUM(exported), 0) FROM records').fetchone()
+        return {'nodes': nodes, 'records': records, 'exported': exported,
+                'finished': not nodes.get(PENDING) and not nodes.get(IN_PROGRESS)}
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def create_app(coordinator):
+    """JSON API the workers talk to."""
+    app = Flask(__name__)
+
+    @app.post('/lease')
+    def lease():
+        payload = request.get_json()
+        leases = coordinator.lease(payload.get('worker', request.remote_addr), int(payload.get('count', 1)))
+        return jsonify(leases=leases, finished=not leases and coordinator.status()['finished'])
+
+    @app.post('/extend')
+    def extend():
+        return jsonify(held=coordinator.extend(request.get_json().get('lease_ids', [])))
+
+    @app.post('/release')
+    def release():
+        coordinator.release(request.get_json()['lease_id'])
+        return jsonify(status='ok')
+
+    @app.post('/known')
+    def known():
+        return jsonify(known=coordinator.known(request.get_json().get('licenses', [])))
+
+    @app.post('/complete')
+    def complete():
+        payload = request.get_json()
+        try:
+            result = coordinator.complete(payload['lease_id'], payload['prefix'], payload['outcome'],
+                                          payload.get('total'), payload.get('records', []))
+        except (KeyError, ValueError) as e:
+            return jsonify(error=str(e)), 400
+        return jsonify(status=result), 409 if result == 'lost' else 200
+
+    @app.get('/status')
+    def status():
+        return jsonify(coordinator.status())
+
+    return app
+
+
+def prepare_output(output_file):
+    """Write the CSV header, truncating any previous results (as TexasLicenseeCrawler.prepare_output does)."""
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
+        csvfile.write(','.join(FIELDNAMES) + '\r\n')
+
+
+def serve(args):
+    seeds = args.seeds or [letter for letter in 'BCTUVWXYZ']
+    store = LicenseStore(args.store)
+    store.adopt_csv(args.output)
+    prior = PrefixPrior.from_state(args.prior)
+    splitter = AdaptiveSplitter(string.ascii_uppercase, prior)
+    coordinator = Coordinator(args.db, splitter, lease_seconds=args.lease_seconds, max_attempts=args.max_attempts)
+    # As in the single-process crawler, a finished crawl's results are only discarded with --fresh.
+    if not args.fresh and coordinator.recorded() and not coordinator.unfinished():
+        logger.warning(f"The previous crawl is finished; its results stay in {args.output}. Pass --fresh to crawl again")
+        coordinator.close()
+        store.close()
+        return
+    resuming = not args.fresh and coordinator.unfinished()
+    if not resuming:
+        prepare_output(args.output)
+        store.clear()
+    licenses = LicenseIndex(store)
+    licenses.seed_from_csv(args.output)
+    coordinator.writer = ResultWriter(create_sinks(args.output_format, args.output, store))
+    coordinator.start(seeds, fresh=not resuming, exported=ExportedRecords(licenses, args.output))
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server(args.host, args.port, create_app(coordinator), threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name='coordinator-http', daemon=True)
+    thread.start()
+    logger.info(f"Coordinator listening on http://{args.host}:{server.server_port}")
+    start = time.perf_counter()
+    try:
+        while not coordinator.status()['finished']:
+            time.sleep(1)
+        # Give polling workers a moment to hear that the crawl is finished.
+        time.sleep(args.linger)
+    finally:
+        server.shutdown()
+        coordinator.writer.close()
+        status = coordinator.status()
+        coordinator.close()
+        store.close()
+    logger.info(f"Crawl finished in {time.perf_counter() - start:.1f}s: {status}")
+    logger.info(splitter.summary())
+
+
+def benchmark(worker_counts=(1, 2, 4), count=3000, latency=0.05, threads=1):
+    """Crawl the same fixture with 1, 2 and 4 worker processes and report records per second."""
+    from fixture_server import FixtureServer, create_app, generate_licensees
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    licensees = generate_licensees(count, seed=1)
+    baseline = None
+    with FixtureServer(create_app(licensees, latency)) as fixture:
+        for workers in worker_counts:
+            with tempfile.TemporaryDirectory() as directory:
+                output = os.path.join(directory, 'results.csv')
+                coordinator = subprocess.Popen(
+                    [sys.executable, os.path.join(here, 'coordinator.py'), '--port', '0', '--fresh', '--linger', '3',
+                     '--db', os.path.join(directory, 'coordinator.sqlite3'), '--output', output],
+                    stderr=subprocess.PIPE, text=True, cwd=directory)
+                url = None
+                for line in coordinator.stderr:
+                    if 'listening on' in line:
+                        url = line.rsplit(' ', 1)[-1].strip()
+                        break
+                # Keep draining the log so the coordinator never blocks on a full pipe.
+                drain = threading.Thread(target=coordinator.stderr.read, daemon=True)
+                drain.start()
+                start = time.perf_counter()
+                processes = [subprocess.Popen(
+                    [sys.executable, os.path.join(here, 'worker.py'), '--coordinator', url, '--base-url', fixture.base_url,
+                     '--rate', '0', '--threads', str(threads), '--name', f'bench-{i}'],
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=directory) for i in range(workers)]
+                for process in processes:
+                    process.wait()
+                elapsed = time.perf_counter() - start
+                coordinator.wait()
+                drain.join()
+                with open(output, newline='', encoding='utf-8') as file:
+                    rows = [row['License_Number'] for row in csv.DictReader(file)]
+                duplicates = len(rows) - len(set(rows))
+                baseline = baseline or elapsed
+                print(f'{workers} worker process(es): {len(rows)} records in {elapsed:6.1f}s, '
+                      f'{len(rows) / elapsed:6.1f} records/s, speedup {baseline / elapsed:4.2f}x, {duplicates} duplicates')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Coordinate a crawl across worker processes (see worker.py).')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5050, help='0 picks a free port')
+    parser.add_argument('--db', default='results/coordinator.sqlite3', help='frontier and record store')
+    parser.add_argument('--output', default='results/results.csv')
+    parser.add_argument('--store', default=STORE_FILE, help='indexed licensee store kept alongside --output')
+    parser.add_argument('--output-format', nargs='+', choices=['csv', 'parquet', 'sqlite'], default=['csv'])
+    parser.add_argument('--seeds', nargs='+', default=None, help='top-level prefixes (default: the crawler\'s letters)')
+    parser.add_argument('--prior', default='results/crawl_state.sqlite3',
+                        help='crawl state database whose recorded result counts order child prefixes')
+    parser.add_argument('--lease-seconds', type=float, default=120, help='lease lifetime without a heartbeat')
+    parser.add_argument('--max-attempts', type=int, default=5, help='leases per prefix before giving up on it')
+    parser.add_argument('--fresh', action='store_true', help='discard the previous crawl and its results; without it an unfinished crawl is resumed and a finished one left alone')
+    parser.add_argument('--linger', type=float, default=10, help='seconds to keep serving after the crawl finishes')
+    parser.add_argument('--bench', action='store_true', help='measure scaling with 1, 2 and 4 local workers')
+    parser.add_argument('--bench-count', type=int, default=3000, help='synthetic licensees in the benchmark fixture')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.bench:
+        benchmark(count=args.bench_count)
+    else:
+        serve(args)
+
+
+if __name__ == '__main__':
+    main()
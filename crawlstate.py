@@ -0,0 +1,190 @@
+"""
+Durable state of the prefix crawl, so an interrupted run resumes where it stopped.
+
+Every prefix node is recorded in SQLite (WAL mode) as pending, in_progress, done or
+empty. Expanding a "MANY" prefix inserts its children and closes the parent in one
+transaction, and every detail row scraped under a prefix is recorded as it is saved,
+so a restart re-queues exactly the unfinished nodes and skips rows already captured.
+
+Each search's listing is also kept: the result count, a hash of the row texts and, for
+short lists, the rows with their license numbers. refresh.py compares the next run's
+listings against these to find the prefixes that changed.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+IN_PROGRESS = 'in_progress'
+DONE = 'done'
+EMPTY = 'empty'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    prefix TEXT PRIMARY KEY,
+    depth INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS nodes_state ON nodes (state);
+CREATE TABLE IF NOT EXISTS captured (
+    prefix TEXT NOT NULL,
+    row_key TEXT NOT NULL,
+    PRIMARY KEY (prefix, row_key)
+);
+CREATE TABLE IF NOT EXISTS listings (
+    prefix TEXT PRIMARY KEY,
+    depth INTEGER NOT NULL,
+    total INTEGER,
+    count INTEGER NOT NULL,
+    row_hash TEXT,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS listing_rows (
+    prefix TEXT NOT NULL,
+    row_key TEXT NOT NULL,
+    license TEXT,
+    PRIMARY KEY (prefix, row_key)
+);
+"""
+
+
+def row_hash(row_keys):
+    """Order-independent fingerprint of a results grid."""
+    return hashlib.sha1('\n'.join(sorted(row_keys)).encode('utf-8')).hexdigest()
+
+
+class CrawlState:
+    """
+    SQLite-backed crawl frontier shared by all crawler workers.
+
+    :param path: Database file, e.g. results/crawl_state.sqlite3.
+    """
+
+    def __init__(self, path='results/crawl_state.sqlite3'):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+
+    def _execute(self, sql, parameters=()):
+        with self.lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def unfinished(self):
+        """Number of nodes that still need work."""
+        return self._execute('SELECT COUNT(*) FROM nodes WHERE state IN (?, ?)', (PENDING, IN_PROGRESS))[0][0]
+
+    def recorded(self):
+        """Number of nodes recorded by the last crawl, finished or not; 0 before the first crawl."""
+        return self._execute('SELECT COUNT(*) FROM nodes')[0][0]
+
+    def progress(self):
+        """Node counts per first letter (the seed bucket) and state, e.g. {'B': {'done': 40, 'pending': 3}}."""
+        buckets = {}
+        for bucket, state, count in self._execute(
+                'SELECT substr(prefix, 1, 1), state, COUNT(*) FROM nodes GROUP BY 1, 2'):
+            buckets.setdefault(bucket, {})[state] = count
+        return buckets
+
+    def reset(self):
+        """Forget all progress, e.g. before a fresh crawl."""
+        with self.lock:
+            self.connection.execute('DELETE FROM nodes')
+            self.connection.execute('DELETE FROM captured')
+            self.connection.execute('DELETE FROM listings')
+            self.connection.execute('DELETE FROM listing_rows')
+
+    def frontier(self, seeds):
+        """
+        Return the (prefix, depth) nodes to work on, seeding the store on first use.
+
+        Nodes left in_progress by a crashed run go back to pending.
+        """
+        now = time.time()
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            self.connection.execute('UPDATE nodes SET state = ? WHERE state = ?', (PENDING, IN_PROGRESS))
+            self.connection.executemany('INSERT OR IGNORE INTO nodes VALUES (?, 0, ?, ?)',
+                                        [(seed, PENDING, now) for seed in seeds])
+            self.connection.execute('COMMIT')
+            rows = self.connection.execute('SELECT prefix, depth FROM nodes WHERE state = ? ORDER BY depth, prefix',
+                                           (PENDING,)).fetchall()
+        logger.info(f"Crawl frontier has {len(rows)} pending prefixes")
+        return rows
+
+    def start(self, prefix, depth=0):
+        self._execute('INSERT INTO nodes VALUES (?, ?, ?, ?) ON CONFLICT (prefix) DO UPDATE SET state = excluded.state, updated = excluded.updated',
+                      (prefix, depth, IN_PROGRESS, time.time()))
+
+    def finish(self, prefix, state=DONE):
+        self._execute('UPDATE nodes SET state = ?, updated = ? WHERE prefix = ?', (state, time.time(), prefix))
+
+    def expand(self, prefix, children, depth):
+        """Queue a MANY prefix's children and close the prefix in a single transaction."""
+        now = time.time()
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            self.connection.executemany('INSERT OR IGNORE INTO nodes VALUES (?, ?, ?, ?)',
+                                        [(child, depth, PENDING, now) for child in children])
+            self.connection.execute('UPDATE nodes SET state = ?, updated = ? WHERE prefix = ?', (DONE, now, prefix))
+            self.connection.execute('COMMIT')
+
+    def is_captured(self, prefix, row_key):
+        return bool(self._execute('SELECT 1 FROM captured WHERE prefix = ? AND row_key = ?', (prefix, row_key)))
+
+    def capture(self, prefix, row_key):
+        """Record that a detail row under prefix has been saved."""
+        self._execute('INSERT OR IGNORE INTO captured VALUES (?, ?)', (prefix, row_key))
+
+    def record_listing(self, prefix, depth, total, rows=None, page=None):
+        """
+        Remember what a search for prefix returned.
+
+        :param total: Result count the page reported (the row count for short lists, 0 when empty).
+        :param rows: (row_key, license) for every row of a short or empty list; None for MANY. A short
+            or empty list also drops the listings recorded under prefix by earlier, deeper searches.
+        :param page: Row keys of the first page shown for a MANY result. Only their hash is kept, so a
+            refresh can tell that rows changed under an unchanged total.
+        """
+        many = rows is None
+        rows = list(rows or ())
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            if many:
+                self.connection.execute('DELETE FROM listing_rows WHERE prefix = ?', (prefix,))
+            else:
+                self.connection.execute('DELETE FROM listings WHERE substr(prefix, 1, ?) = ?', (len(prefix), prefix))
+                self.connection.execute('DELETE FROM listing_rows WHERE substr(prefix, 1, ?) = ?', (len(prefix), prefix))
+            self.connection.execute('INSERT OR REPLACE INTO listings VALUES (?, ?, ?, ?, ?, ?)',
+                                    (prefix, depth, total, len(rows),
+                                     row_hash(key for key, _ in rows) if rows else
+                                     row_hash(page) if many and page else None, time.time()))
+            self.connection.executemany('INSERT OR REPLACE INTO listing_rows VALUES (?, ?, ?)',
+                                        [(prefix, key, license) for key, license in rows])
+            self.connection.execute('COMMIT')
+
+    def note_license(self, prefix, row_key, license):
+        """Attach the license number read from a detail page to its listing row."""
+        self._execute('UPDATE listing_rows SET license = ? WHERE prefix = ? AND row_key = ?', (license, prefix, row_key))
+
+    def listings(self):
+        """{prefix: (depth, total, count, row_hash)} for every recorded search."""
+        return {prefix: tuple(values) for prefix, *values in
+                self._execute('SELECT prefix, depth, total, count, row_hash FROM listings')}
+
+    def listing_rows(self):
+        """(prefix, row_key, license) for every recorded short-list row."""
+        return self._execute('SELECT prefix, row_key, license FROM listing_rows')
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,213 @@
+"""
+License-number deduplication for the crawl.
+
+Overlapping prefixes reach the same physician many times. LicenseIndex remembers every
+License_Number already written (seeded from the existing output, or looked up in the
+licensee store that holds it) and every results-grid row already opened, so the crawler
+can skip the detail fetch entirely and never write the same license twice.
+
+compact_csv() removes duplicates from an existing results file in bounded memory: rows
+are hash-partitioned by key into temporary files small enough to dedup one at a time,
+and the survivors are merged back in their original order.
+
+Usage:
+python dedup.py results/results.csv
+python dedup.py --bench 5000000
+"""
+import argparse
+import csv
+import heapq
+import logging
+import os
+import random
+import resource
+import tempfile
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+class LicenseIndex:
+    """
+    Thread-safe set of scraped License_Numbers and results-grid row keys, with hit/miss counters.
+
+    :param store: LicenseStore holding the licenses written by earlier runs. They are looked up
+        in its index instead of being loaded into memory; only this run's licenses are kept here.
+    """
+
+    def __init__(self, store=None):
+        self.store = store
+        self.licenses = set()
+        self.row_keys = set()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def seed_from_csv(self, path, column='License_Number'):
+        """Add every license number already present in a results CSV (with a store: fill it if it is empty)."""
+        if self.store is not None:
+            self.store.adopt_csv(path)
+            logger.info(f"License index backed by {self.store.path} with {len(self.store)} licenses")
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as csvfile:
+                licenses = {row[column] for row in csv.DictReader(csvfile) if row.get(column)}
+        except FileNotFoundError:
+            licenses = set()
+        with self.lock:
+            self.licenses.update(licenses)
+        logger.info(f"License index seeded with {len(licenses)} licenses from {path}")
+
+    def seen(self, row_key, license=None):
+        """True if this results-grid row, or the license it shows, was already scraped."""
+        with self.lock:
+            if row_key in self.row_keys or (license and self._known(license)):
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    def claim(self, license):
+        """Record license as written. Returns True if it had already been written, i.e. this is a duplicate."""
+        if not license:
+            return False
+        with self.lock:
+            if self._known(license):
+                return True
+            self.licenses.add(license)
+            return False
+
+    def _known(self, license):
+        # Lock held. This run's licenses may not have reached the store yet, so both are checked.
+        return license in self.licenses or (self.store is not None and self.store.has_license(license))
+
+    def add(self, license=None, row_key=None):
+        with self.lock:
+            if license:
+                self.licenses.add(license)
+            if row_key:
+                self.row_keys.add(row_key)
+
+    def __contains__(self, license):
+        with self.lock:
+            return self._known(license)
+
+    def summary(self):
+        with self.lock:
+            return f"License index: {self.hits} detail fetches skipped, {self.misses} fetched, {len(self.licenses)} licenses"
+
+
+def _row_key(values, key_index):
+    # Rows without the key can only be matched as a whole, like the old all-columns dedup.
+    if key_index is not None and values[key_index]:
+        return values[key_index]
+    return '\x1f'.join(values)
+
+
+def _read_indexed(path):
+    with open(path, 'r', newline='', encoding='utf-8') as partition:
+        for record in csv.reader(partition):
+            yield int(record[0]), record[1:]
+
+
+def compact_csv(path, key='License_Number', partition_bytes=64 * 1024 * 1024, output=None):
+    """
+    Remove rows whose key was already seen, keeping the first occurrence and the original order.
+
+    Memory use is bounded by partition_bytes rather than by the size of the file.
+
+    :param path: CSV file with a header row.
+    :param key: Column identifying a record.
+    :param partition_bytes: Approximate size of each in-memory partition.
+    :param output: Where to write the result; path itself is replaced atomically if omitted.
+    :return: Number of duplicate rows removed.
+    """
+    size = os.path.getsize(path)
+    partitions = max(1, -(-size // partition_bytes))
+    directory = os.path.dirname(os.path.abspath(output or path))
+
+    with tempfile.TemporaryDirectory(dir=directory) as workdir:
+        # Pass 1: spread rows over partitions by key hash, tagging each with its position.
+        with open(path, 'r', newline='', encoding='utf-8') as csvfile:
+            reader = csv.reader(csvfile)
+            fieldnames = next(reader, [])
+            key_index = fieldnames.index(key) if key in fieldnames else None
+            files = [open(os.path.join(workdir, f'part{i}.csv'), 'w', newline='', encoding='utf-8')
+                     for i in range(partitions)]
+            writers = [csv.writer(file) for file in files]
+            for position, values in enumerate(reader):
+                bucket = zlib.crc32(_row_key(values, key_index).encode('utf-8')) % partitions if partitions > 1 else 0
+                writers[bucket].writerow([position] + values)
+            for file in files:
+                file.close()
+
+        # Pass 2: dedup each partition on its own; positions stay ascending within it.
+        duplicates = 0
+        for i in range(partitions):
+            part_path = os.path.join(workdir, f'part{i}.csv')
+            seen = set()
+            with open(part_path + '.unique', 'w', newline='', encoding='utf-8') as unique:
+                writer = csv.writer(unique)
+                for position, values in _read_indexed(part_path):
+                    row_key = _row_key(values, key_index)
+                    if row_key in seen:
+                        duplicates += 1
+                        continue
+                    seen.add(row_key)
+                    writer.writerow([position] + values)
+            os.remove(part_path)
+
+        # Pass 3: merge the partitions back into original row order.
+        target = tempfile.NamedTemporaryFile('w', dir=directory, delete=False, newline='', encoding='utf-8')
+        with target:
+            writer = csv.writer(target)
+            writer.writerow(fieldnames)
+            streams = [_read_indexed(os.path.join(workdir, f'part{i}.csv.unique')) for i in range(partitions)]
+            for _, values in heapq.merge(*streams, key=lambda item: item[0]):
+                writer.writerow(values)
+            target.flush()
+            os.fsync(target.fileno())
+        os.replace(target.name, output or path)
+
+    logger.info(f"Duplicates found: {duplicates}")
+    return duplicates
+
+
+def benchmark(rows=5000000, duplicate_ratio=0.2, partition_bytes=64 * 1024 * 1024):
+    """Compact a synthetic results file and report time and peak RSS."""
+    rng = random.Random(0)
+    fieldnames = ["Full_Name", "License_Type", "License_Number", "Status", "Professional", "Issued", "Expired"]
+    unique = int(rows * (1 - duplicate_ratio))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'results.csv')
+        with open(path, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(fieldnames)
+            for i in range(rows):
+                n = i if i < unique else rng.randrange(unique)
+                writer.writerow([f'NAME{n}SURNAME', 'MD', f'M{n:07d}', 'Active', 'Physician and Surgeon',
+                                 '01/01/2000', '12/31/2026'])
+        size = os.path.getsize(path)
+        start = time.perf_counter()
+        removed = compact_csv(path, partition_bytes=partition_bytes)
+        elapsed = time.perf_counter() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"{rows} rows ({size / 2 ** 20:.0f} MiB): removed {removed} duplicates in {elapsed:.1f}s, "
+              f"peak RSS {peak:.0f} MiB")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Remove duplicate licensees from a results CSV in bounded memory.')
+    parser.add_argument('path', nargs='?', default='results/results.csv')
+    parser.add_argument('--key', default='License_Number', help='column identifying a record')
+    parser.add_argument('--partition-mb', type=int, default=64, help='approximate memory per partition')
+    parser.add_argument('--output', default=None, help='write here instead of replacing the input')
+    parser.add_argument('--bench', type=int, metavar='ROWS', help='benchmark on a synthetic file of ROWS rows')
+    args = parser.parse_args()
+    if args.bench:
+        benchmark(args.bench, partition_bytes=args.partition_mb * 1024 * 1024)
+    else:
+        compact_csv(args.path, args.key, args.partition_mb * 1024 * 1024, args.output)
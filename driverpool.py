@@ -0,0 +1,186 @@
+"""
+Pool of warm, health-checked Chrome sessions shared by the crawler workers.
+
+The chromedriver binary is resolved once per pool, and up to `size` headless browsers
+are kept alive and leased to whichever worker needs one. A browser goes back into
+rotation on release unless it has served too many leases, grown past the memory
+ceiling, or stopped answering a readyState probe. In that case it is quit and replaced
+transparently. Images, stylesheets and fonts are blocked through Chrome prefs to cut
+page weight.
+
+Requirements:
+pip install undetected-chromedriver webdriver-manager psutil
+"""
+import logging
+import queue
+import threading
+import time
+
+import undetected_chromedriver as uc
+from selenium.common.exceptions import WebDriverException
+from webdriver_manager.chrome import ChromeDriverManager
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+BLOCKED_CONTENT_PREFS = {
+    'profile.managed_default_content_settings.images': 2,
+    'profile.managed_default_content_settings.stylesheets': 2,
+    'profile.managed_default_content_settings.fonts': 2,
+}
+
+
+def chrome_options():
+    """The crawler's Chrome flags, plus prefs that block images, CSS and fonts."""
+    options = uc.ChromeOptions()
+    options.add_argument("--disable-extensions")
+    options.add_argument("--disable-popup-blocking")
+    options.add_argument("--ignore-certificate-errors")
+    options.add_argument("--disable-plugins-discovery")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_experimental_option('prefs', BLOCKED_CONTENT_PREFS)
+    return options
+
+
+def browser_rss_mb(driver):
+    """Resident memory of a browser and all its child processes, in MiB (None without psutil)."""
+    if psutil is None:
+        return None
+    pid = getattr(driver, 'browser_pid', None)
+    try:
+        process = psutil.Process(pid)
+        processes = [process] + process.children(recursive=True)
+        return sum(p.memory_info().rss for p in processes) / 2 ** 20
+    except (psutil.Error, TypeError, ValueError):
+        return None
+
+
+class DriverPool:
+    """
+    Lease headless Chrome sessions to workers.
+
+    :param size: Maximum number of browsers alive at once.
+    :param prewarm: Start all browsers up front instead of on first lease.
+    :param max_leases: Recycle a browser after serving this many leases.
+    :param max_rss_mb: Recycle a browser whose processes use more memory than this.
+    :param probe_timeout: Seconds a readyState probe may take before the browser counts as hung.
+    """
+
+    def __init__(self, size, prewarm=True, max_leases=200, max_rss_mb=1024, probe_timeout=10):
+        self.size = size
+        self.max_leases = max_leases
+        self.max_rss_mb = max_rss_mb
+        self.probe_timeout = probe_timeout
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+        self.created = 0
+        self.leases = {}  # id(driver) -> number of times leased
+        self.restarts = 0
+        self.driver_path = None
+        if prewarm:
+            start = time.perf_counter()
+            for _ in range(size):
+                self._reserve()
+                self.idle.put(self._start())
+            logger.info(f"Driver pool warmed {size} browsers in {time.perf_counter() - start:.1f}s, "
+                        f"{self.rss_summary()}")
+
+    def _reserve(self):
+        """Take one of the `size` browser slots if one is free; check and take in one step so callers never overshoot."""
+        with self.lock:
+            if self.created >= self.size:
+                return False
+            self.created += 1
+            return True
+
+    def _start(self):
+        """Launch a browser into a slot the caller reserved; the slot is given back if the launch fails."""
+        try:
+            with self.lock:
+                if self.driver_path is None:
+                    self.driver_path = ChromeDriverManager().install()
+            driver = uc.Chrome(options=chrome_options(), headless=True, driver_executable_path=self.driver_path)
+        except BaseException:
+            with self.lock:
+                self.created -= 1
+            raise
+        try:
+            driver.set_page_load_timeout(60)
+        except BaseException:
+            self._quit(driver)
+            raise
+        with self.lock:
+            self.leases[id(driver)] = 0
+        return driver
+
+    def _quit(self, driver):
+        with self.lock:
+            self.leases.pop(id(driver), None)
+            self.created -= 1
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def healthy(self, driver):
+        """readyState probe, lease count and memory ceiling."""
+        with self.lock:
+            leases = self.leases.get(id(driver), 0)
+        if leases >= self.max_leases:
+            return False
+        try:
+            driver.set_script_timeout(self.probe_timeout)
+            if driver.execute_script('return document.readyState') is None:
+                return False
+        except WebDriverException:
+            return False
+        rss = browser_rss_mb(driver)
+        return rss is None or rss <= self.max_rss_mb
+
+    def acquire(self):
+        """Lease a healthy browser, starting or replacing one if needed. Blocks while all are busy."""
+        while True:
+            try:
+                driver = self.idle.get_nowait()
+            except queue.Empty:
+                if self._reserve():
+                    driver = self._start()
+                else:
+                    try:
+                        driver = self.idle.get(timeout=1)
+                    except queue.Empty:
+                        # Wake up now and then: a failed launch or a recycle elsewhere may have freed a slot.
+                        continue
+            if self.healthy(driver):
+                with self.lock:
+                    self.leases[id(driver)] += 1
+                return driver
+            logger.warning("Recycling unhealthy browser session")
+            self.restarts += 1
+            self._quit(driver)
+
+    def release(self, driver):
+        """Return a leased browser to the pool."""
+        self.idle.put(driver)
+
+    def rss_summary(self):
+        """Total and per-browser RSS of the idle browsers, for startup and steady-state reports."""
+        drivers = list(self.idle.queue)
+        sizes = [rss for rss in (browser_rss_mb(driver) for driver in drivers) if rss is not None]
+        if not sizes:
+            return "RSS unavailable"
+        return f"RSS {sum(sizes):.0f} MiB total, {sum(sizes) / len(sizes):.0f} MiB per browser"
+
+    def close(self):
+        logger.info(f"Driver pool closing: {self.restarts} restarts, {self.rss_summary()}")
+        while True:
+            try:
+                self._quit(self.idle.get_nowait())
+            except queue.Empty:
+                break
@@ -0,0 +1,140 @@
+"""
+In-memory index of prefixes that no longer need searching.
+
+A prefix lands here once it came back EMPTY or its full result list was scraped, so
+any longer prefix that starts with it is already covered. The index is loaded once
+from excep/searcher.json, new prefixes are appended to a line-per-prefix journal next
+to it, and the journal is folded back into the JSON snapshot once it has grown by
+`compact_every` entries or half the index, whichever is larger, and on close. Scaling
+the threshold with the index keeps the amortized append cost flat.
+
+Run `python exclusion.py` for a lookup/append benchmark.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ExclusionIndex:
+    """
+    Thread-safe set of finished prefixes with O(len(prefix)) ancestor lookups.
+
+    :param path: JSON snapshot (a list of prefixes), e.g. excep/searcher.json.
+    :param compact_every: Minimum journal appends between snapshot rewrites.
+    """
+
+    def __init__(self, path='excep/searcher.json', compact_every=1000):
+        self.path = path
+        self.journal_path = path + '.journal'
+        self.compact_every = compact_every
+        self.prefixes = set()
+        self.lock = threading.Lock()
+        self.pending = 0
+        self._load()
+        self.journal = open(self.journal_path, 'a', encoding='utf-8')
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            self.prefixes.update(data if isinstance(data, list) else [data])
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        except json.JSONDecodeError as e:
+            logger.error(f"Could not parse {self.path}: {e}")
+            raise
+
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as journal:
+                for line in journal:
+                    # A crash mid-write can leave a partial last line without its newline; drop it.
+                    if line.endswith('\n'):
+                        self.prefixes.add(line[:-1])
+                        self.pending += 1
+        except FileNotFoundError:
+            pass
+        logger.info(f"Loaded {len(self.prefixes)} finished prefixes ({self.pending} from journal)")
+
+    def __len__(self):
+        return len(self.prefixes)
+
+    def covers(self, prefix):
+        """True if prefix or any of its ancestors is already finished."""
+        prefixes = self.prefixes
+        return any(prefix[:length] in prefixes for length in range(1, len(prefix) + 1))
+
+    def add(self, prefix):
+        """Mark prefix finished and append it to the journal."""
+        with self.lock:
+            if prefix in self.prefixes:
+                return
+            self.prefixes.add(prefix)
+            self.journal.write(prefix + '\n')
+            self.journal.flush()
+            self.pending += 1
+            if self.pending >= max(self.compact_every, len(self.prefixes) // 2):
+                self._compact()
+
+    def clear(self):
+        """Forget every finished prefix, e.g. before a fresh crawl."""
+        with self.lock:
+            self.prefixes.clear()
+            self._compact()
+
+    def compact(self):
+        """Fold the journal into the JSON snapshot."""
+        with self.lock:
+            self._compact()
+
+    def _compact(self):
+        directory = os.path.dirname(self.path) or '.'
+        with tempfile.NamedTemporaryFile('w', dir=directory, delete=False, encoding='utf-8') as snapshot:
+            json.dump(sorted(self.prefixes), snapshot, indent=4)
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(snapshot.name, self.path)
+        # Only truncate once the snapshot holding every journaled prefix is in place.
+        self.journal.close()
+        self.journal = open(self.journal_path, 'w', encoding='utf-8')
+        self.pending = 0
+
+    def close(self):
+        with self.lock:
+            if self.pending:
+                self._compact()
+            self.journal.close()
+
+
+def benchmark(sizes=(1000, 10000, 100000), lookups=100000):
+    """Print per-operation lookup and append cost as the index grows."""
+    import random
+    import string
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        index = ExclusionIndex(os.path.join(directory, 'searcher.json'))
+        for size in sizes:
+            start = time.perf_counter()
+            added = 0
+            while len(index) < size:
+                index.add(''.join(rng.choices(string.ascii_uppercase, k=rng.randint(3, 8))))
+                added += 1
+            append_cost = (time.perf_counter() - start) / max(added, 1)
+
+            queries = [''.join(rng.choices(string.ascii_uppercase, k=rng.randint(3, 10))) for _ in range(lookups)]
+            start = time.perf_counter()
+            for query in queries:
+                index.covers(query)
+            lookup_cost = (time.perf_counter() - start) / lookups
+            print(f"{size:>7} entries: append {append_cost * 1e6:6.2f} us, lookup {lookup_cost * 1e6:6.2f} us")
+        index.close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    benchmark()
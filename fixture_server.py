@@ -0,0 +1,231 @@
+"""
+Local stand-in for the Texas Medical Board Search.aspx postback flow.
+
+Serves a synthetic licensee population through the same page structure the crawler
+expects (hidden __VIEWSTATE/__EVENTVALIDATION fields, a results grid of __doPostBack
+links capped at 50 rows, and detail pages laid out like the live site), so the
+crawler can be exercised without touching profile.tmb.state.tx.us.
+
+Usage:
+python fixture_server.py --port 8000 --count 5000
+"""
+import argparse
+import random
+import secrets
+import string
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+from flask import Flask, abort, request
+from werkzeug.serving import make_server
+
+GRID_TARGET = 'ctl00$BodyContent$gvSearchResults'
+MAX_RESULTS = 50
+LETTER_WEIGHTS = {letter: weight for letter, weight in zip(
+    string.ascii_uppercase,
+    [8, 2, 3, 4, 11, 2, 2, 3, 7, 1, 1, 5, 3, 6, 7, 2, 1, 6, 6, 7, 3, 1, 2, 1, 2, 1])}
+STATUSES = ['Active', 'Inactive', 'Cancelled', 'Expired', 'Retired']
+
+
+def generate_licensees(count=5000, seed=0):
+    """Build a deterministic population of fake licensees with skewed name prefixes."""
+    rng = random.Random(seed)
+    letters, weights = zip(*LETTER_WEIGHTS.items())
+    licensees = []
+    for index in range(count):
+        first = ''.join(rng.choices(letters, weights, k=rng.randint(3, 9)))
+        last = ''.join(rng.choices(letters, weights, k=rng.randint(4, 10)))
+        kind = rng.choice(['MD', 'MD', 'MD', 'DO'])
+        issued_year = rng.randint(1970, 2024)
+        licensees.append({
+            'first': first,
+            'name': f'{first} {last}, {kind}',
+            'license': f'{rng.choice("ABCDEGHJKLMNPQ")}{index:05d}',
+            'status': rng.choice(STATUSES),
+            'professional': 'Osteopathic Physician and Surgeon' if kind == 'DO' else 'Physician and Surgeon',
+            'issued': f'{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/{issued_year}',
+            'expired': f'{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/{rng.randint(max(issued_year, 2020), 2028)}',
+        })
+    return licensees
+
+
+def churn_licensees(licensees, fraction=0.01, seed=1, today=None):
+    """
+    A later snapshot of the same population, for exercising refresh runs.
+
+    About `fraction` of the licensees are removed and as many new ones added, and Active
+    licenses whose Expires date is past or within 30 days are renewed or lapse.
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    changed = [dict(row) for row in licensees if rng.random() >= fraction]
+    for row in changed:
+        expires = datetime.strptime(row['expired'], '%m/%d/%Y').date()
+        if row['status'] == 'Active' and expires <= today + timedelta(days=30) and rng.random() < 0.5:
+            if rng.random() < 0.7:
+                row['expired'] = (expires.replace(year=expires.year + 2)).strftime('%m/%d/%Y')
+            else:
+                row['status'] = 'Expired'
+    added = generate_licensees(max(1, round(len(licensees) * fraction)), seed + 1000)
+    for index, row in enumerate(added):
+        row['license'] = f'Z{len(licensees) + index:05d}'
+    return changed + added
+
+
+def hidden_fields(viewstate):
+    return (
+        '<div class="aspNetHidden">'
+        f'<input type="hidden" name="__EVENTTARGET" value="" />'
+        f'<input type="hidden" name="__EVENTARGUMENT" value="" />'
+        f'<input type="hidden" name="__VIEWSTATE" value="{viewstate}" />'
+        f'<input type="hidden" name="__EVENTVALIDATION" value="{viewstate[::-1]}" />'
+        '</div>'
+    )
+
+
+def page(viewstate, body):
+    return (
+        '<!DOCTYPE html><html><head><title>TMB Search</title></head><body>'
+        '<form method="post" action="Search.aspx">'
+        f'{hidden_fields(viewstate)}'
+        '<div><div><div><ul><li><a href="#">Help</a></li><li><a href="Search.aspx">Home</a></li></ul></div></div>'
+        f'<div>{body}</div></div>'
+        '</form></body></html>'
+    )
+
+
+def search_form():
+    return (
+        '<div><input type="text" name="ctl00$BodyContent$tbFirstName" />'
+        '<select name="ctl00$BodyContent$ddLicenseType">'
+        '<option value="">Select</option><option value="PHY">Physician</option><option value="PA">Physician Assistant</option>'
+        '</select>'
+        '<input type="submit" name="ctl00$BodyContent$btnSearch" value="Search" /></div>'
+    )
+
+
+def results_grid(rows, total):
+    cells = ''.join(
+        f'<tr><td><a href="javascript:__doPostBack(\'{GRID_TARGET}\',\'Select${index}\')">{row["name"]}</a></td>'
+        f'<td>{row["license"]}</td></tr>'
+        for index, row in enumerate(rows))
+    return f'<div><span id="BodyContent_lblCount">{total} records found</span><table>{cells}</table></div>'
+
+
+def detail_view(row):
+    return (
+        '<div><table>'
+        f'<tr><td><label>Name:</label><label>{row["name"]}</label></td></tr>'
+        f'<tr><td><label>License:</label><label>{row["license"]}</label></td></tr>'
+        '<tr><td><label>Board:</label><label>Board of Medicine</label></td></tr>'
+        f'<tr><td><label>Status:</label><label>{row["status"]}</label></td></tr>'
+        '</table>'
+        '<div></div>'
+        '<div><div></div><div><div><table>'
+        '<tr><td><label>Type</label></td></tr>'
+        '<tr><td><label>Method</label></td></tr>'
+        f'<tr><td><label>Professional:</label><label></label><label>{row["professional"]}</label></td></tr>'
+        f'<tr><td><label>Issued:</label><label>{row["issued"]}</label></td></tr>'
+        f'<tr><td><label>Expires:</label><label>{row["expired"]}</label></td></tr>'
+        '</table></div></div></div>'
+        '</div>'
+    )
+
+
+def create_app(licensees=None, latency=0.0, max_states=10000):
+    """
+    Create the fake Search.aspx app.
+
+    :param licensees: Rows from generate_licensees(); a default population is generated if omitted.
+    :param latency: Seconds to sleep before answering each request.
+    :param max_states: How many issued view states to remember before the oldest expire.
+    """
+    app = Flask(__name__)
+    licensees = licensees if licensees is not None else generate_licensees()
+    app.config['LICENSEES'] = licensees
+    app.config['REQUEST_COUNT'] = 0
+    states = OrderedDict()
+    lock = threading.Lock()
+
+    def issue_state(result_ids=None):
+        viewstate = secrets.token_hex(16)
+        with lock:
+            states[viewstate] = result_ids
+            while len(states) > max_states:
+                states.popitem(last=False)
+        return viewstate
+
+    def claim_state(form):
+        viewstate = form.get('__VIEWSTATE', '')
+        with lock:
+            if viewstate not in states or form.get('__EVENTVALIDATION') != viewstate[::-1]:
+                abort(400, 'Invalid view state.')
+            return states[viewstate]
+
+    @app.before_request
+    def before():
+        with lock:
+            app.config['REQUEST_COUNT'] += 1
+        if latency:
+            time.sleep(latency)
+
+    @app.route('/Search.aspx', methods=['GET', 'POST'])
+    def search():
+        if request.method == 'GET':
+            return page(issue_state(), search_form())
+
+        result_ids = claim_state(request.form)
+        if request.form.get('__EVENTTARGET') == GRID_TARGET:
+            argument = request.form.get('__EVENTARGUMENT', '')
+            if not argument.startswith('Select$') or not result_ids:
+                abort(400, 'Unknown grid command.')
+            row = licensees[result_ids[int(argument.split('$', 1)[1])]]
+            return page(issue_state(), detail_view(row))
+
+        prefix = request.form.get('ctl00$BodyContent$tbFirstName', '').strip().upper()
+        matches = [index for index, row in enumerate(licensees) if row['first'].startswith(prefix)]
+        shown = matches[:MAX_RESULTS]
+        if not shown:
+            return page(issue_state(), search_form() + '<div><span>No records found.</span></div>')
+        return page(issue_state(shown), search_form() + results_grid([licensees[i] for i in shown], len(matches)))
+
+    return app
+
+
+class FixtureServer:
+    """Run a fixture app on a background thread; use as a context manager in offline runs."""
+
+    def __init__(self, app=None, host='127.0.0.1', port=0):
+        self.app = app or create_app()
+        self.server = make_server(host, port, self.app, threaded=True)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f'http://{self.server.host}:{self.server.port}/Search.aspx'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.thread.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a fake TMB Search.aspx for offline crawling.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--count', type=int, default=5000, help='number of synthetic licensees')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds of delay per request')
+    parser.add_argument('--churn', type=float, default=0.0,
+                        help='serve a later snapshot with this fraction of licensees removed and added, for --refresh runs')
+    args = parser.parse_args()
+    licensees = generate_licensees(args.count, args.seed)
+    if args.churn:
+        licensees = churn_licensees(licensees, args.churn)
+    create_app(licensees, args.latency).run(host=args.host, port=args.port, threaded=True)
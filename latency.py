@@ -0,0 +1,115 @@
+"""
+Per-step latency histograms for the crawl.
+
+Steps are timed with `with timed('detail_load'):` from any thread. Each step has a
+fixed-size, log-bucketed histogram, so recording is O(1) and memory stays constant
+over a run. report() and dump() summarize count, mean and p50/p90/p99/max per step;
+percentiles are interpolated within their bucket, between the observed min and max.
+
+Steps recorded by the crawler: search_submit, grid_render, detail_load, field_extract.
+"""
+import bisect
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Bucket upper bounds from 10us to ~4.5 minutes, four buckets per doubling (~19% resolution).
+# Steps like field_extract and grid_render take well under a millisecond.
+BUCKET_BOUNDS = [0.00001 * 2 ** (i / 4) for i in range(100)]
+
+
+class LatencyHistogram:
+    """Thread-safe histogram of durations in seconds."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        index = bisect.bisect_left(BUCKET_BOUNDS, seconds)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += seconds
+            self.min = min(self.min, seconds)
+            self.max = max(self.max, seconds)
+
+    def percentile(self, fraction):
+        """Duration below which the given fraction of samples fall, interpolated within its bucket."""
+        with self.lock:
+            if not self.count:
+                return None
+            rank = max(1, math.ceil(fraction * self.count))
+            seen = 0
+            for index, count in enumerate(self.counts):
+                if seen + count >= rank:
+                    lower = max(BUCKET_BOUNDS[index - 1] if index else 0.0, self.min)
+                    upper = min(BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else self.max, self.max)
+                    # Samples spread evenly across the bucket: the k-th of n sits at k/n of its width.
+                    return lower + (upper - lower) * (rank - seen) / count
+                seen += count
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'max': self.max if self.count else None,
+        }
+
+
+histograms = {}
+_registry_lock = threading.Lock()
+
+
+def histogram(step):
+    with _registry_lock:
+        if step not in histograms:
+            histograms[step] = LatencyHistogram()
+        return histograms[step]
+
+
+@contextmanager
+def timed(step):
+    """Record how long the body takes under the given step name."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram(step).record(time.perf_counter() - start)
+
+
+def report():
+    """One line per step, for the end-of-run log."""
+    lines = []
+    for step, values in sorted(summaries().items()):
+        if values['count']:
+            lines.append(f"{step:<14} n={values['count']:<7} mean={values['mean'] * 1000:8.1f}ms "
+                         f"p50={values['p50'] * 1000:8.1f}ms p90={values['p90'] * 1000:8.1f}ms "
+                         f"p99={values['p99'] * 1000:8.1f}ms max={values['max'] * 1000:8.1f}ms")
+    return '\n'.join(lines) or 'no latency samples'
+
+
+def summaries():
+    with _registry_lock:
+        items = list(histograms.items())
+    return {step: values.summary() for step, values in items}
+
+
+def dump(path):
+    """Write every step's summary and raw bucket counts as JSON."""
+    with _registry_lock:
+        items = list(histograms.items())
+    data = {step: dict(values.summary(), buckets=list(zip(BUCKET_BOUNDS + [None], values.counts)))
+            for step, values in items}
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, indent=4)
@@ -0,0 +1,521 @@
+"""
+Compact, indexed on-disk store of every scraped licensee.
+
+results.csv is append-only text: answering "do we already have license X" or "how many
+names start with SMI" means scanning the whole file, and the viewer used to re-parse it
+into memory on every start. LicenseStore keeps the same records in SQLite (WAL mode, so
+the crawler writes while the viewer reads), typed and indexed:
+
+- Status, Professional and License_Type are dictionary encoded: each row holds a small
+  integer code and the distinct values live once in the dictionary table.
+- Issued and Expired are stored as YYYYMMDD integers, so they sort and compare as dates.
+  A value the site sent in another format is kept as text rather than lost.
+- License numbers are unique and indexed, and Full_Name has a sorted index, so license
+  and name-prefix lookups are O(log n) index searches instead of file scans.
+
+The crawler writes to it through writer.StoreSink and asks it for licenses scraped by
+earlier runs (dedup.LicenseIndex). server.py serves its pages straight from it and pushes
+new rows to its clients through StoreTail.
+results.csv is still written alongside.
+
+Usage:
+python licensestore.py --import results/results.csv   # (re)build the store from a CSV
+python licensestore.py --bench 1000000
+"""
+import argparse
+import base64
+import csv
+import json
+import logging
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date
+
+from writer import FIELDNAMES
+
+logger = logging.getLogger(__name__)
+
+STORE_FILE = 'results/licensees.sqlite3'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dictionary (
+    code INTEGER PRIMARY KEY,
+    field TEXT NOT NULL,
+    value TEXT NOT NULL,
+    UNIQUE (field, value)
+);
+CREATE TABLE IF NOT EXISTS licensees (
+    id INTEGER PRIMARY KEY,
+    license TEXT UNIQUE,
+    full_name TEXT NOT NULL,
+    license_type INTEGER,
+    status INTEGER,
+    professional INTEGER,
+    issued,
+    expired
+);
+CREATE INDEX IF NOT EXISTS licensees_name ON licensees (full_name, id);
+CREATE INDEX IF NOT EXISTS licensees_status ON licensees (status, id);
+CREATE INDEX IF NOT EXISTS licensees_type ON licensees (license_type, id);
+CREATE INDEX IF NOT EXISTS licensees_issued ON licensees (issued, id);
+CREATE INDEX IF NOT EXISTS licensees_expired ON licensees (expired, id);
+"""
+
+# Record field -> column, in FIELDNAMES order.
+COLUMNS = {
+    'Full_Name': 'full_name',
+    'License_Type': 'license_type',
+    'License_Number': 'license',
+    'Status': 'status',
+    'Professional': 'professional',
+    'Issued': 'issued',
+    'Expired': 'expired',
+}
+SELECT_COLUMNS = ['id', 'license', 'full_name', 'license_type', 'status', 'professional', 'issued', 'expired']
+CODED_FIELDS = ('License_Type', 'Status', 'Professional')
+
+# Sortable fields and the column each one orders by.
+SORT_COLUMNS = dict(COLUMNS, id='id')
+del SORT_COLUMNS['Professional']
+
+MAX_PAGE_SIZE = 500
+IMPORT_BATCH = 10000
+
+
+def encode_cursor(value, row_id):
+    return base64.urlsafe_b64encode(json.dumps([value, row_id]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return value, int(row_id)
+    except (ValueError, TypeError):
+        raise ValueError(f'Invalid cursor {cursor!r}')
+
+
+def prefix_upper_bound(prefix):
+    """Smallest string greater than every string starting with prefix, for an index range scan."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def encode_date(value):
+    """MM/DD/YYYY as a YYYYMMDD integer; anything else is kept as the text it was."""
+    # writer.parse_date's strptime is most of the cost of a bulk import, so split by hand.
+    try:
+        month, day, year = map(int, value.strip().split('/'))
+        date(year, month, day)
+    except (AttributeError, ValueError, TypeError):
+        return value or ''
+    return year * 10000 + month * 100 + day
+
+
+def decode_date(value):
+    if isinstance(value, int):
+        return f'{value // 100 % 100:02d}/{value % 100:02d}/{value // 10000}'
+    return value
+
+
+class LicenseStore:
+    """
+    Licensee records in an indexed SQLite file, shared by the threads of one process.
+
+    Opened by the crawler (and coordinator) for writing and by server.py for reading; both
+    can have it open at once.
+
+    :param path: Database file, e.g. results/licensees.sqlite3.
+    """
+
+    def __init__(self, path=STORE_FILE):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+        self.codes = {}  # (field, value) -> code
+        self.values = {}  # code -> value
+        self._load_dictionary()
+
+    def _execute(self, sql, parameters=()):
+        with self.lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def _load_dictionary(self):
+        # Lock held by the caller, or not yet shared.
+        for code, field, value in self.connection.execute('SELECT code, field, value FROM dictionary'):
+            self.codes[field, value] = code
+            self.values[code] = value
+
+    def _code(self, field, value):
+        """Code of a dictionary value, added on first use. Lock held, inside a write transaction."""
+        value = value or ''
+        code = self.codes.get((field, value))
+        if code is None:
+            self.connection.execute('INSERT OR IGNORE INTO dictionary (field, value) VALUES (?, ?)', (field, value))
+            code = self.connection.execute('SELECT code FROM dictionary WHERE field = ? AND value = ?',
+                                           (field, value)).fetchone()[0]
+            self.codes[field, value] = code
+            self.values[code] = value
+        return code
+
+    def _lookup(self, field, value):
+        """Code of an existing dictionary value, or None. Another process may have added it since we loaded."""
+        with self.lock:
+            if (field, value) not in self.codes:
+                self._load_dictionary()
+            return self.codes.get((field, value))
+
+    def _decode(self, code):
+        if code is not None and code not in self.values:
+            with self.lock:
+                self._load_dictionary()
+        return self.values.get(code, '')
+
+    def _encode(self, row):
+        return (row.get('License_Number') or None, row.get('Full_Name') or '',
+                self._code('License_Type', row.get('License_Type')), self._code('Status', row.get('Status')),
+                self._code('Professional', row.get('Professional')),
+                encode_date(row.get('Issued')), encode_date(row.get('Expired')))
+
+    def _record(self, record):
+        """Record dict (FIELDNAMES plus id) from a SELECT_COLUMNS tuple."""
+        row_id, license, full_name, license_type, status, professional, issued, expired = record
+        return {'id': row_id, 'Full_Name': full_name, 'License_Type': self._decode(license_type),
+                'License_Number': license or '', 'Status': self._decode(status),
+                'Professional': self._decode(professional), 'Issued': decode_date(issued),
+                'Expired': decode_date(expired)}
+
+    def _write(self, sql, rows, rewrite=False):
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                self.connection.executemany(sql, [self._encode(row) for row in rows])
+                if rewrite:
+                    self._bump_generation()
+                self.connection.execute('COMMIT')
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                # Codes added in the rolled back transaction no longer exist.
+                self.codes.clear()
+                self.values.clear()
+                self._load_dictionary()
+                raise
+
+    def _bump_generation(self):
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        self.connection.execute(f'PRAGMA user_version = {version + 1}')
+
+    def add(self, rows):
+        """Append records (dicts keyed by FIELDNAMES); a license already stored keeps its first record."""
+        if rows:
+            self._write('INSERT OR IGNORE INTO licensees (license, full_name, license_type, status, professional, '
+                        'issued, expired) VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def upsert(self, rows):
+        """Insert records, or update the stored record of the same license in place."""
+        if rows:
+            self._write('INSERT INTO licensees (license, full_name, license_type, status, professional, issued, expired) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (license) DO UPDATE SET '
+                        'full_name = excluded.full_name, license_type = excluded.license_type, '
+                        'status = excluded.status, professional = excluded.professional, '
+                        'issued = excluded.issued, expired = excluded.expired', rows, rewrite=True)
+
+    def delete(self, licenses):
+        licenses = list(licenses)
+        if not licenses:
+            return
+        with self.lock:
+            with self.connection:
+                self.connection.execute('BEGIN IMMEDIATE')
+                self.connection.executemany('DELETE FROM licensees WHERE license = ?', [(license,) for license in licenses])
+                self._bump_generation()
+
+    def clear(self):
+        """Remove every record, e.g. before a fresh crawl."""
+        with self.lock:
+            with self.connection:
+                self.connection.execute('BEGIN IMMEDIATE')
+                self.connection.execute('DELETE FROM licensees')
+                self._bump_generation()
+
+    def generation(self):
+        """Changes whenever stored records are updated or removed rather than appended."""
+        return self._execute('PRAGMA user_version')[0][0]
+
+    def import_csv(self, path):
+        """Add every record of a results CSV; return the number of rows read."""
+        count = 0
+        with open(path, 'r', newline='', encoding='utf-8') as csvfile:
+            batch = []
+            for row in csv.DictReader(csvfile):
+                batch.append(row)
+                if len(batch) >= IMPORT_BATCH:
+                    self.add(batch)
+                    count += len(batch)
+                    batch = []
+            self.add(batch)
+            count += len(batch)
+        logger.info(f"Imported {count} rows from {path} into {self.path}")
+        return count
+
+    def adopt_csv(self, path):
+        """Fill an empty store from an existing results CSV, e.g. one written before the store existed."""
+        if len(self) or not os.path.exists(path):
+            return 0
+        return self.import_csv(path)
+
+    def __len__(self):
+        return self._execute('SELECT COUNT(*) FROM licensees')[0][0]
+
+    def has_license(self, license):
+        return bool(self._execute('SELECT 1 FROM licensees WHERE license = ?', (license,)))
+
+    def get(self, license):
+        """The record of a license, or None."""
+        records = self._execute(f'SELECT {", ".join(SELECT_COLUMNS)} FROM licensees WHERE license = ?', (license,))
+        return self._record(records[0]) if records else None
+
+    def has_prefix(self, prefix):
+        """Whether any stored Full_Name starts with prefix."""
+        if not prefix:
+            return bool(len(self))
+        return bool(self._execute('SELECT 1 FROM licensees WHERE full_name >= ? AND full_name < ? LIMIT 1',
+                                  (prefix, prefix_upper_bound(prefix))))
+
+    def count_prefix(self, prefix):
+        """Number of stored names starting with prefix, counted over the name index."""
+        if not prefix:
+            return len(self)
+        return self._execute('SELECT COUNT(*) FROM licensees WHERE full_name >= ? AND full_name < ?',
+                             (prefix, prefix_upper_bound(prefix)))[0][0]
+
+    def max_id(self):
+        return self._execute('SELECT COALESCE(MAX(id), 0) FROM licensees')[0][0]
+
+    def rows_after(self, row_id, limit=MAX_PAGE_SIZE):
+        """Records appended after row_id, oldest first."""
+        records = self._execute(f'SELECT {", ".join(SELECT_COLUMNS)} FROM licensees WHERE id > ? ORDER BY id LIMIT ?',
+                                (row_id, limit))
+        return [self._record(record) for record in records]
+
+    def facets(self):
+        """Distinct Status and License_Type values with their counts, for the filter menus."""
+        return {field: {self._decode(code): count for code, count in self._execute(
+                    f'SELECT {COLUMNS[field]}, COUNT(*) FROM licensees GROUP BY 1')}
+                for field in ('Status', 'License_Type')}
+
+    def page(self, limit=100, cursor=None, sort='id', order='desc', status=None, license_type=None, name=None):
+        """
+        One page of licensees in the requested order, for the viewer's keyset pagination.
+
+        :param limit: Rows per page, capped at MAX_PAGE_SIZE.
+        :param cursor: next_cursor of the previous page; None for the first page.
+        :param sort: Field to order by, one of SORT_COLUMNS.
+        :param order: 'asc' or 'desc'.
+        :param status: Only rows with this Status.
+        :param license_type: Only rows with this License_Type.
+        :param name: Only rows whose Full_Name starts with this, ignoring case; blank matches every row.
+        :return: {'rows', 'next_cursor'}, plus 'total' (rows matching the filters) on the first page.
+
+        Rows sorted by a dictionary-encoded field are ordered by its value, not its code: each value's
+        rows are read in turn from that field's index.
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f'Cannot sort by {sort!r}')
+        if order not in ('asc', 'desc'):
+            raise ValueError(f'Order must be asc or desc, not {order!r}')
+        column = SORT_COLUMNS[sort]
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        direction = order.upper()
+        comparison = '<' if order == 'desc' else '>'
+
+        where, parameters = [], []
+        for field, value in (('Status', status), ('License_Type', license_type)):
+            if value:
+                where.append(f'{COLUMNS[field]} = ?')
+                # A value never stored matches nothing.
+                parameters.append(self._lookup(field, value))
+        name = (name or '').strip().upper()
+        if name:
+            where.append('full_name >= ? AND full_name < ?')
+            parameters += [name, prefix_upper_bound(name)]
+        filters, filter_parameters = list(where), list(parameters)
+
+        fields = ', '.join(SELECT_COLUMNS)
+        if sort in CODED_FIELDS:
+            value, row_id = decode_cursor(cursor) if cursor else (None, None)
+            with self.lock:
+                self._load_dictionary()
+                values = sorted({v for (field, v) in self.codes if field == sort}, reverse=order == 'desc')
+            records = []
+            for current in values:
+                if value is not None and (current < value if order == 'asc' else current > value):
+                    continue
+                conditions = where + [f'{column} = ?']
+                arguments = parameters + [self._lookup(sort, current)]
+                if current == value:
+                    conditions.append(f'id {comparison} ?')
+                    arguments.append(row_id)
+                records += self._execute(f'SELECT {fields} FROM licensees WHERE {" AND ".join(conditions)} '
+                                         f'ORDER BY id {direction} LIMIT ?', arguments + [limit + 1 - len(records)])
+                if len(records) > limit:
+                    break
+            rows = [self._record(record) for record in records[:limit]]
+            cursor_value = rows[-1][sort] if rows else None
+        else:
+            if cursor:
+                value, row_id = decode_cursor(cursor)
+                if column == 'id':
+                    where.append(f'id {comparison} ?')
+                    parameters.append(row_id)
+                else:
+                    where.append(f'({column}, id) {comparison} (?, ?)')
+                    parameters += [value, row_id]
+            clause = f'WHERE {" AND ".join(where)}' if where else ''
+            order_by = 'id' if column == 'id' else f'{column} {direction}, id'
+            records = self._execute(f'SELECT {fields} FROM licensees {clause} ORDER BY {order_by} {direction} LIMIT ?',
+                                    parameters + [limit + 1])
+            rows = [self._record(record) for record in records[:limit]]
+            # The cursor holds the stored (encoded) value, which is what the index compares.
+            cursor_value = records[limit - 1][SELECT_COLUMNS.index(column)] if len(records) > limit and column != 'id' else None
+
+        result = {'rows': rows, 'next_cursor': None}
+        if len(records) > limit:
+            result['next_cursor'] = encode_cursor(cursor_value, rows[-1]['id'])
+        if not cursor:
+            filter_clause = f'WHERE {" AND ".join(filters)}' if filters else ''
+            result['total'] = self._execute(f'SELECT COUNT(*) FROM licensees {filter_clause}', filter_parameters)[0][0]
+        return result
+
+    def checkpoint(self):
+        with self.lock:
+            self.connection.execute('PRAGMA wal_checkpoint(PASSIVE)')
+
+    def close(self):
+        with self.lock:
+            self.connection.execute('PRAGMA optimize')
+            self.connection.close()
+
+
+class StoreTail:
+    """
+    Follows the records appended to a store, so a viewer pushes only new rows instead of re-reading it.
+
+    poll() returns (reset, rows). reset is True on the first poll, after records were updated or
+    removed (the store's generation changed), and when more than `limit` rows arrived at once;
+    the caller should then reload rather than apply rows.
+    """
+
+    def __init__(self, store, limit=MAX_PAGE_SIZE):
+        self.store = store
+        self.limit = limit
+        self.generation = None
+        self.last_id = 0
+
+    def poll(self):
+        current = self.store.generation()
+        if current != self.generation:
+            self.generation, self.last_id = current, self.store.max_id()
+            return True, []
+        added = self.store.rows_after(self.last_id, self.limit + 1)
+        if len(added) > self.limit:
+            self.last_id = self.store.max_id()
+            return True, []
+        if added:
+            self.last_id = added[-1]['id']
+        return False, added
+
+
+def _scan_csv(path, predicate):
+    with open(path, 'r', newline='', encoding='utf-8') as csvfile:
+        return sum(1 for row in csv.DictReader(csvfile) if predicate(row))
+
+
+def benchmark(rows=1_000_000, lookups=1000):
+    """Size and lookup cost at `rows` licensees: results.csv scans versus the store's indexes."""
+    statuses = ['Active', 'Inactive', 'Cancelled', 'Deceased']
+    random.seed(1)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'results.csv')
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(FIELDNAMES)
+            for i in range(rows):
+                writer.writerow([f'NAME{i * 7919 % rows:07d}', 'MD' if i % 5 else 'DO', f'L{i:07d}', statuses[i % 4],
+                                 'Physician and Surgeon', f'{i % 12 + 1:02d}/01/{1970 + i % 50}', '12/31/2030'])
+
+        store_path = os.path.join(directory, 'licensees.sqlite3')
+        start = time.perf_counter()
+        store = LicenseStore(store_path)
+        store.import_csv(path)
+        store.checkpoint()
+        print(f'{rows} rows: CSV {os.path.getsize(path) / 2 ** 20:.1f} MiB, store {os.path.getsize(store_path) / 2 ** 20:.1f} MiB '
+              f'(import {time.perf_counter() - start:.1f}s)')
+        try:
+            sizes = dict(store._execute('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name'))
+            print(f'  records {sizes["licensees"] / 2 ** 20:.1f} MiB, indexes '
+                  f'{sum(size for name, size in sizes.items() if name.startswith(("licensees_", "sqlite_autoindex_licensees"))) / 2 ** 20:.1f} MiB')
+        except sqlite3.OperationalError:
+            pass  # SQLite built without the dbstat table
+
+        licenses = [f'L{random.randrange(rows):07d}' for _ in range(lookups)]
+        start = time.perf_counter()
+        _scan_csv(path, lambda row: row['License_Number'] == licenses[0])
+        scan = time.perf_counter() - start
+        start = time.perf_counter()
+        assert all(store.has_license(license) for license in licenses)
+        print(f'license lookup:      CSV scan {scan * 1000:9.1f}ms, store {(time.perf_counter() - start) / lookups * 1e6:7.1f}us')
+
+        prefixes = [f'NAME{random.randrange(rows):07d}'[:8] for _ in range(lookups)]
+        start = time.perf_counter()
+        expected = _scan_csv(path, lambda row: row['Full_Name'].startswith(prefixes[0]))
+        scan = time.perf_counter() - start
+        start = time.perf_counter()
+        counts = [store.count_prefix(prefix) for prefix in prefixes]
+        assert counts[0] == expected
+        print(f'name prefix count:   CSV scan {scan * 1000:9.1f}ms, store {(time.perf_counter() - start) / lookups * 1e6:7.1f}us')
+        store.close()
+
+        # What the viewer did before the store: read the whole CSV and send every row to the page.
+        start = time.perf_counter()
+        with open(path, 'r', newline='', encoding='utf-8') as csvfile:
+            json.dumps(list(csv.DictReader(csvfile)))
+        print(f'viewer start:        whole CSV {time.perf_counter() - start:6.2f}s', end=', ')
+        start = time.perf_counter()
+        store = LicenseStore(store_path)
+        json.dumps(store.page(limit=100, sort='Full_Name', order='asc'))
+        print(f'first page from the store {(time.perf_counter() - start) * 1000:.1f}ms')
+        for label, query in {'newest first': {},
+                             'by Status': {'sort': 'Status', 'order': 'asc'},
+                             'Status=Inactive, by Issued desc': {'status': 'Inactive', 'sort': 'Issued'},
+                             'name prefix NAME001': {'name': 'name001', 'sort': 'Full_Name', 'order': 'asc'}}.items():
+            start = time.perf_counter()
+            first = store.page(limit=100, **query)
+            store.page(limit=100, cursor=first['next_cursor'], **query)
+            print(f'two pages {label:<32} {(time.perf_counter() - start) * 1000:8.1f}ms')
+        store.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build or benchmark the licensee store.')
+    parser.add_argument('--import', dest='csv', default=None, metavar='CSV',
+                        help='replace the store\'s records with the rows of a results CSV')
+    parser.add_argument('--store', default=STORE_FILE, help='store to build')
+    parser.add_argument('--bench', type=int, default=None, metavar='ROWS', help='rows to benchmark with')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.bench:
+        benchmark(args.bench)
+    elif args.csv:
+        store = LicenseStore(args.store)
+        store.clear()
+        store.import_csv(args.csv)
+        store.close()
+    else:
+        parser.error('nothing to do: pass --import CSV or --bench ROWS')
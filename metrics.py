@@ -0,0 +1,230 @@
+"""
+Crawl metrics: counters the workers update, a JSON run summary, and Prometheus text.
+
+The crawler owns a CrawlMetrics instance. Workers report each search outcome, saved
+record and prefix cost to it, and a reporter thread rewrites results/metrics.json
+every few seconds. server.py reads that file and serves it at /metrics in Prometheus
+text format, so the crawl and the viewer stay separate processes.
+
+The summary covers searches and records (totals and records per minute), the
+EMPTY/few/MANY split per depth, per-bucket progress (first letter of the prefix),
+time spent per depth, the most expensive prefixes, the scheduler queue depth and
+retries, the adaptive request rate, driver restarts, and the step latency percentiles
+from latency.py.
+"""
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+import latency
+
+logger = logging.getLogger(__name__)
+
+OUTCOME_EMPTY = 'empty'
+OUTCOME_FEW = 'few'
+OUTCOME_MANY = 'many'
+
+# Number of most expensive prefixes kept for the summary.
+TOP_PREFIXES = 20
+
+
+class CrawlMetrics:
+    """
+    Thread-safe counters for one crawl run.
+
+    :param state: CrawlState whose per-bucket node counts are included, if any.
+    :param driver_pool: DriverPool whose restart count is included, if any.
+    :param scheduler: CrawlScheduler whose queue depth and retries are included, if any.
+    :param rate_limiter: HostRateLimiter whose current per-host rate and concurrency are included, if any.
+    """
+
+    def __init__(self, state=None, driver_pool=None, scheduler=None, rate_limiter=None):
+        self.state = state
+        self.driver_pool = driver_pool
+        self.scheduler = scheduler
+        self.rate_limiter = rate_limiter
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.finished = None
+        self.searches = 0
+        self.skipped = 0
+        self.records = 0
+        self.outcomes = defaultdict(Counter)  # depth -> outcome -> searches
+        self.depth_seconds = Counter()
+        self.bucket_searches = Counter()
+        self.bucket_records = Counter()
+        self.costliest = []  # min-heap of (seconds, prefix, depth, records)
+        self.samples = deque()  # (time, records), for the records-per-minute window
+        self.path = None
+        self.reporter = None
+        self.stop = threading.Event()
+
+    def search(self, prefix, depth, outcome):
+        """Count one search and whether it came back EMPTY, with few results or MANY."""
+        with self.lock:
+            self.searches += 1
+            self.outcomes[depth][outcome] += 1
+            self.bucket_searches[prefix[:1]] += 1
+
+    def skip(self, prefix):
+        """Count a prefix that was not searched because it was already covered."""
+        with self.lock:
+            self.skipped += 1
+
+    def record(self, prefix):
+        """Count one saved licensee record."""
+        with self.lock:
+            self.records += 1
+            self.bucket_records[prefix[:1]] += 1
+
+    def prefix_cost(self, prefix, depth, seconds, records=0):
+        """Record the wall time one prefix took, including its detail pages."""
+        with self.lock:
+            self.depth_seconds[depth] += seconds
+            entry = (seconds, prefix, depth, records)
+            if len(self.costliest) < TOP_PREFIXES:
+                heapq.heappush(self.costliest, entry)
+            elif entry > self.costliest[0]:
+                heapq.heapreplace(self.costliest, entry)
+
+    def _records_per_minute(self, now):
+        """Rate over roughly the last minute, from the samples taken at each summary."""
+        self.samples.append((now, self.records))
+        while len(self.samples) > 2 and now - self.samples[1][0] >= 60:
+            self.samples.popleft()
+        then, records = self.samples[0]
+        return (self.records - records) / (now - then) * 60 if now > then else 0.0
+
+    def summary(self):
+        """Everything as one JSON-serialisable dict."""
+        now = time.time()
+        with self.lock:
+            elapsed = (self.finished or now) - self.started
+            data = {
+                'running': self.finished is None,
+                'started': self.started,
+                'updated': now,
+                'elapsed_seconds': elapsed,
+                'searches': self.searches,
+                'skipped': self.skipped,
+                'records': self.records,
+                'records_per_minute': self.records / elapsed * 60 if elapsed else 0.0,
+                'recent_records_per_minute': self._records_per_minute(now),
+                'outcomes_by_depth': {str(depth): dict(counts) for depth, counts in sorted(self.outcomes.items())},
+                'seconds_by_depth': {str(depth): seconds for depth, seconds in sorted(self.depth_seconds.items())},
+                'costliest_prefixes': [{'prefix': prefix, 'depth': depth, 'seconds': seconds, 'records': records}
+                                       for seconds, prefix, depth, records in sorted(self.costliest, reverse=True)],
+                'buckets': {bucket: {'searches': self.bucket_searches[bucket], 'records': self.bucket_records[bucket]}
+                            for bucket in sorted(self.bucket_searches)},
+            }
+        if self.state is not None:
+            try:
+                for bucket, nodes in self.state.progress().items():
+                    data['buckets'].setdefault(bucket, {'searches': 0, 'records': 0})['nodes'] = nodes
+            except Exception:
+                logger.debug("Could not read crawl state progress", exc_info=True)
+        data['queue_depth'] = self.scheduler.queue_depth() if self.scheduler is not None else None
+        data['retries'] = self.scheduler.retries if self.scheduler is not None else None
+        data['failed_prefixes'] = list(self.scheduler.failed) if self.scheduler is not None else []
+        data['rate_limits'] = self.rate_limiter.summary() if self.rate_limiter is not None else {}
+        data['driver_restarts'] = self.driver_pool.restarts if self.driver_pool is not None else None
+        data['latency'] = latency.summaries()
+        return data
+
+    def write(self, path):
+        """Atomically replace path with the current summary."""
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as file:
+            json.dump(self.summary(), file, indent=4)
+        os.replace(tmp, path)
+
+    def start_reporting(self, path='results/metrics.json', interval=5.0):
+        """Rewrite the summary at path every interval seconds until close()."""
+        def report():
+            while not self.stop.wait(interval):
+                try:
+                    self.write(path)
+                except Exception:
+                    logger.exception("Writing crawl metrics failed")
+
+        self.path = path
+        self.reporter = threading.Thread(target=report, name='metrics-reporter', daemon=True)
+        self.reporter.start()
+
+    def close(self):
+        """Stop reporting and write the final summary."""
+        self.finished = time.time()
+        self.stop.set()
+        if self.reporter is not None:
+            self.reporter.join()
+            self.write(self.path)
+        logger.info(f"Crawl metrics: {self.searches} searches, {self.skipped} skipped, {self.records} records "
+                    f"in {self.finished - self.started:.0f}s")
+
+
+def _labels(**labels):
+    escaped = {key: str(value).replace('\\', '\\\\').replace('"', '\\"') for key, value in labels.items()}
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped.items()) + '}'
+
+
+def prometheus_text(summary):
+    """Render a CrawlMetrics summary in the Prometheus text exposition format."""
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in samples:
+            if value is not None:
+                lines.append(f'{name}{_labels(**labels) if labels else ""} {value}')
+
+    if not summary:
+        return ''
+    metric('tmb_crawl_running', 'gauge', 'Whether the crawl is still running.', [({}, int(summary['running']))])
+    metric('tmb_crawl_last_update_timestamp_seconds', 'gauge', 'When the crawler last wrote its metrics.',
+           [({}, summary['updated'])])
+    metric('tmb_crawl_elapsed_seconds', 'gauge', 'Wall time of the run so far.', [({}, summary['elapsed_seconds'])])
+    metric('tmb_crawl_searches_total', 'counter', 'Prefix searches issued.', [({}, summary['searches'])])
+    metric('tmb_crawl_searches_skipped_total', 'counter', 'Prefixes skipped as already covered.', [({}, summary['skipped'])])
+    metric('tmb_crawl_records_total', 'counter', 'Licensee records saved.', [({}, summary['records'])])
+    metric('tmb_crawl_records_per_minute', 'gauge', 'Records saved per minute over roughly the last minute.',
+           [({}, summary['recent_records_per_minute'])])
+    metric('tmb_crawl_queue_depth', 'gauge', 'Prefixes waiting in the scheduler queue.', [({}, summary['queue_depth'])])
+    metric('tmb_crawl_retries_total', 'counter', 'Failed prefixes put back on the queue after a backoff.',
+           [({}, summary.get('retries'))])
+    metric('tmb_crawl_failed_prefixes', 'gauge', 'Prefixes given up on after every retry; left for the next run.',
+           [({}, len(summary.get('failed_prefixes', [])))])
+    metric('tmb_crawl_request_rate', 'gauge', 'Current adaptive request rate per host, in requests per second.',
+           [({'host': host}, values['rate']) for host, values in summary.get('rate_limits', {}).items()])
+    metric('tmb_crawl_request_concurrency', 'gauge', 'Current adaptive limit on requests in flight per host.',
+           [({'host': host}, values['concurrency']) for host, values in summary.get('rate_limits', {}).items()])
+    metric('tmb_crawl_driver_restarts_total', 'counter', 'Browser sessions recycled by the driver pool.',
+           [({}, summary['driver_restarts'])])
+    metric('tmb_crawl_search_outcomes_total', 'counter', 'Searches by depth and outcome (empty, few, many).',
+           [({'depth': depth, 'outcome': outcome}, count)
+            for depth, counts in summary['outcomes_by_depth'].items() for outcome, count in sorted(counts.items())])
+    metric('tmb_crawl_depth_seconds_total', 'counter', 'Wall time spent on prefixes of each depth.',
+           [({'depth': depth}, seconds) for depth, seconds in summary['seconds_by_depth'].items()])
+    metric('tmb_crawl_bucket_searches_total', 'counter', 'Searches per first letter.',
+           [({'bucket': bucket}, values['searches']) for bucket, values in summary['buckets'].items()])
+    metric('tmb_crawl_bucket_records_total', 'counter', 'Records saved per first letter.',
+           [({'bucket': bucket}, values['records']) for bucket, values in summary['buckets'].items()])
+    metric('tmb_crawl_bucket_nodes', 'gauge', 'Checkpointed prefix nodes per first letter and state.',
+           [({'bucket': bucket, 'state': state}, count)
+            for bucket, values in summary['buckets'].items() for state, count in sorted(values.get('nodes', {}).items())])
+    latency_samples = []
+    for step, values in sorted(summary['latency'].items()):
+        if not values['count']:
+            continue
+        for quantile in ('p50', 'p90', 'p99'):
+            latency_samples.append(({'step': step, 'quantile': f'0.{quantile[1:]}'}, values[quantile]))
+    metric('tmb_crawl_step_latency_seconds', 'summary', 'Latency of each crawl step.', latency_samples)
+    for step, values in sorted(summary['latency'].items()):
+        if values['count']:
+            lines.append(f'tmb_crawl_step_latency_seconds_sum{_labels(step=step)} {values["mean"] * values["count"]}')
+            lines.append(f'tmb_crawl_step_latency_seconds_count{_labels(step=step)} {values["count"]}')
+    return '\n'.join(lines) + '\n'
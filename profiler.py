@@ -0,0 +1,120 @@
+"""
+Sampling profiler for a running crawl.
+
+A background thread snapshots every other thread's Python stack at a fixed interval
+and counts identical stacks. The counts are written in the collapsed "frame;frame;frame
+count" format that flamegraph.pl and speedscope read, so hot paths across all crawler
+workers show up in one flame graph. Sampling is wall-clock: time spent blocked on the
+network or a lock counts too, which is usually what the crawl is waiting on.
+
+Start it with `python scraper.py --profile`. Send SIGUSR1 to dump the stacks collected
+so far without stopping the crawl; they are dumped again when the run ends.
+"""
+import logging
+import os
+import signal
+import sys
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class SamplingProfiler:
+    """
+    Periodically sample the stacks of all threads.
+
+    :param interval: Seconds between samples.
+    :param path: Where dump() writes the collapsed stacks.
+    """
+
+    def __init__(self, interval=0.01, path='results/profile.txt'):
+        self.interval = interval
+        self.path = path
+        self.stacks = Counter()
+        self.samples = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.dump_requested = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    def _sample(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own = threading.get_ident()
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(frame_label(frame))
+                frame = frame.f_back
+            labels.append(names.get(ident, str(ident)))
+            stacks.append(';'.join(reversed(labels)))
+        with self.lock:
+            self.stacks.update(stacks)
+            self.samples += 1
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self._sample()
+            if self.dump_requested.is_set():
+                self.dump_requested.clear()
+                try:
+                    self.dump()
+                except OSError:
+                    logger.exception("Profiler dump failed")
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def install_signal(self, signum=getattr(signal, 'SIGUSR1', None)):
+        """
+        Dump on signum (SIGUSR1 by default; unavailable on Windows). Call from the main thread.
+
+        The handler only flags the request and the sampler thread writes the dump: the handler runs
+        on the main thread between bytecodes, possibly while that thread holds self.lock.
+        """
+        if signum is not None:
+            signal.signal(signum, lambda *_: self.dump_requested.set())
+
+    def hottest(self, count=10, thread_prefix='crawler'):
+        """
+        Functions that were on top of the stack most often, with their share of samples.
+
+        :param thread_prefix: Only count threads whose name starts with this (the scheduler's workers by
+            default), so idle helper threads do not drown out the crawl itself.
+        """
+        leaves = Counter()
+        with self.lock:
+            for stack, hits in self.stacks.items():
+                if stack.startswith(thread_prefix or ''):
+                    leaves[stack.rsplit(';', 1)[-1]] += hits
+        total = sum(leaves.values()) or 1
+        return [(label, hits / total) for label, hits in leaves.most_common(count)]
+
+    def dump(self, path=None):
+        """Write the collapsed stacks, most frequent first."""
+        path = path or self.path
+        with self.lock:
+            stacks = self.stacks.most_common()
+            samples = self.samples
+        with open(path, 'w', encoding='utf-8') as file:
+            for stack, hits in stacks:
+                file.write(f'{stack} {hits}\n')
+        logger.info(f"Profiler wrote {len(stacks)} stacks from {samples} samples to {path}")
+
+    def stop(self):
+        """Stop sampling, write the final dump and log the hottest functions."""
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.dump()
+        for label, share in self.hottest():
+            logger.info(f"  {share:6.1%}  {label}")
@@ -0,0 +1,192 @@
+"""
+Request rate limiting shared by every crawler worker.
+
+A token bucket per host caps the sustained request rate against the TMB site no
+matter how many workers are running, while still allowing short bursts.
+
+AdaptiveRateLimiter also tunes that rate, and the number of requests in flight, from
+how the site responds. The tuning is AIMD, as in TCP congestion control. Each healthy
+response adds a little; an error, a throttling status or a latency spike halves both,
+at most once per cooldown. The crawl settles just below the point where the site starts
+to push back.
+"""
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at `rate` tokens per second up to `burst` tokens."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` are available and take them. Returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                delay = (tokens - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def set_rate(self, rate):
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+
+class AimdController:
+    """
+    Additive-increase/multiplicative-decrease control of one host's request rate and concurrency.
+
+    :param bucket: TokenBucket whose rate is adjusted.
+    :param concurrency: Requests allowed in flight at the start.
+    :param min_rate: Floor for the rate, in requests per second.
+    :param max_rate: Ceiling for the rate.
+    :param max_concurrency: Ceiling for requests in flight.
+    :param latency_factor: A response slower than this multiple of the best smoothed latency seen counts as overload.
+    :param decrease: Factor applied to rate and concurrency on overload.
+    :param cooldown: Minimum seconds between two decreases, so one burst of errors halves only once.
+    """
+
+    def __init__(self, bucket, concurrency, min_rate=0.5, max_rate=None, max_concurrency=None,
+                 latency_factor=3.0, decrease=0.5, cooldown=5.0):
+        self.bucket = bucket
+        self.min_rate = min_rate
+        self.max_rate = max_rate or bucket.rate * 2
+        self.max_concurrency = max_concurrency or concurrency
+        self.concurrency = float(concurrency)
+        self.latency_factor = latency_factor
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.latency = None  # smoothed
+        self.best_latency = None
+        self.last_decrease = float('-inf')
+        self.decreases = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.concurrency):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, seconds, ok):
+        """Feed back one finished request: its latency and whether the site answered normally."""
+        with self.condition:
+            self.in_flight -= 1
+            self.latency = seconds if self.latency is None else 0.8 * self.latency + 0.2 * seconds
+            if self.best_latency is None or self.latency < self.best_latency:
+                self.best_latency = self.latency
+            overloaded = not ok or seconds > self.best_latency * self.latency_factor
+            now = time.monotonic()
+            if overloaded:
+                if now - self.last_decrease >= self.cooldown:
+                    self.last_decrease = now
+                    self.decreases += 1
+                    self.concurrency = max(1.0, self.concurrency * self.decrease)
+                    self.bucket.set_rate(max(self.min_rate, self.bucket.rate * self.decrease))
+                    logger.warning(f"Backing off: {self.bucket.rate:.2f} req/s, {int(self.concurrency)} in flight "
+                                   f"({'error' if not ok else f'{seconds:.2f}s response'})")
+            else:
+                # About +1 request/s per second of healthy traffic, and +1 in flight per window of successes.
+                rate = self.bucket.rate
+                self.bucket.set_rate(min(self.max_rate, rate + 1.0 / max(rate, 1.0)))
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1.0 / self.concurrency)
+            self.condition.notify_all()
+
+
+class HostRateLimiter:
+    """
+    One TokenBucket per host.
+
+    :param rate: Requests per second allowed against each host; 0 or None disables limiting.
+    :param burst: Requests allowed back to back before the rate applies.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, url):
+        host = urlsplit(url).netloc
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.rate, self.burst)
+            return self.buckets[host]
+
+    def acquire(self, url):
+        """Wait for permission to send one request to url's host."""
+        if not self.rate:
+            return 0.0
+        return self.bucket(url).acquire()
+
+    def release(self, url, seconds, ok=True):
+        """Report how a request to url went; the fixed-rate limiter ignores it."""
+
+    def summary(self):
+        """Current {host: {rate, concurrency}}, for metrics."""
+        return {host: {'rate': bucket.rate, 'concurrency': None} for host, bucket in self.buckets.items()}
+
+
+class AdaptiveRateLimiter(HostRateLimiter):
+    """
+    HostRateLimiter whose per-host rate and concurrency follow the site's health (see AimdController).
+
+    :param rate: Starting requests per second per host; 0 or None disables limiting and adaptation.
+    :param concurrency: Starting requests in flight per host, usually the number of workers.
+    :param max_rate: Ceiling for the rate; twice the starting rate by default.
+    :param controller_options: Passed on to AimdController.
+    """
+
+    def __init__(self, rate, concurrency=1, max_rate=None, burst=None, **controller_options):
+        super().__init__(rate, burst)
+        self.concurrency = concurrency
+        self.max_rate = max_rate
+        self.controller_options = controller_options
+        self.controllers = {}
+
+    def controller(self, url):
+        bucket = self.bucket(url)
+        with self.lock:
+            if bucket not in self.controllers:
+                self.controllers[bucket] = AimdController(bucket, self.concurrency, max_rate=self.max_rate,
+                                                          **self.controller_options)
+            return self.controllers[bucket]
+
+    def acquire(self, url):
+        if not self.rate:
+            return 0.0
+        start = time.monotonic()
+        self.controller(url).acquire()
+        self.bucket(url).acquire()
+        return time.monotonic() - start
+
+    def release(self, url, seconds, ok=True):
+        if self.rate:
+            self.controller(url).release(seconds, ok)
+
+    def summary(self):
+        return {host: {'rate': bucket.rate, 'concurrency': int(self.controllers[bucket].concurrency)
+                       if bucket in self.controllers else None}
+                for host, bucket in self.buckets.items()}
@@ -0,0 +1,297 @@
+"""
+Incremental refresh of a finished crawl.
+
+A full crawl searches every prefix and opens every licensee's detail page. Between two
+runs almost nothing changes, so a refresh run starts from what the last run left behind:
+results/results.csv and the listings it recorded in the crawl state (each prefix's
+result count, a hash of its rows, or of the first page for a MANY result, and, for
+short lists, the rows themselves).
+
+A refresh run:
+- searches the seeds again and stops under any MANY prefix whose total and first page
+  are both unchanged;
+- re-expands any other MANY prefix and re-lists its children;
+- for a short list, opens only the rows it has not seen before (the listing hash
+  tells when a whole list is unchanged);
+- opens, first of all, the detail pages of licenses that are due: Active ones whose
+  Expired date has passed or falls within `expiring_days`, and any that expired within
+  the last `expiring_days`. Their leaf prefixes go to the front of the queue.
+
+A previous license that was not seen again in a re-listed part of the tree is removed.
+results.csv is rewritten with the merged rows, the same updates and removals are applied
+to the licensee store, and every difference is appended to results/changes.csv as added,
+removed, status_changed or expired_changed.
+
+Stopping under a MANY prefix is a guess. Its total and first page are all a search shows,
+so a licensee removed past the first page and another added in its place go unnoticed
+there until a full crawl. Licenses whose status changes without a change to their Expired
+date or listing row are also only caught by a full crawl, so refresh daily and crawl in
+full now and then.
+
+    python scraper.py --refresh --expiring-days 30
+"""
+import csv
+import logging
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+from crawlstate import row_hash
+from metrics import OUTCOME_EMPTY, OUTCOME_FEW, OUTCOME_MANY
+from tmb_http import listing_license
+from writer import FIELDNAMES, parse_date
+
+logger = logging.getLogger(__name__)
+
+EXPIRING_DAYS = 30
+CHANGES_FILE = 'results/changes.csv'
+CHANGE_FIELDS = ['run_at', 'change', 'License_Number', 'Full_Name', 'field', 'old', 'new']
+
+ADDED = 'added'
+REMOVED = 'removed'
+STATUS_CHANGED = 'status_changed'
+EXPIRED_CHANGED = 'expired_changed'
+
+
+def is_due(row, today, expiring_days=EXPIRING_DAYS):
+    """Whether a previous result row should have its detail page checked again."""
+    expired = parse_date(row.get('Expired'))
+    if expired is None:
+        return False
+    window = timedelta(days=expiring_days)
+    if expired > today + window:
+        return False
+    # Long-lapsed licenses that are no longer Active rarely change again.
+    return row.get('Status') == 'Active' or expired >= today - window
+
+
+class RefreshPlan:
+    """
+    What the last run knew, and what this refresh has found so far. Shared by the workers.
+
+    :param state: CrawlState holding the previous run's listings; refreshed listings are written back to it.
+    :param results_path: The previous run's results CSV, rewritten by finish().
+    :param expiring_days: Width of the window around today in which licenses are due for a re-check.
+    :param today: Reference date, today by default.
+    """
+
+    def __init__(self, state, results_path='results/results.csv', expiring_days=EXPIRING_DAYS, today=None):
+        self.state = state
+        self.results_path = results_path
+        self.today = today or date.today()
+        self.lock = threading.Lock()
+        self.previous = {}
+        if os.path.exists(results_path):
+            with open(results_path, newline='', encoding='utf-8') as file:
+                for row in csv.DictReader(file):
+                    self.previous[row['License_Number']] = row
+        self.listings = state.listings()
+        self.known_rows = {}  # row_key -> license
+        self.leaf_of = {}  # license -> prefix whose short list showed it
+        for prefix, row_key, license in state.listing_rows():
+            if license:
+                self.known_rows[row_key] = license
+                self.leaf_of[license] = prefix
+        self.due = {license for license, row in self.previous.items() if is_due(row, self.today, expiring_days)}
+        if not self.listings:
+            logger.warning("No listings recorded by a previous crawl; the refresh will search every prefix")
+
+        self.claimed = set()
+        self.relisted = set()  # short or empty prefixes listed completely this run
+        self.expanded = set()  # MANY prefixes whose total changed
+        self.failed = set()
+        self.seen = set()
+        self.updates = {}  # license -> refreshed row
+        self.searches = 0
+        self.details = 0
+        self.unchanged = 0
+
+    def frontier(self, seeds):
+        """Leaf prefixes holding due licenses, soonest Expired first, then the seeds."""
+        soonest = {}
+        for license in self.due:
+            prefix = self.leaf_of.get(license)
+            expired = parse_date(self.previous[license]['Expired'])
+            if prefix is not None and (prefix not in soonest or expired < soonest[prefix]):
+                soonest[prefix] = expired
+        leaves = sorted(soonest, key=lambda prefix: (soonest[prefix], prefix))
+        logger.info(f"Refresh: {len(self.previous)} previous licenses, {len(self.due)} due for a re-check "
+                    f"under {len(leaves)} prefixes")
+        return [(prefix, self.listings[prefix][0] if prefix in self.listings else len(prefix) - 1)
+                for prefix in leaves] + [(seed, 0) for seed in seeds]
+
+    def claim(self, prefix):
+        """True the first time prefix is searched in this run."""
+        with self.lock:
+            if prefix in self.claimed:
+                return False
+            self.claimed.add(prefix)
+            self.searches += 1
+            return True
+
+    def needs_detail(self, row_key, license):
+        """A row is opened when its listing row is new or its license is due, once per run."""
+        with self.lock:
+            known = self.known_rows.get(row_key)
+            if known is None:
+                return license is None or license not in self.updates
+            return known in self.due and known not in self.updates
+
+    def saw(self, licenses):
+        with self.lock:
+            self.seen.update(license for license in licenses if license)
+
+    def update(self, row):
+        with self.lock:
+            self.details += 1
+            self.updates[row['License_Number']] = row
+            self.seen.add(row['License_Number'])
+
+    def _relisted(self, leaf):
+        """Whether the previous leaf prefix was listed in full again, so a license missing from it is gone."""
+        if any(failed.startswith(leaf) or leaf.startswith(failed) for failed in self.failed):
+            return False
+        # Listed again itself, or under a prefix that shrank to a short list, or grown into a MANY
+        # whose (previously unknown) children were all listed.
+        return leaf in self.expanded or any(leaf[:end] in self.relisted for end in range(1, len(leaf) + 1))
+
+    def changes(self):
+        """(change, license, field, old, new) for everything that differs from the previous run."""
+        found = []
+        for license, row in self.updates.items():
+            old = self.previous.get(license)
+            if old is None:
+                found.append((ADDED, license, '', '', ''))
+                continue
+            if row['Status'] != old['Status']:
+                found.append((STATUS_CHANGED, license, 'Status', old['Status'], row['Status']))
+            if row['Expired'] != old['Expired']:
+                found.append((EXPIRED_CHANGED, license, 'Expired', old['Expired'], row['Expired']))
+        for license in self.previous:
+            if license not in self.seen and license in self.leaf_of and self._relisted(self.leaf_of[license]):
+                found.append((REMOVED, license, '', '', ''))
+        return found
+
+    def finish(self, changes_path=CHANGES_FILE, store=None):
+        """
+        Rewrite the results CSV with the refreshed rows, append the change log and return the changes.
+
+        :param store: LicenseStore to apply the same updates and removals to, if any.
+        """
+        changes = self.changes()
+        removed = {license for change, license, *_ in changes if change == REMOVED}
+        rows = [self.updates.get(license, row) for license, row in self.previous.items() if license not in removed]
+        rows += [row for license, row in self.updates.items() if license not in self.previous]
+        tmp = f'{self.results_path}.tmp'
+        with open(tmp, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=FIELDNAMES, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(rows)
+        os.replace(tmp, self.results_path)
+        if store is not None:
+            store.upsert(list(self.updates.values()))
+            store.delete(removed)
+
+        run_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+        new_log = not os.path.exists(changes_path)
+        with open(changes_path, 'a', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            if new_log:
+                writer.writerow(CHANGE_FIELDS)
+            for change, license, field, old, new in changes:
+                name = (self.updates.get(license) or self.previous.get(license))['Full_Name']
+                writer.writerow([run_at, change, license, name, field, old, new])
+
+        counts = {kind: sum(change == kind for change, *_ in changes)
+                  for kind in (ADDED, REMOVED, STATUS_CHANGED, EXPIRED_CHANGED)}
+        full = len(self.listings) + len(self.previous)
+        spent = self.searches + self.details
+        logger.info(f"Refresh: {self.searches} searches ({self.unchanged} unchanged), {self.details} detail pages; "
+                    f"{spent} requests against ~{full} for a full crawl ({spent / full:.1%})" if full else
+                    f"Refresh: {self.searches} searches, {self.details} detail pages")
+        logger.info(f"Refresh changes: {counts}; {len(rows)} licenses written to {self.results_path}")
+        if self.failed:
+            logger.warning(f"{len(self.failed)} prefixes failed; licenses under them were kept as they were")
+        return changes
+
+
+class RefreshWorker:
+    """
+    Scheduler-facing wrapper that refreshes prefixes instead of crawling them.
+
+    :param crawler: TexasLicenseeCrawler used for its search and detail backends, state and metrics.
+    :param plan: RefreshPlan shared by all workers.
+    """
+
+    def __init__(self, crawler, plan):
+        self.crawler = crawler
+        self.plan = plan
+
+    def searchPrefix(self, prefix, depth=0):
+        if not self.plan.claim(prefix):
+            return []
+        try:
+            children = self.refreshPrefix(prefix, depth)
+        except Exception:
+            with self.plan.lock:
+                self.plan.failed.add(prefix)
+                # Let the scheduler's retry search it again.
+                self.plan.claimed.discard(prefix)
+            raise
+        finally:
+            self.crawler.release_driver()
+        with self.plan.lock:
+            self.plan.failed.discard(prefix)
+        return children
+
+    def refreshPrefix(self, prefix, depth):
+        crawler, plan = self.crawler, self.plan
+        previous = plan.listings.get(prefix)
+        response = crawler.searchResults(prefix)
+        results = [user for user in response.results if user is not None]
+
+        if not results:
+            crawler.metrics.search(prefix, depth, OUTCOME_EMPTY)
+            crawler.state.record_listing(prefix, depth, 0, [])
+            with plan.lock:
+                plan.relisted.add(prefix)
+            return []
+
+        if len(results) >= 50:
+            crawler.metrics.search(prefix, depth, OUTCOME_MANY)
+            page = [crawler.listing_row_key(user) for user in results]
+            crawler.state.record_listing(prefix, depth, response.total, page=page)
+            # The first page catches churn the total hides (one licensee in, one out); deeper churn stays unseen.
+            if (previous is not None and response.total is not None and previous[1] == response.total
+                    and previous[3] == row_hash(page)):
+                with plan.lock:
+                    plan.unchanged += 1
+                return []
+            logger.info(f"{prefix}: {previous[1] if previous else 'unknown'} -> {response.total} results, re-listing")
+            with plan.lock:
+                plan.expanded.add(prefix)
+            return crawler.splitter.children(prefix, response.total)
+
+        crawler.metrics.search(prefix, depth, OUTCOME_FEW)
+        listing = []
+        for user in results:
+            row_key = crawler.listing_row_key(user)
+            listing.append((user, row_key, listing_license(row_key, user.text.strip()) or plan.known_rows.get(row_key)))
+        if previous is not None and previous[3] == row_hash(row_key for _, row_key, _ in listing):
+            with plan.lock:
+                plan.unchanged += 1
+        plan.saw(license for _, _, license in listing)
+
+        rows = []
+        for user, row_key, license in listing:
+            if plan.needs_detail(row_key, license):
+                record = crawler.record_fields(**crawler.fetch_detail(user))
+                plan.update(record)
+                crawler.metrics.record(prefix)
+                license = record['License_Number']
+            rows.append((row_key, license))
+        crawler.state.record_listing(prefix, depth, len(results), rows)
+        with plan.lock:
+            plan.relisted.add(prefix)
+        return []
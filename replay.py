@@ -0,0 +1,374 @@
+"""
+Record and replay Search.aspx pages, and benchmark the crawler offline against them.
+
+Recording: `python scraper.py --record results/pages.jsonl.gz` keeps a copy of every
+page the HTTP backend fetches: the search form, one results page per prefix and one
+detail page per listing row. The archive is gzip-compressed JSON lines. __VIEWSTATE and
+__EVENTVALIDATION are blanked before writing; they are most of each page's size and
+replay issues its own.
+
+Replay: create_replay_app() serves the archive through the same postback flow as the live site.
+It adds a fixed delay and a random error rate to every request. Searches for prefixes
+that were not recorded come back empty and are counted as misses.
+
+Benchmark: run the crawler against a replay server and report records per second,
+searches per record and peak memory. Each run is a separate crawl process started in a
+scratch directory, so its RSS is its own:
+
+    python replay.py results/pages.jsonl.gz --latency 0.05 --error-rate 0.01 --repeat 3 --save bench.json
+    python replay.py results/pages.jsonl.gz --compare bench.json    # exit 1 if records/s drop by >10%
+
+Without an archive at hand, `--record-fixture 3000` records one from fixture_server.py first.
+"""
+import argparse
+import csv
+import gzip
+import json
+import logging
+import os
+import random
+import re
+import secrets
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Flask, abort, request
+from lxml import html
+
+from tmb_http import FIRST_NAME_FIELD, parse_results
+
+logger = logging.getLogger(__name__)
+
+INPUT_RE = re.compile(r'<input\b[^>]*>', re.IGNORECASE)
+NAME_RE = re.compile(r'\bname="([^"]*)"')
+VALUE_RE = re.compile(r'\bvalue="[^"]*"')
+STATE_FIELDS = ('__VIEWSTATE', '__EVENTVALIDATION')
+NO_RESULTS = '<div><span>No records found.</span></div>'
+
+FORM = 'form'
+SEARCH = 'search'
+DETAIL = 'detail'
+
+
+def set_hidden(page, values):
+    """Replace the value of the named <input> fields in raw page HTML."""
+    def replace(match):
+        tag = match.group(0)
+        name = NAME_RE.search(tag)
+        if name is None or name.group(1) not in values:
+            return tag
+        return VALUE_RE.sub(lambda _: f'value="{values[name.group(1)]}"', tag, count=1)
+
+    return INPUT_RE.sub(replace, page)
+
+
+class PageArchive:
+    """
+    Recorded pages: the search form, results pages by prefix and detail pages by listing row.
+
+    :param path: Archive file, gzip-compressed JSON lines.
+    :param mode: 'r' to load an archive, 'w' to record a new one (replacing any file at path).
+    """
+
+    def __init__(self, path, mode='r'):
+        self.path = path
+        self.lock = threading.Lock()
+        self.form_page = None
+        self.searches = {}
+        self.details = {}
+        self.file = None
+        if mode == 'w':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self.file = gzip.open(path, 'wt', encoding='utf-8')
+            return
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # Tail of an archive whose recording was cut off.
+                self._store(entry['kind'], entry['key'], entry['page'])
+        if self.form_page is None:
+            raise ValueError(f'{path} has no search form page')
+
+    def _store(self, kind, key, page):
+        if kind == FORM:
+            self.form_page = page
+        elif kind == SEARCH:
+            self.searches[key] = page
+        elif kind == DETAIL:
+            self.details[key] = page
+
+    def _record(self, kind, key, page):
+        page = set_hidden(page, dict.fromkeys(STATE_FIELDS, ''))
+        with self.lock:
+            if kind == FORM and self.form_page is not None:
+                return
+            self._store(kind, key, '' if kind != FORM else page)
+            self.file.write(json.dumps({'kind': kind, 'key': key, 'page': page}) + '\n')
+
+    def form(self, page):
+        self._record(FORM, '', page)
+
+    def search(self, prefix, page):
+        self._record(SEARCH, prefix, page)
+
+    def detail(self, row_key, page):
+        self._record(DETAIL, row_key, page)
+
+    def summary(self):
+        return f"{len(self.searches)} results pages, {len(self.details)} detail pages"
+
+    def close(self):
+        if self.file is not None:
+            with self.lock:
+                self.file.close()
+            logger.info(f"Recorded {self.summary()} to {self.path} ({os.path.getsize(self.path) / 2 ** 20:.1f} MiB)")
+
+
+def create_replay_app(archive, latency=0.0, error_rate=0.0, seed=0, max_states=10000):
+    """
+    Flask app answering Search.aspx postbacks from a PageArchive.
+
+    :param latency: Seconds to sleep before answering each request.
+    :param error_rate: Fraction of requests answered with a 503 instead.
+    :param seed: Seed for the error draws, so runs fail the same requests.
+    :param max_states: How many issued view states to remember before the oldest expire.
+    """
+    app = Flask(__name__)
+    app.config.update(REQUEST_COUNT=0, ERROR_COUNT=0, MISSES=0)
+    rng = random.Random(seed)
+    states = OrderedDict()
+    grids = {}
+    lock = threading.Lock()
+
+    def issue(page, prefix=None):
+        viewstate = secrets.token_hex(16)
+        with lock:
+            states[viewstate] = prefix
+            while len(states) > max_states:
+                states.popitem(last=False)
+        return set_hidden(page, {'__VIEWSTATE': viewstate, '__EVENTVALIDATION': viewstate[::-1]})
+
+    def miss():
+        with lock:
+            app.config['MISSES'] += 1
+
+    def grid(prefix):
+        """Map the grid's postback arguments to their row keys, as the crawler computed them when recording."""
+        if prefix not in grids:
+            response = parse_results(html.fromstring(archive.searches[prefix]), request.base_url)
+            grids[prefix] = {row.event_argument: row.row_text or row.text for row in response.results}
+        return grids[prefix]
+
+    @app.before_request
+    def before():
+        with lock:
+            app.config['REQUEST_COUNT'] += 1
+            fail = error_rate and rng.random() < error_rate
+            if fail:
+                app.config['ERROR_COUNT'] += 1
+        if latency:
+            time.sleep(latency)
+        if fail:
+            abort(503, 'Injected error.')
+
+    @app.route('/Search.aspx', methods=['GET', 'POST'])
+    def search():
+        if request.method == 'GET':
+            return issue(archive.form_page)
+        with lock:
+            if request.form.get('__VIEWSTATE', '') not in states:
+                abort(400, 'Invalid view state.')
+            prefix = states[request.form['__VIEWSTATE']]
+
+        if request.form.get('__EVENTTARGET'):
+            page = archive.details.get(grid(prefix).get(request.form.get('__EVENTARGUMENT'))) if prefix else None
+            if page is None:
+                miss()
+                abort(404, 'Detail page was not recorded.')
+            return issue(page)
+
+        prefix = request.form.get(FIRST_NAME_FIELD, '').strip().upper()
+        if prefix not in archive.searches:
+            miss()
+            return issue(archive.form_page.replace('</form>', NO_RESULTS + '</form>', 1))
+        return issue(archive.searches[prefix], prefix)
+
+    return app
+
+
+def record_fixture(path, count=3000, seed=1):
+    """Record an archive by crawling a synthetic fixture_server.py population."""
+    from fixture_server import FixtureServer, create_app, generate_licensees
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    with FixtureServer(create_app(generate_licensees(count, seed))) as fixture, tempfile.TemporaryDirectory() as directory:
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--crawl', fixture.base_url,
+                        '--record', os.path.abspath(path)],
+                       cwd=directory, check=True, stdout=subprocess.DEVNULL)
+
+
+def crawl(base_url, workers=3, stats_path=None, record=None, rate=0.0):
+    """
+    One benchmark crawl in the current directory: fresh state, no prior, default seeds.
+
+    :param stats_path: Where to write the run's statistics as JSON.
+    :param record: Record the pages into this archive instead of just crawling.
+    :param rate: Starting rate of the adaptive limiter; 0 crawls unthrottled.
+    """
+    import resource
+    import string
+
+    import latency
+    from crawlstate import CrawlState
+    from dedup import LicenseIndex
+    from driverpool import DriverPool
+    from exclusion import ExclusionIndex
+    from metrics import CrawlMetrics
+    from ratelimit import AdaptiveRateLimiter
+    from scheduler import CrawlScheduler
+    from scraper import TexasLicenseeCrawler, search_init_filters_letters
+    from splitting import AdaptiveSplitter
+    from writer import CsvSink, ResultWriter
+
+    seeds = [letter for bucket in search_init_filters_letters for letter in bucket]
+    splitter = AdaptiveSplitter(string.ascii_uppercase)
+    os.makedirs('excep', exist_ok=True)
+    state = CrawlState()
+    exclusions = ExclusionIndex()
+    licenses = LicenseIndex()
+    os.makedirs('results', exist_ok=True)
+    writer = ResultWriter([CsvSink('results/results.csv')])
+    driver_pool = DriverPool(workers, prewarm=False)
+    rate_limiter = AdaptiveRateLimiter(rate, workers)
+    metrics = CrawlMetrics(state, driver_pool, rate_limiter=rate_limiter)
+    recorder = PageArchive(record, 'w') if record else None
+    bots = [TexasLicenseeCrawler(seeds, 'http', base_url, rate_limiter, splitter, exclusions, state, licenses, writer,
+                                 driver_pool, metrics, recorder) for _ in range(workers)]
+    scheduler = CrawlScheduler(bots, bots[0].start_or_resume(fresh=True))
+    start = time.perf_counter()
+    try:
+        scheduler.run()
+    finally:
+        for bot in bots:
+            bot.close()
+        driver_pool.close()
+        writer.close()
+        metrics.close()
+        exclusions.close()
+        state.close()
+        if recorder is not None:
+            recorder.close()
+    elapsed = time.perf_counter() - start
+    with open('results/results.csv', newline='', encoding='utf-8') as file:
+        records = [row['License_Number'] for row in csv.DictReader(file)]
+    stats = {
+        'seconds': elapsed,
+        'records': len(records),
+        'unique_records': len(set(records)),
+        'searches': metrics.searches,
+        'retries': scheduler.retries,
+        'records_per_second': len(records) / elapsed if elapsed else 0.0,
+        'searches_per_record': metrics.searches / len(records) if records else None,
+        # ru_maxrss is KiB on Linux.
+        'peak_rss_mib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'latency': latency.summaries(),
+    }
+    if stats_path:
+        with open(stats_path, 'w', encoding='utf-8') as file:
+            json.dump(stats, file, indent=4)
+    return stats
+
+
+def benchmark(archive_path, workers=3, latency=0.0, error_rate=0.0, repeat=1, rate=0.0):
+    """Replay the archive `repeat` times and return the median run's statistics and every run."""
+    from fixture_server import FixtureServer
+
+    archive = PageArchive(archive_path)
+    expected = len(archive.details)
+    logger.info(f"Replaying {archive.summary()} from {archive_path}")
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    runs = []
+    for attempt in range(repeat):
+        app = create_replay_app(archive, latency, error_rate, seed=attempt)
+        with FixtureServer(app) as server, tempfile.TemporaryDirectory() as directory:
+            stats_path = os.path.join(directory, 'stats.json')
+            subprocess.run([sys.executable, os.path.abspath(__file__), '--crawl', server.base_url,
+                            '--workers', str(workers), '--stats', stats_path, '--rate', str(rate)],
+                           cwd=directory, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            with open(stats_path, encoding='utf-8') as file:
+                stats = json.load(file)
+        stats.update(requests=app.config['REQUEST_COUNT'], injected_errors=app.config['ERROR_COUNT'],
+                     misses=app.config['MISSES'], completeness=stats['unique_records'] / expected if expected else None)
+        runs.append(stats)
+        print(f"run {attempt + 1}: {stats['records']} records ({stats['completeness']:.1%} of recorded) in "
+              f"{stats['seconds']:.1f}s, {stats['records_per_second']:.1f} records/s, "
+              f"{stats['searches_per_record']:.2f} searches/record, peak RSS {stats['peak_rss_mib']:.0f} MiB, "
+              f"{stats['injected_errors']} injected errors, {stats['retries']} retries, {stats['misses']} misses")
+    median = sorted(runs, key=lambda stats: stats['records_per_second'])[len(runs) // 2]
+    summary = {key: median[key] for key in ('records_per_second', 'searches_per_record', 'peak_rss_mib', 'completeness')}
+    summary.update(workers=workers, rate=rate, latency=latency, error_rate=error_rate, archive=os.path.basename(archive_path),
+                   records_per_second_stdev=statistics.pstdev(run['records_per_second'] for run in runs))
+    return summary, runs
+
+
+def compare(summary, baseline, tolerance=0.1):
+    """Regressions of summary against a saved baseline summary, as messages; empty when none."""
+    regressions = []
+    if summary['records_per_second'] < baseline['records_per_second'] * (1 - tolerance):
+        regressions.append(f"records/s {summary['records_per_second']:.1f} < baseline {baseline['records_per_second']:.1f}")
+    if summary['searches_per_record'] > baseline['searches_per_record'] * (1 + tolerance):
+        regressions.append(f"searches/record {summary['searches_per_record']:.2f} > "
+                           f"baseline {baseline['searches_per_record']:.2f}")
+    if summary['peak_rss_mib'] > baseline['peak_rss_mib'] * (1 + tolerance):
+        regressions.append(f"peak RSS {summary['peak_rss_mib']:.0f} MiB > baseline {baseline['peak_rss_mib']:.0f} MiB")
+    if summary['completeness'] < baseline['completeness'] - 0.001:
+        regressions.append(f"completeness {summary['completeness']:.1%} < baseline {baseline['completeness']:.1%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the crawler offline against recorded Search.aspx pages.')
+    parser.add_argument('archive', nargs='?', default='results/pages.jsonl.gz', help='archive from scraper.py --record')
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--rate', type=float, default=0.0, help='starting rate of the adaptive limiter (0 = unthrottled)')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds of delay per replayed request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with a 503')
+    parser.add_argument('--repeat', type=int, default=1, help='runs to take the median of')
+    parser.add_argument('--save', default=None, help='write the summary as JSON, e.g. as a baseline')
+    parser.add_argument('--compare', default=None, help='baseline summary to check for regressions (exit 1 if any)')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative regression')
+    parser.add_argument('--record-fixture', type=int, default=None, metavar='COUNT',
+                        help='first record the archive from a fixture_server.py population of COUNT licensees')
+    parser.add_argument('--crawl', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--stats', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--record', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.crawl:
+        crawl(args.crawl, args.workers, args.stats, args.record, args.rate)
+        return
+    if args.record_fixture:
+        record_fixture(args.archive, args.record_fixture)
+    summary, runs = benchmark(args.archive, args.workers, args.latency, args.error_rate, args.repeat, args.rate)
+    print(json.dumps(summary, indent=4))
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as file:
+            json.dump(dict(summary, runs=runs), file, indent=4)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            regressions = compare(summary, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION: {regression}')
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
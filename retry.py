@@ -0,0 +1,49 @@
+"""
+Retry policy for prefixes whose search or detail pages failed.
+
+A prefix that fails (the search errored, the site throttled us, or a detail row could
+not be fetched) is not marked done or EMPTY. The scheduler puts it back on the queue
+after a capped exponential backoff with jitter. Rows already captured are skipped on
+the retry, so only the missing ones are fetched again. After `max_attempts` the prefix
+is left unfinished in the crawl state; the next run resumes it.
+"""
+import random
+
+
+class PrefixIncomplete(Exception):
+    """Some rows of a prefix's short list could not be scraped; the prefix has to be retried."""
+
+    def __init__(self, prefix, failed):
+        super().__init__(f'{failed} rows of {prefix!r} failed')
+        self.prefix = prefix
+        self.failed = failed
+
+
+class SearchFailed(Exception):
+    """A search could not be completed, as opposed to one that found nothing."""
+
+
+class RetryPolicy:
+    """
+    Capped exponential backoff.
+
+    :param max_attempts: Tries per prefix, the first one included.
+    :param base: Delay in seconds before the first retry.
+    :param cap: Longest delay between two tries.
+    :param jitter: Fraction of each delay drawn at random, so failed prefixes do not all come back at once.
+    """
+
+    def __init__(self, max_attempts=6, base=2.0, cap=120.0, jitter=0.5, rng=None):
+        self.max_attempts = max_attempts
+        self.base = base
+        self.cap = cap
+        self.jitter = jitter
+        self.rng = rng or random.Random()
+
+    def delay(self, attempt):
+        """Seconds to wait after the attempt-th failure (1-based)."""
+        delay = min(self.cap, self.base * 2 ** (attempt - 1))
+        return delay * (1 - self.jitter * self.rng.random())
+
+    def should_retry(self, attempt):
+        return attempt < self.max_attempts
@@ -0,0 +1,102 @@
+"""
+Work-queue scheduler for the prefix crawl.
+
+Every node of the advancedPrefixSearch tree goes onto one shared asyncio queue, and
+N workers pull from it. A worker that finds a "MANY" prefix pushes its children back
+onto the queue, so any idle worker can pick them up instead of one thread owning a
+whole letter bucket. A prefix whose search fails goes back onto the queue after the
+retry policy's backoff (see retry.py).
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from retry import PrefixIncomplete, RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+
+class CrawlScheduler:
+    """
+    Balance prefix searches across a pool of crawlers.
+
+    :param crawlers: TexasLicenseeCrawler instances, one per worker. Their blocking
+        searchPrefix calls run on a dedicated thread each.
+    :param frontier: (prefix, depth) nodes to start from, e.g. CrawlState.frontier().
+    :param retry: RetryPolicy for failed prefixes; a default one if omitted.
+    """
+
+    def __init__(self, crawlers, frontier, retry=None):
+        self.crawlers = crawlers
+        self.frontier = list(frontier)
+        self.retry = retry or RetryPolicy()
+        self.searches = 0
+        self.retries = 0
+        self.attempts = {}
+        self.failed = []
+        self.queue = None
+        self.pending_retries = set()
+
+    def _retry_later(self, queue, prefix, depth, error):
+        """Schedule a failed prefix to be queued again; False when it has used up its attempts."""
+        attempt = self.attempts[prefix] = self.attempts.get(prefix, 0) + 1
+        if not self.retry.should_retry(attempt):
+            logger.error(f"Giving up on prefix {prefix!r} after {attempt} attempts; it stays unfinished for the next run",
+                         exc_info=not isinstance(error, PrefixIncomplete))
+            self.failed.append(prefix)
+            return False
+        delay = self.retry.delay(attempt)
+        self.retries += 1
+        logger.warning(f"Prefix {prefix!r} failed ({error}); retry {attempt}/{self.retry.max_attempts - 1} in {delay:.1f}s")
+
+        async def requeue():
+            await asyncio.sleep(delay)
+            queue.put_nowait((prefix, depth))
+            # Only now is the failed attempt done, so the queue never looks drained while a retry waits.
+            queue.task_done()
+
+        task = asyncio.create_task(requeue())
+        self.pending_retries.add(task)
+        task.add_done_callback(self.pending_retries.discard)
+        return True
+
+    async def _worker(self, queue, crawler, executor):
+        loop = asyncio.get_running_loop()
+        while True:
+            prefix, depth = await queue.get()
+            retrying = False
+            try:
+                children = await loop.run_in_executor(executor, crawler.searchPrefix, prefix, depth)
+                self.searches += 1
+                self.attempts.pop(prefix, None)
+                # Push children in reverse so the LIFO queue pops them in alphabetical order.
+                for child in reversed(children):
+                    queue.put_nowait((child, depth + 1))
+            except Exception as e:
+                retrying = self._retry_later(queue, prefix, depth, e)
+            finally:
+                if not retrying:
+                    queue.task_done()
+
+    async def crawl(self):
+        """Run until the queue is drained and every worker is idle."""
+        # LIFO keeps the frontier depth-first, so it stays small instead of holding whole tree levels.
+        queue = self.queue = asyncio.LifoQueue()
+        for prefix, depth in reversed(self.frontier):
+            queue.put_nowait((prefix, depth))
+
+        with ThreadPoolExecutor(max_workers=len(self.crawlers), thread_name_prefix='crawler') as executor:
+            workers = [asyncio.create_task(self._worker(queue, crawler, executor)) for crawler in self.crawlers]
+            await queue.join()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    def queue_depth(self):
+        """Prefixes waiting to be searched, for metrics; safe to read from another thread."""
+        return self.queue.qsize() if self.queue is not None else len(self.frontier)
+
+    def run(self):
+        asyncio.run(self.crawl())
+        logger.info(f"Scheduler finished: {self.searches} searches across {len(self.crawlers)} workers, "
+                    f"{self.retries} retries, {len(self.failed)} prefixes given up")
@@ -2,22 +2,25 @@
 Created on December 29, 2024
 
 This script is a web crawler designed to scrape licensee information from the Texas Medical Board website.
-It uses Selenium with undetected_chromedriver to avoid detection and handles various edge cases.
+By default it talks to Search.aspx over plain HTTP (see tmb_http.py) and only falls back to
+Selenium with undetected_chromedriver when the HTTP flow fails.
 
 Requirements:
-pip install selenium undetected-chromedriver selenium seleniumbase webdriver-manager
+pip install selenium undetected-chromedriver selenium seleniumbase webdriver-manager requests lxml
 """
-import threading
+import argparse
 import csv
 import logging
-import json
 import os
+import string
 import time
+from functools import partial
 import warnings
 import colorama
 from pathlib import Path
 from threading import Lock
 from colorama import Back, Fore, Style
+import requests
 import undetected_chromedriver as uc
 import urllib3
 from selenium.common.exceptions import StaleElementReferenceException, ElementClickInterceptedException
@@ -26,6 +29,24 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 from webdriver_manager.chrome import ChromeDriverManager
+from crawlstate import EMPTY, CrawlState
+from dedup import LicenseIndex, compact_csv
+from driverpool import DriverPool, chrome_options
+from exclusion import ExclusionIndex
+from latency import timed
+from licensestore import LicenseStore
+import latency
+from metrics import OUTCOME_EMPTY, OUTCOME_FEW, OUTCOME_MANY, CrawlMetrics
+from profiler import SamplingProfiler
+from refresh import EXPIRING_DAYS, RefreshPlan, RefreshWorker
+from replay import PageArchive
+from retry import PrefixIncomplete, RetryPolicy, SearchFailed
+from ratelimit import AdaptiveRateLimiter
+from scheduler import CrawlScheduler
+from splitting import AdaptiveSplitter, PrefixPrior
+from waits import causes_postback, wait_for_detail, wait_for_postback, wait_for_results
+from writer import CsvSink, ResultWriter, create_sinks
+from tmb_http import SearchPageError, SearchResponse, SearchResult, TMBHttpBackend, listing_license, result_total, throttled
 
 # Initialize colorama for colored console output
 colorama.init(autoreset=True)
@@ -39,33 +60,68 @@ logger = logging.getLogger(__name__)
 
 search_init_filters_letters = [['B', 'C', 'T'], ['U', 'V', 'W'], ['X', 'Y', 'Z']]
 
+# Every crawler appends to the same output file, so they share one lock.
+csv_lock = Lock()
+
+
+def tree_branch(prefix, depth):
+    """A searched prefix as a branch of the printed search tree."""
+    label = Fore.YELLOW + prefix + Fore.RESET
+    if depth == 0:
+        return label
+    if depth == 1:
+        return f"Ͱ----{label}"
+    return f"|{'    ' * (depth - 1)}└---{label}"
+
+
+def tree_leaf(depth):
+    """Indent of a record printed under a prefix at depth."""
+    return '' if depth == 0 else f"|{'    ' * depth}Ͱ---"
+
+
 class TexasLicenseeCrawler:
     """
     A web crawler to scrape licensee information from the Texas Medical Board website.
     """
 
-    def __init__(self, prefix):
-        """Initialize the crawler with necessary configurations."""
-        self.base_url = 'https://profile.tmb.state.tx.us/Search.aspx?055e0f2c-0f98-49ff-8c47-d73f387619ec'
+    def __init__(self, prefix, backend='http', base_url=None, rate_limiter=None, splitter=None, exclusions=None, state=None, licenses=None, writer=None, driver_pool=None, metrics=None, recorder=None):
+        """
+        Initialize the crawler with necessary configurations.
+
+        :param prefix: Top-level prefixes this crawler is responsible for.
+        :param backend: 'http' to use the postback engine with Selenium as fallback, 'selenium' for the browser only.
+        :param base_url: Override the Search.aspx URL, e.g. to point at fixture_server.py.
+        :param rate_limiter: HostRateLimiter (or AdaptiveRateLimiter) shared with the other crawlers, if any.
+        :param splitter: AdaptiveSplitter shared with the other crawlers; a prior-less one is created if omitted.
+        :param exclusions: ExclusionIndex of finished prefixes shared with the other crawlers; loaded from excep/searcher.json if omitted.
+        :param state: CrawlState checkpoint store shared with the other crawlers; opened at results/crawl_state.sqlite3 if omitted.
+        :param licenses: LicenseIndex of already scraped licenses shared with the other crawlers.
+        :param writer: ResultWriter shared with the other crawlers; a CSV-only one is started if omitted.
+        :param driver_pool: DriverPool to lease browsers from; without one the crawler starts its own Chrome.
+        :param metrics: CrawlMetrics shared with the other crawlers; a private one is created if omitted.
+        :param recorder: replay.PageArchive that keeps every page the HTTP backend fetches, for offline replay.
+        """
+        self.base_url = base_url or 'https://profile.tmb.state.tx.us/Search.aspx?055e0f2c-0f98-49ff-8c47-d73f387619ec'
         self.output_file = 'results/results.csv'
-        self.csv_lock = Lock()
+        self.csv_lock = csv_lock
         self.timeout = 120  # Total time to wait (in seconds)
         self.poll_interval = 2  # Time between checks (in seconds)
         self.prefix = prefix
+        self.driver = None
+        self.http = TMBHttpBackend(self.base_url, rate_limiter=rate_limiter, recorder=recorder) if backend == 'http' else None
 
-        # Chrome options and preferences
-        self.chrome_options = uc.ChromeOptions()
-        self.chrome_options.add_argument("--disable-extensions")
-        self.chrome_options.add_argument("--disable-popup-blocking")
-        self.chrome_options.add_argument("--ignore-certificate-errors")
-        self.chrome_options.add_argument("--disable-plugins-discovery")
-        self.chrome_options.add_argument("--disable-gpu")
-        self.chrome_options.add_argument("--no-sandbox")
-        self.chrome_options.add_argument("--disable-dev-shm-usage")
+        # Chrome options and preferences (images, CSS and fonts are blocked)
+        self.chrome_options = chrome_options()
+        self.driver_pool = driver_pool
 
         # Search filters and configurations
         self.search_filters_letters = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L', 'M', 'N', 'O', 'P', 'Q', 'R', 'S', 'T', 'U', 'V', 'W', 'X', 'Y', 'Z']
-        # self.excep_searcher = [] #this is exception searcher
+        self.splitter = splitter or AdaptiveSplitter(self.search_filters_letters)
+        self.exclusions = exclusions if exclusions is not None else ExclusionIndex()
+        self.state = state if state is not None else CrawlState()
+        self.licenses = licenses if licenses is not None else LicenseIndex()
+        self.metrics = metrics if metrics is not None else CrawlMetrics(self.state, driver_pool)
+        self.prefix_records = 0
 
         # Professional names with license type
         self.board_names_with_professional_names = {
@@ -81,94 +137,17 @@ class TexasLicenseeCrawler:
                 self.search_filters.append((board_name, professional_name_and_info))
 
         os.makedirs('results', exist_ok=True)
+        self.writer = writer if writer is not None else ResultWriter([CsvSink(self.output_file)])
 
     def remove_duplicates_in_csv(self):
-        """Remove duplicate rows in the CSV based on all columns."""
+        """Remove rows whose License_Number was already written, streaming so memory stays bounded."""
         with self.csv_lock:
-            # Read existing data from the file
-            try:
-                with open(self.output_file, 'r', encoding='utf-8') as csvfile:
-                    reader = csv.DictReader(csvfile)
-                    existing_data = list(reader)
-            except FileNotFoundError:
-                existing_data = []
-
-            duplicate_count = 0
-            # Remove duplicates based on all columns
-            seen_rows = set()
-            unique_data = []
-            for row in existing_data:
-                # Create a tuple of all values in the row to track duplicates
-                row_tuple = tuple(row.items())  # Hashable representation of the row
-                if row_tuple not in seen_rows:
-                    seen_rows.add(row_tuple)
-                    unique_data.append(row)
-                else:
-                    duplicate_count += 1
-
-            logger.info(f"Duplicates found: {duplicate_count}")
-
-            # Write the unique data back to the CSV
-            if existing_data:  # Ensure there is data to infer fieldnames
-                fieldnames = existing_data[0].keys()
-            else:
-                fieldnames = []
-
-            with open(self.output_file, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(unique_data)
-
-    def write_excep_searcher(self, data, mode='w'):
-        """
-        Writes or appends data to a JSON file.
-        
-        :param file_path: Path to the JSON file.
-        :param data: Data to write (must be a dictionary or list).
-        :param mode: 'w' to overwrite, 'a' to append (default is 'w').
-        """
-        file_path = 'excep/searcher.json'
-        try:
-            if mode == 'a' and os.path.exists(file_path):
-                # Read existing data if appending
-                with open(file_path, 'r') as file:
-                    existing_data = json.load(file)
-                if isinstance(existing_data, list):
-                    existing_data.append(data)  # Append to list
-                else:
-                    existing_data = [existing_data, data]  # Convert to list and append
-                data = existing_data
-
-            # Write data to file with indentation
-            with open(file_path, 'w') as file:
-                json.dump(data, file, indent=4)
-            # print(f"Data written to {file_path} successfully.")
-        except Exception as e:
-            print(f"Error writing to JSON file: {e}")
-
-    def read_excep_searcher(self):
-        """
-        Reads data from a JSON file.
-        
-        :param file_path: Path to the JSON file.
-        :return: Data from the JSON file (dictionary or list).
-        """
-
-        file_path = 'excep/searcher.json'
-        try:
-            with open(file_path, 'r') as file:
-                data = json.load(file)
-            return data
-        except Exception as e:
-            print(f"Error reading JSON file: {e}")
-            return None
-        
-
+            if os.path.exists(self.output_file):
+                compact_csv(self.output_file)
 
     def extra(self, text):
-        """Check if the text contains any of the exceptions."""
-        excep_searcher = self.read_excep_searcher()
-        return any(t in text for t in excep_searcher)
+        """Check if the text is covered by an already finished (EMPTY or fully scraped) prefix."""
+        return self.exclusions.covers(text)
 
     def waited_for_windows_load(self, ch_driver, time_out=100):
         """Wait for the driver to load the window."""
@@ -185,164 +164,443 @@ class TexasLicenseeCrawler:
         """Generate two-letter prefixes based on a given prefix."""
         return [prefix + letter for letter in self.search_filters_letters]
 
-    def save_to_csv(self, results):
-        """Save results to CSV in a thread-safe manner."""
-        with self.csv_lock:
-            with open(self.output_file, 'a', newline='', encoding='utf-8') as csvfile:
-                fieldnames = ["Full_Name", "License_Type", "License_Number", "Status", "Professional", "Issued", "Expired"]
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                for result in results:
-                    writer.writerow(result)
+    def save_to_csv(self, results, on_saved=None):
+        """
+        Queue results for the background writer, dropping licenses that were already written.
 
-    def dataInput(self, name, license, status, professional, issuance_date, expiration_date):
-        """Prepare and save data to CSV."""
-        fields = {
-            "Full_Name": name.text.replace(' ', '').split(',')[0],
-            "License_Type": name.text.replace(' ', '').split(',')[1],
-            "License_Number": license.text,
-            "Issued": issuance_date.text,
-            "Expired": expiration_date.text,
-            "Status": status.text,
-            "Professional": professional.text
+        :param on_saved: Called once the results are durably written (or turned out to be duplicates).
+        """
+        results = [result for result in results if not self.licenses.claim(result["License_Number"])]
+        for result in results[:-1]:
+            self.writer.put(result)
+        if results:
+            self.writer.put(results[-1], on_saved)
+        elif on_saved is not None:
+            on_saved()
+
+    @staticmethod
+    def record_fields(name, license, status, professional, issuance_date, expiration_date):
+        """Turn a detail page's raw field texts into a results CSV row."""
+        return {
+            "Full_Name": name.replace(' ', '').split(',')[0],
+            "License_Type": name.replace(' ', '').split(',')[1],
+            "License_Number": license,
+            "Issued": issuance_date,
+            "Expired": expiration_date,
+            "Status": status,
+            "Professional": professional
         }
+
+    def dataInput(self, name, license, status, professional, issuance_date, expiration_date, on_saved=None):
+        """Prepare and save data to CSV."""
+        fields = self.record_fields(name, license, status, professional, issuance_date, expiration_date)
         if fields:
-            self.save_to_csv([fields])
+            self.save_to_csv([fields], on_saved)
+            self.splitter.note_license(license)
+
+    def print_record(self, depth, name, license, status, professional, issuance_date, expiration_date):
+        """Print one scraped record as a branch of the prefix tree."""
+        print(f"{tree_leaf(depth)}{Fore.LIGHTGREEN_EX}name: {name}{Fore.RESET}, {Fore.LIGHTGREEN_EX}\tlicense: {license}{Fore.RESET}, {Fore.LIGHTGREEN_EX}\tstatus: {status}{Fore.RESET}, {Fore.LIGHTGREEN_EX}\tprofessional: {professional}{Fore.RESET}, {Fore.LIGHTGREEN_EX}\tissuance: {issuance_date}{Fore.RESET}, {Fore.LIGHTGREEN_EX}\texpiration: {expiration_date}{Fore.RESET}" )
+
+    def scraping_get_data_http(self, user, depth, on_saved=None):
+        """Fetch a result row's detail page over HTTP and save it."""
+        detail = self.http.fetch_detail(user)
+        self.dataInput(**detail, on_saved=on_saved)
+        self.print_record(depth, **detail)
+        return detail
 
-    def scraping_get_data(self, prefix, depth):
+    def scraping_get_data(self, prefix, depth, on_saved=None):
         """Scrape and save data from the current page."""
-        name = WebDriverWait(self.driver, 10).until(EC.presence_of_element_located((By.XPATH, '/html/body/form/div[2]/div[2]/div[1]/table/tbody/tr[1]/td/label[2]')))
-        license = WebDriverWait(self.driver, 10).until(EC.presence_of_element_located((By.XPATH, '/html/body/form/div[2]/div[2]/div[1]/table/tbody/tr[2]/td/label[2]')))
-        status = WebDriverWait(self.driver, 10).until(EC.presence_of_element_located((By.XPATH, '/html/body/form/div[2]/div[2]/div[1]/table/tbody/tr[4]/td/label[2]')))
-        professional = WebDriverWait(self.driver, 10).until(EC.presence_of_element_located((By.XPATH, '/html/body/form/div[2]/div[2]/div[1]/div[2]/div[2]/div/table/tbody/tr[3]/td/label[3]')))
-        issuance_date = WebDriverWait(self.driver, 10).until(EC.presence_of_element_located((By.XPATH, '/html/body/form/div[2]/div[2]/div[1]/div[2]/div[2]/div/table/tbody/tr[4]/td/label[2]')))
-        expiration_date = WebDriverWait(self.driver, 10).until(EC.presence_of_element_located((By.XPATH, '/html/body/form/div[2]/div[2]/div[1]/div[2]/div[2]/div/table/tbody/tr[5]/td/label[2]')))
-        self.dataInput(name, license, status, professional, issuance_date, expiration_date)
-        print(f"{'' if depth == 0 else f'|{'    '*(depth)}Ͱ---'}{Fore.LIGHTGREEN_EX}name: {name.text}{Fore.RESET}, {Fore.LIGHTGREEN_EX}\tlicense: {license.text}{Fore.RESET}, {Fore.LIGHTGREEN_EX}\tstatus: {status.text}{Fore.RESET}, {Fore.LIGHTGREEN_EX}\tprofessional: {professional.text}{Fore.RESET}, {Fore.LIGHTGREEN_EX}\tissuance: {issuance_date.text}{Fore.RESET}, {Fore.LIGHTGREEN_EX}\texpiration: {expiration_date.text}{Fore.RESET}" )
+        with timed('field_extract'):
+            detail = wait_for_detail(self.driver)
+        self.dataInput(**detail, on_saved=on_saved)
+        self.print_record(depth, **detail)
         homebutton = WebDriverWait(self.driver, 10).until(EC.presence_of_element_located((By.XPATH, '/html/body/form/div[2]/div[1]/div[1]/ul/li[2]/a')))
         homebutton.click()
-        time.sleep(2)
+        wait_for_postback(self.driver, homebutton)
+        return detail
+
+    def fetch_detail(self, user):
+        """Open a result row's detail page, over HTTP or in the browser, and return its raw field texts without saving."""
+        if isinstance(user, SearchResult):
+            return self.http.fetch_detail(user)
+        self.driver.execute_script("arguments[0].scrollIntoView();", user)
+        WebDriverWait(self.driver, 5).until(EC.element_to_be_clickable(user))
+        with timed('detail_load'):
+            user.click()
+            wait_for_postback(self.driver, user)
+        with timed('field_extract'):
+            detail = wait_for_detail(self.driver)
+        homebutton = WebDriverWait(self.driver, 10).until(EC.presence_of_element_located((By.XPATH, '/html/body/form/div[2]/div[1]/div[1]/ul/li[2]/a')))
+        homebutton.click()
+        wait_for_postback(self.driver, homebutton)
+        return detail
+
+    def start_driver(self):
+        """Start or lease Chrome on first use, so HTTP-only runs never launch a browser."""
+        if self.driver is None:
+            if self.driver_pool is not None:
+                self.driver = self.driver_pool.acquire()
+            else:
+                path = ChromeDriverManager().install()
+                self.driver = uc.Chrome(options=self.chrome_options, headless=True, driver_executable_path=path)
+        return self.driver
+
+    def release_driver(self):
+        """Hand a leased browser back to the pool between prefixes."""
+        if self.driver_pool is not None and self.driver is not None:
+            self.driver_pool.release(self.driver)
+            self.driver = None
+
+    def searchResults(self, prefix):
+        """Search for licensees based on a prefix, over HTTP when possible and Selenium otherwise."""
+        if self.http is not None:
+            try:
+                return self.http.search(prefix)
+            except (requests.RequestException, SearchPageError) as e:
+                if throttled(e):
+                    # A browser would only add load; let the scheduler retry the prefix after a backoff.
+                    raise SearchFailed(f"Search for {prefix!r} throttled: {e}") from e
+                logger.warning(f"HTTP search for {prefix!r} failed ({e}); falling back to Selenium.")
+        userlists = self.selenium_searchList(prefix)
+        return SearchResponse(userlists, result_total(self.driver.page_source) if userlists else None)
 
     def searchList(self, prefix):
+        """Search for licensees based on a prefix and return only the result rows."""
+        return self.searchResults(prefix).results
+
+    def selenium_searchList(self, prefix):
         try:
             """Search for licensees based on a prefix."""
+            self.start_driver()
             self.driver.get(self.base_url)
             self.waited_for_windows_load(self.driver)
             board_input_element = WebDriverWait(self.driver, 10).until(
                 EC.presence_of_element_located((By.XPATH, "//input[@name='ctl00$BodyContent$tbFirstName']")))
             board_input_element.clear()
             board_input_element.send_keys(prefix)
-            time.sleep(2)
 
             license_type_input_element = WebDriverWait(self.driver, 10).until(
                 EC.presence_of_element_located((By.XPATH, "//select[@name='ctl00$BodyContent$ddLicenseType']")))
             license_type_input_element.send_keys('Physician')
-            self.waited_for_windows_load(self.driver)
-            time.sleep(2)
+            if causes_postback(license_type_input_element):
+                wait_for_postback(self.driver, license_type_input_element)
 
             license_submit_button = WebDriverWait(self.driver, 10).until(
                 EC.presence_of_element_located((By.XPATH, "//input[@name='ctl00$BodyContent$btnSearch']")))
-            license_submit_button.click()
-            self.waited_for_windows_load(self.driver)
-            time.sleep(2)
-            contacts_list = []
-        
-            contacts_list = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_all_elements_located((By.CSS_SELECTOR, 'tr td a'))
-            )
+            with timed('search_submit'):
+                license_submit_button.click()
+                WebDriverWait(self.driver, 30).until(EC.staleness_of(license_submit_button))
+            with timed('grid_render'):
+                contacts_list = wait_for_results(self.driver)
             if not contacts_list:
                 print(f"------------------------------------------------------------------------------------------------------------------------------------------{Fore.RED}No contacts found.")
-        except TimeoutException:
-            contacts_list = []  # Return an empty list instead of failing
+        except TimeoutException as e:
+            # Not an empty result: the page never finished, so the prefix must not be marked EMPTY.
+            raise SearchFailed(f"Search for {prefix!r} timed out") from e
         except Exception as e:
             print(f"-------------------------------------------------------------------------------------------------------------------------------------------{Back.RED}{Fore.BLACK}Unexpected error: {e}")
-            contacts_list = []  # Return an empty list instead of failing
-        
+            raise SearchFailed(f"Search for {prefix!r} failed: {e}") from e
+
         return contacts_list
 
+    def finish_prefix(self, prefix):
+        """Record a fully scraped prefix as finished in the exclusion index and the crawl state."""
+        self.exclusions.add(prefix)
+        self.state.finish(prefix)
+
+    def count_record(self, prefix):
+        self.prefix_records += 1
+        self.metrics.record(prefix)
+
+    def listing_row_key(self, user):
+        """Text of the whole results-grid row a user link sits in, used as its dedup key."""
+        if isinstance(user, SearchResult):
+            return user.row_text or user.text
+        try:
+            return ' '.join(user.find_element(By.XPATH, './ancestor::tr[1]').text.split())
+        except NoSuchElementException:
+            return user.text.strip()
+
+    def searchPrefix(self, prefix, depth=0):
+        """Search a single prefix, scrape its users when the list is complete, and return the child prefixes still to search."""
+        start = time.perf_counter()
+        self.prefix_records = 0
+        try:
+            return self.scrapePrefix(prefix, depth)
+        finally:
+            self.release_driver()
+            self.metrics.prefix_cost(prefix, depth, time.perf_counter() - start, self.prefix_records)
+
+    def scrapePrefix(self, prefix, depth):
+        """Body of searchPrefix; may leave a leased browser in self.driver."""
+        if self.extra(prefix) or self.splitter.skip(prefix):
+            self.state.finish(prefix)
+            self.metrics.skip(prefix)
+            return []
+        self.state.start(prefix, depth)
+        response = self.searchResults(prefix)
+        userlists = response.results
+        self.splitter.observe(prefix, len(userlists) if len(userlists) < 50 else response.total)
+        if len(userlists) == 0:
+            print(f"{tree_branch(prefix, depth)} : {Back.LIGHTRED_EX + Fore.BLACK}EMPTY" )
+            self.exclusions.add(prefix)
+            self.state.finish(prefix, EMPTY)
+            self.state.record_listing(prefix, depth, 0, [])
+            self.metrics.search(prefix, depth, OUTCOME_EMPTY)
+            return []
+        if len(userlists) < 50:
+            self.metrics.search(prefix, depth, OUTCOME_FEW)
+            # Kept for refresh runs, which compare the next listing of this prefix against it.
+            self.state.record_listing(prefix, depth, len(userlists), [
+                (row_key, listing_license(row_key, user.text.strip()))
+                for row_key, user in ((self.listing_row_key(user), user) for user in userlists if user is not None)])
+            failed = 0
+            print(f"{tree_branch(prefix, depth)} : {Back.LIGHTBLUE_EX + Fore.LIGHTRED_EX} {len(userlists)} " )
+            for user in userlists:
+                try:
+                    if user is None:
+                        print(f"---------------------------------------------------------------{Back.LIGHTYELLOW_EX}Warning: Found a None element in userlists.")
+                        continue
+
+                    user_text = user.text.strip()
+                    # Keyed by the whole grid row: licensees sharing a name under one prefix are different rows.
+                    row_key = self.listing_row_key(user)
+                    if self.state.is_captured(prefix, row_key):
+                        continue
+
+                    # Skip the detail page if this physician was already reached through another prefix.
+                    if self.licenses.seen(row_key, listing_license(row_key, user_text)):
+                        self.state.capture(prefix, row_key)
+                        continue
+
+                    # The row only counts as captured once the writer has flushed it.
+                    captured = partial(self.state.capture, prefix, row_key)
+                    if isinstance(user, SearchResult):
+                        detail = self.scraping_get_data_http(user, depth, captured)
+                        self.state.note_license(prefix, row_key, detail['license'])
+                        self.licenses.add(row_key=row_key)
+                        self.count_record(prefix)
+                        continue
+                    
+                    if not user_text:
+                        print(f"---------------------------------------------------------------{Back.LIGHTYELLOW_EX}Warning: User element has no text.")
+                        continue
+                    
+                    self.driver.execute_script("arguments[0].scrollIntoView();", user)
+                    WebDriverWait(self.driver, 5).until(EC.element_to_be_clickable(user))
+                    with timed('detail_load'):
+                        user.click()
+                        wait_for_postback(self.driver, user)
+                    detail = self.scraping_get_data(prefix, depth, captured)
+                    self.state.note_license(prefix, row_key, detail['license'])
+                    self.licenses.add(row_key=row_key)
+                    self.count_record(prefix)
+                
+                except StaleElementReferenceException:
+                    print(f"--------------------------------------------------------------{Back.LIGHTRED_EX}Error: StaleElementReferenceException - Retrying search.")
+                    failed += 1
+                except ElementClickInterceptedException:
+                    print(f"--------------------------------------------------------------{Back.LIGHTRED_EX}Error: ElementClickInterceptedException - Could not click the element.")
+                    self.driver.execute_script("arguments[0].click();", user)
+                    failed += 1
+                except NoSuchElementException:
+                    print(f"--------------------------------------------------------------{Back.LIGHTRED_EX}Error: NoSuchElementException - Element not found.")
+                    failed += 1
+                except TimeoutException:
+                    print(f"--------------------------------------------------------------{Back.LIGHTRED_EX}Error: TimeoutException - Page did not load in time.")
+                    failed += 1
+                except (requests.RequestException, SearchPageError) as e:
+                    print(f"--------------------------------------------------------------{Back.LIGHTRED_EX}Error: HTTP detail fetch failed - {e}")
+                    failed += 1
+                except Exception as e:
+                    print(f"--------------------------------------------------------------{Back.RED}Unexpected error: {Back.RESET}{Fore.CYAN}{e}")
+                    failed += 1
+            if failed:
+                # Leave the prefix open: the scheduler retries it and the rows captured so far are skipped.
+                raise PrefixIncomplete(prefix, failed)
+            # Only mark the prefix finished once every row has been through the loop and written.
+            self.writer.put(None, partial(self.finish_prefix, prefix))
+            return []
+        else:
+            print(f"{tree_branch(prefix, depth)} : {Back.LIGHTMAGENTA_EX + Fore.LIGHTCYAN_EX}MANY")
+            self.metrics.search(prefix, depth, OUTCOME_MANY)
+            self.state.record_listing(prefix, depth, response.total,
+                                      page=[self.listing_row_key(user) for user in userlists if user is not None])
+        addLetterPrefixes = self.splitter.children(prefix, response.total)
+        self.state.expand(prefix, addLetterPrefixes, depth + 1)
+        return addLetterPrefixes
+
     def advancedPrefixSearch(self, prefixs, depth=0):
         """Perform an advanced search using prefixes."""
         for prefix in prefixs:
-            if self.extra(prefix):
-                continue
-            userlists = self.searchList(prefix)
-            if len(userlists) == 0:
-                print(f"{Fore.YELLOW + prefix +Fore.RESET if depth == 0 else f"Ͱ----{Fore.YELLOW + prefix +Fore.RESET}" if depth == 1 else f'|{'    '*(depth-1)}└---{Fore.YELLOW + prefix +Fore.RESET}'} : {Back.LIGHTRED_EX + Fore.BLACK}EMPTY" )
-                self.write_excep_searcher(prefix, mode='a')
-                # self.excep_searcher.append(prefix)
-                continue
-            if len(userlists) < 50:
-                print(f"{Fore.YELLOW + prefix +Fore.RESET if depth == 0 else f"Ͱ----{Fore.YELLOW + prefix +Fore.RESET}" if depth == 1 else f'|{'    '*(depth-1)}└---{Fore.YELLOW + prefix +Fore.RESET}'} : {Back.LIGHTBLUE_EX + Fore.LIGHTRED_EX} {len(userlists)} " )
-                # self.excep_searcher.append(prefix)
-                self.write_excep_searcher(prefix, mode='a')
-                for user in userlists:
-                    try:
-                        if user is None:
-                            print(f"---------------------------------------------------------------{Back.LIGHTYELLOW_EX}Warning: Found a None element in userlists.")
-                            continue
-                        
-                        user_text = user.text.strip()
-                        if not user_text:
-                            print(f"---------------------------------------------------------------{Back.LIGHTYELLOW_EX}Warning: User element has no text.")
-                            continue
-                        
-                        self.driver.execute_script("arguments[0].scrollIntoView();", user)
-                        WebDriverWait(self.driver, 5).until(EC.element_to_be_clickable(user))
-                        user.click()
-                        
-                        self.waited_for_windows_load(self.driver)
-                        self.scraping_get_data(prefix, depth)
-                    
-                    except StaleElementReferenceException:
-                        print(f"--------------------------------------------------------------{Back.LIGHTRED_EX}Error: StaleElementReferenceException - Retrying search.")
-                    except ElementClickInterceptedException:
-                        print(f"--------------------------------------------------------------{Back.LIGHTRED_EX}Error: ElementClickInterceptedException - Could not click the element.")
-                        self.driver.execute_script("arguments[0].click();", user)
-                    except NoSuchElementException:
-                        print(f"--------------------------------------------------------------{Back.LIGHTRED_EX}Error: NoSuchElementException - Element not found.")
-                    except TimeoutException:
-                        print(f"--------------------------------------------------------------{Back.LIGHTRED_EX}Error: TimeoutException - Page did not load in time.")
-                    except Exception as e:
-                        print(f"--------------------------------------------------------------{Back.RED}Unexpected error: {Back.RESET}{Fore.CYAN}{e}")
+            try:
+                addLetterPrefixes = self.searchPrefix(prefix, depth)
+            except (SearchFailed, PrefixIncomplete) as e:
+                # Left unfinished in the crawl state, so the next run picks it up again.
+                logger.error(f"Prefix {prefix!r} failed and stays unfinished: {e}")
                 continue
-            else:
-                print(f"{Fore.YELLOW + prefix +Fore.RESET if depth == 0 else f"Ͱ----{Fore.YELLOW + prefix +Fore.RESET}" if depth == 1 else f'|{'    '*(depth-1)}└---{Fore.YELLOW + prefix +Fore.RESET}'} : {Back.LIGHTMAGENTA_EX + Fore.LIGHTCYAN_EX}MANY")
-            addLetterPrefixes = self.generateAddLetterPrefixes(prefix)
-            self.advancedPrefixSearch(addLetterPrefixes, depth + 1)
-
-    def run(self):
-        """Run the crawler."""
-        path = ChromeDriverManager().install()
-        self.driver = uc.Chrome(options=self.chrome_options, headless=True, driver_executable_path=path)
+            if addLetterPrefixes:
+                self.advancedPrefixSearch(addLetterPrefixes, depth + 1)
 
-        # Write CSV headers
+    def prepare_output(self):
+        """Truncate the output file and write the CSV header, and empty the licensee store kept with it."""
         with open(self.output_file, 'w', newline='', encoding='utf-8') as csvfile:
             fieldnames = ["Full_Name", "License_Type", "License_Number", "Status", "Professional", "Issued", "Expired"]
             writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
             writer.writeheader()
-
-        print(f"{Back.LIGHTCYAN_EX + Fore.LIGHTYELLOW_EX}+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-  {Back.RESET + Fore.LIGHTCYAN_EX}START{Back.LIGHTCYAN_EX + Fore.LIGHTYELLOW_EX}  +-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-")
-        self.advancedPrefixSearch(self.prefix)
-
+        if self.licenses.store is not None:
+            self.licenses.store.clear()
+
+    def close(self):
+        """Shut down the browser, if one was started, or return it to the pool."""
+        if self.driver_pool is not None:
+            self.release_driver()
+            return
         try:
-            self.driver.close()
+            if self.driver is not None:
+                self.driver.close()
         except:
             pass
+
+    def start_or_resume(self, fresh=False):
+        """
+        Resume the previous crawl if it left unfinished prefixes, or start the first one.
+
+        A finished crawl is left alone: its results, and the listings --refresh works from,
+        are only discarded when fresh is passed.
+
+        :return: The (prefix, depth) nodes still to search; empty if the previous crawl is finished.
+        """
+        if fresh or not self.state.recorded():
+            # Finished prefixes, progress and output all start over together.
+            self.exclusions.clear()
+            self.state.reset()
+            self.prepare_output()
+        elif not self.state.unfinished():
+            logger.warning("The previous crawl is finished; pass --fresh to crawl again or --refresh to update its results")
+            return []
+        else:
+            logger.info(f"Resuming crawl with {self.state.unfinished()} unfinished prefixes")
+        self.licenses.seed_from_csv(self.output_file)
+        return self.state.frontier(self.prefix)
+
+    def run(self, fresh=False):
+        """Run the crawler."""
+        if self.http is None:
+            self.start_driver()
+
+        frontier = self.start_or_resume(fresh)
+        self.metrics.start_reporting()
+
+        print(f"{Back.LIGHTCYAN_EX + Fore.LIGHTYELLOW_EX}+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-  {Back.RESET + Fore.LIGHTCYAN_EX}START{Back.LIGHTCYAN_EX + Fore.LIGHTYELLOW_EX}  +-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-")
+        for prefix, depth in frontier:
+            self.advancedPrefixSearch([prefix], depth)
+
+        self.close()
+        self.writer.close()
+        self.metrics.close()
+        self.exclusions.close()
+        self.state.close()
         logger.info("Completed")
+        logger.info(self.splitter.summary())
+        logger.info(self.licenses.summary())
+        logger.info("Step latency:\n" + latency.report())
+        latency.dump('results/latency.json')
         self.remove_duplicates_in_csv()
 
 def main():
-    # Create 5 bots and run them concurrently using threading
-    bots = [TexasLicenseeCrawler(prefix) for prefix in search_init_filters_letters]
-    threads = []
-
-    for bot in bots:
-        thread = threading.Thread(target=bot.run)
-        threads.append(thread)
-        thread.start()
-
-    # Wait for all threads to complete
-    for thread in threads:
-        thread.join()
+    parser = argparse.ArgumentParser(description='Crawl licensees from the Texas Medical Board website.')
+    parser.add_argument('--backend', choices=['http', 'selenium'], default='http',
+                        help='search engine to use; http falls back to Selenium on failure')
+    parser.add_argument('--base-url', default=None, help='Search.aspx URL override, e.g. a local fixture_server.py')
+    parser.add_argument('--workers', type=int, default=3, help='number of crawlers pulling from the prefix queue')
+    parser.add_argument('--rate', type=float, default=5.0,
+                        help='starting requests per second per host, adapted to the site\'s health (0 = unlimited)')
+    parser.add_argument('--max-rate', type=float, default=None,
+                        help='ceiling for the adaptive request rate (default: twice --rate)')
+    parser.add_argument('--retries', type=int, default=5,
+                        help='times a failed prefix is retried, with exponential backoff, before it is left for the next run')
+    parser.add_argument('--prior', default=None,
+                        help='crawl state database whose recorded result counts order child prefixes (default: the last run)')
+    parser.add_argument('--fresh', action='store_true', help='discard checkpointed progress instead of resuming')
+    parser.add_argument('--browsers', type=int, default=None,
+                        help='size of the Chrome session pool (default: one per worker)')
+    parser.add_argument('--metrics-interval', type=float, default=5.0,
+                        help='seconds between rewrites of results/metrics.json (served by server.py at /metrics)')
+    parser.add_argument('--profile', action='store_true',
+                        help='sample all threads and write hot stacks to results/profile.txt (also on SIGUSR1)')
+    parser.add_argument('--refresh', action='store_true',
+                        help='update the last run\'s results instead of crawling: re-check changed prefixes and '
+                             'due licenses, and log the differences to results/changes.csv')
+    parser.add_argument('--expiring-days', type=int, default=EXPIRING_DAYS,
+                        help='with --refresh, re-check licenses whose Expired date is within this many days')
+    parser.add_argument('--record', default=None, metavar='ARCHIVE',
+                        help='save every page fetched over HTTP to ARCHIVE (e.g. results/pages.jsonl.gz) for replay.py')
+    parser.add_argument('--output-format', nargs='+', choices=['csv', 'parquet', 'sqlite'], default=['csv'],
+                        help='sinks to write results to (csv is what server.py reads)')
+    args = parser.parse_args()
+
+    # One queue of prefix nodes shared by all workers, instead of a fixed letter bucket per thread
+    seeds = [letter for bucket in search_init_filters_letters for letter in bucket]
+    rate_limiter = AdaptiveRateLimiter(args.rate, args.workers, args.max_rate)
+    store = LicenseStore()
+    # Results from before the store existed are imported once.
+    store.adopt_csv('results/results.csv')
+    state = CrawlState()
+    # The prior must be read before start_or_resume() resets the previous run's listings
+    prior = PrefixPrior.from_state(args.prior) if args.prior else PrefixPrior.from_listings(state.listings())
+    splitter = AdaptiveSplitter(string.ascii_uppercase, prior)
+    exclusions = ExclusionIndex()
+    licenses = LicenseIndex(store)
+    os.makedirs('results', exist_ok=True)
+    writer = ResultWriter(create_sinks(args.output_format, store=store))
+    # Browsers are only pre-warmed when Selenium is the primary backend; otherwise they start on first fallback.
+    driver_pool = DriverPool(args.browsers or args.workers, prewarm=args.backend == 'selenium')
+    metrics = CrawlMetrics(state, driver_pool)
+    recorder = PageArchive(args.record, 'w') if args.record else None
+    bots = [TexasLicenseeCrawler(seeds, args.backend, args.base_url, rate_limiter, splitter, exclusions, state, licenses,
+                                 writer, driver_pool, metrics, recorder)
+            for _ in range(args.workers)]
+
+    plan = None
+    if args.refresh:
+        plan = RefreshPlan(state, bots[0].output_file, args.expiring_days)
+        scheduler = CrawlScheduler([RefreshWorker(bot, plan) for bot in bots], plan.frontier(seeds),
+                                   RetryPolicy(args.retries + 1))
+    else:
+        frontier = bots[0].start_or_resume(args.fresh)
+        scheduler = CrawlScheduler(bots, frontier, RetryPolicy(args.retries + 1))
+    metrics.scheduler = scheduler
+    metrics.rate_limiter = rate_limiter
+    metrics.start_reporting(interval=args.metrics_interval)
+    profiler = SamplingProfiler().start() if args.profile else None
+    if profiler is not None:
+        profiler.install_signal()
+    print(f"{Back.LIGHTCYAN_EX + Fore.LIGHTYELLOW_EX}+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-  {Back.RESET + Fore.LIGHTCYAN_EX}START{Back.LIGHTCYAN_EX + Fore.LIGHTYELLOW_EX}  +-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-")
+    try:
+        scheduler.run()
+    finally:
+        for bot in bots:
+            bot.close()
+        driver_pool.close()
+        writer.close()
+        metrics.close()
+        if profiler is not None:
+            profiler.stop()
+        exclusions.close()
+        state.close()
+        if recorder is not None:
+            recorder.close()
+    if plan is not None:
+        plan.finish(store=store)
+    logger.info("Completed")
+    logger.info(splitter.summary())
+    logger.info(licenses.summary())
+    store.close()
+    logger.info("Step latency:\n" + latency.report())
+    latency.dump('results/latency.json')
+    bots[0].remove_duplicates_in_csv()
 
 if __name__ == '__main__':
     # crawler = TexasLicenseeCrawler('A')
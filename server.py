@@ -1,14 +1,24 @@
-from flask import Flask, render_template, send_from_directory
-from flask_socketio import SocketIO
-import pandas as pd
-import time
+from flask import Flask, Response, jsonify, render_template, request, send_from_directory
+from flask_socketio import SocketIO, emit
+import json
 import os
+import time
+
+from licensestore import STORE_FILE, LicenseStore, StoreTail
+from metrics import prometheus_text
 
 app = Flask(__name__)
 socketio = SocketIO(app, cors_allowed_origins="*")
 
 CSV_FILE = "results/results.csv"
-previous_data = pd.DataFrame()
+METRICS_FILE = "results/metrics.json"
+POLL_INTERVAL = 1.0
+FIRST_PAGE_SIZE = 200
+# Larger deltas are not pushed row by row; clients are told to reload their current page instead.
+LIVE_PUSH_LIMIT = 1000
+
+# The crawler's indexed licensee store, which every page request is served from.
+view = LicenseStore(STORE_FILE)
 
 # Create the index.html file
 index_html = """<!DOCTYPE html>
@@ -22,59 +32,180 @@ index_html = """<!DOCTYPE html>
 </head>
 <body class=\"bg-gray-900 text-white p-10\">
     <h1 class=\"text-3xl font-bold mb-4\">Real-time Texas License Data</h1>
-    <div class=\"overflow-hidden shadow-md rounded-lg\">
-        <table class=\"min-w-full bg-gray-800\">
-            <thead class=\"bg-gray-700\">
-                <tr id=\"header-row\"></tr>
-            </thead>
-            <tbody id=\"data-table\"></tbody>
-            
-            
-        </table>
-                <tr id=\"header-row\">... ... ...</tr>
+    <div class=\"flex flex-wrap gap-4 mb-4 items-center\">
+        <input id=\"name-filter\" placeholder=\"Name starts with...\" class=\"bg-gray-800 text-gray-200 p-2 rounded\">
+        <select id=\"status-filter\" class=\"bg-gray-800 text-gray-200 p-2 rounded\"><option value=\"\">All statuses</option></select>
+        <select id=\"type-filter\" class=\"bg-gray-800 text-gray-200 p-2 rounded\"><option value=\"\">All license types</option></select>
+        <span id=\"summary\" class=\"text-sm text-gray-400\"></span>
+        <button id=\"new-rows\" class=\"hidden text-sm bg-blue-700 px-3 py-1 rounded\"></button>
+    </div>
+    <div class=\"overflow-hidden shadow-md rounded-lg bg-gray-800\">
+        <div id=\"header-row\" class=\"grid grid-cols-7 bg-gray-700\"></div>
+        <div id=\"scroller\" class=\"overflow-y-auto\" style=\"height: 70vh\">
+            <div id=\"spacer\" class=\"relative\">
+                <div id=\"data-table\"></div>
+            </div>
+        </div>
     </div>
     <script>
         const socket = io();
-        
-        socket.on("initialize_data", (data) => {
-            updateTable(data);
-        });
-        
-        socket.on("update_data", (newData) => {
-            updateTable(newData, true);
-        });
-        
-        function updateTable(data, animate = false) {
-            const table = document.getElementById("data-table");
-            if (data.length > 0) {
-                const headers = Object.keys(data[0]);
-                if (!document.getElementById("header-row").hasChildNodes()) {
-                    headers.forEach(header => {
-                        const th = document.createElement("th");
-                        th.className = "p-2 text-left text-sm font-semibold text-gray-300";
-                        th.textContent = header;
-                        document.getElementById("header-row").appendChild(th);
-                    });
-                }
-                data.forEach(row => {
-                    const tr = document.createElement("tr");
-                    tr.className = "bg-gray-700 border-b border-gray-600";
-                    if (animate) {
-                        tr.classList.add("transition-transform", "transform", "translate-y-4", "opacity-0");
-                        setTimeout(() => {
-                            tr.classList.remove("translate-y-4", "opacity-0");
-                        }, 100);
-                    }
-                    headers.forEach(header => {
-                        const td = document.createElement("td");
-                        td.className = "p-2 text-gray-300";
-                        td.textContent = row[header];
-                        tr.appendChild(td, tr.children[0]);
-                    });
-                    table.prepend(tr);
+        const COLUMNS = ["Full_Name", "License_Type", "License_Number", "Status", "Professional", "Issued", "Expired"];
+        const ROW_HEIGHT = 36;
+        const OVERSCAN = 10;
+        const PAGE_SIZE = 200;
+        const DEFAULT_SORT = "id";
+
+        // Only the pages fetched so far are held, and only the rows in view are in the DOM.
+        const state = {rows: [], cursor: null, total: 0, loading: false, pendingNew: 0,
+                       query: {sort: DEFAULT_SORT, order: "desc", status: "", license_type: "", name: ""}};
+        const scroller = document.getElementById("scroller");
+
+        function isDefaultQuery() {
+            const q = state.query;
+            return q.sort === DEFAULT_SORT && q.order === "desc" && !q.status && !q.license_type && !q.name;
+        }
+
+        function matches(row) {
+            const q = state.query;
+            return (!q.status || row.Status === q.status)
+                && (!q.license_type || row.License_Type === q.license_type)
+                && (!q.name || String(row.Full_Name).startsWith(q.name.trim().toUpperCase()));
+        }
+
+        function queryString(cursor) {
+            const params = new URLSearchParams({limit: PAGE_SIZE});
+            for (const [key, value] of Object.entries(state.query)) {
+                if (value) params.set(key, value);
+            }
+            if (cursor) params.set("cursor", cursor);
+            return params.toString();
+        }
+
+        function applyPage(page, replace) {
+            state.rows = replace ? page.rows : state.rows.concat(page.rows);
+            state.cursor = page.next_cursor;
+            if (page.total !== undefined) state.total = page.total;
+            render();
+        }
+
+        async function loadFirst() {
+            state.pendingNew = 0;
+            state.loading = true;
+            const response = await fetch("/api/licensees?" + queryString(null));
+            state.loading = false;
+            scroller.scrollTop = 0;
+            applyPage(await response.json(), true);
+        }
+
+        async function loadMore() {
+            if (!state.cursor || state.loading) return;
+            state.loading = true;
+            const response = await fetch("/api/licensees?" + queryString(state.cursor));
+            state.loading = false;
+            applyPage(await response.json(), false);
+        }
+
+        async function loadFacets() {
+            const facets = await (await fetch("/api/facets")).json();
+            for (const [field, id] of [["Status", "status-filter"], ["License_Type", "type-filter"]]) {
+                const select = document.getElementById(id);
+                const current = select.value;
+                select.replaceChildren(select.options[0]);
+                Object.keys(facets[field]).sort().forEach(value => {
+                    const option = document.createElement("option");
+                    option.value = value;
+                    option.textContent = `${value} (${facets[field][value]})`;
+                    select.appendChild(option);
                 });
+                select.value = current;
             }
         }
+
+        function renderHeader() {
+            const header = document.getElementById("header-row");
+            header.replaceChildren(...COLUMNS.map(column => {
+                const th = document.createElement("div");
+                th.className = "p-2 text-left text-sm font-semibold text-gray-300 cursor-pointer select-none";
+                const arrow = state.query.sort === column ? (state.query.order === "asc" ? " \\u25B2" : " \\u25BC") : "";
+                th.textContent = column + arrow;
+                th.onclick = () => {
+                    const q = state.query;
+                    // Third click on a column returns to newest-first.
+                    if (q.sort !== column) { q.sort = column; q.order = "asc"; }
+                    else if (q.order === "asc") { q.order = "desc"; }
+                    else { q.sort = DEFAULT_SORT; q.order = "desc"; }
+                    renderHeader();
+                    loadFirst();
+                };
+                return th;
+            }));
+        }
+
+        function render() {
+            const first = Math.max(0, Math.floor(scroller.scrollTop / ROW_HEIGHT) - OVERSCAN);
+            const last = Math.min(state.rows.length, first + Math.ceil(scroller.clientHeight / ROW_HEIGHT) + 2 * OVERSCAN);
+            document.getElementById("spacer").style.height = `${state.rows.length * ROW_HEIGHT}px`;
+            const visible = [];
+            for (let i = first; i < last; i++) {
+                const row = state.rows[i];
+                const tr = document.createElement("div");
+                tr.className = "grid grid-cols-7 absolute w-full bg-gray-700 border-b border-gray-600";
+                tr.style.top = `${i * ROW_HEIGHT}px`;
+                tr.style.height = `${ROW_HEIGHT}px`;
+                COLUMNS.forEach(column => {
+                    const td = document.createElement("div");
+                    td.className = "p-2 text-gray-300 truncate";
+                    td.textContent = row[column];
+                    tr.appendChild(td);
+                });
+                visible.push(tr);
+            }
+            document.getElementById("data-table").replaceChildren(...visible);
+            document.getElementById("summary").textContent = `${state.rows.length} of ${state.total} loaded`;
+            const badge = document.getElementById("new-rows");
+            badge.textContent = `${state.pendingNew} new rows, click to refresh`;
+            badge.classList.toggle("hidden", state.pendingNew === 0);
+            if (last >= state.rows.length - OVERSCAN) loadMore();
+        }
+
+        socket.on("initialize_data", (page) => {
+            // Sent to this client only on (re)connect; a filtered or sorted view reloads its own page.
+            if (isDefaultQuery()) applyPage(page, true);
+            else loadFirst();
+            loadFacets();
+        });
+
+        socket.on("update_data", (newRows) => {
+            const added = newRows.filter(matches);
+            if (!added.length) return;
+            if (state.query.sort === DEFAULT_SORT && state.query.order === "desc") {
+                // Newest first: prepend, and keep the rows the user is looking at in place.
+                state.rows = added.reverse().concat(state.rows);
+                state.total += added.length;
+                if (scroller.scrollTop > 0) scroller.scrollTop += added.length * ROW_HEIGHT;
+            } else {
+                state.pendingNew += added.length;
+            }
+            render();
+        });
+
+        // The results file was compacted or restarted, or too many rows arrived at once.
+        socket.on("reset_data", () => {
+            loadFirst();
+            loadFacets();
+        });
+
+        let nameTimer = null;
+        document.getElementById("name-filter").oninput = (event) => {
+            clearTimeout(nameTimer);
+            nameTimer = setTimeout(() => { state.query.name = event.target.value.trim(); loadFirst(); }, 300);
+        };
+        document.getElementById("status-filter").onchange = (event) => { state.query.status = event.target.value; loadFirst(); };
+        document.getElementById("type-filter").onchange = (event) => { state.query.license_type = event.target.value; loadFirst(); };
+        document.getElementById("new-rows").onclick = () => loadFirst();
+        scroller.addEventListener("scroll", () => requestAnimationFrame(render));
+        window.addEventListener("resize", render);
+        renderHeader();
     </script>
 </body>
 </html>"""
@@ -82,16 +213,20 @@ index_html = """<!DOCTYPE html>
 with open("templates/index.html", "w") as f:
     f.write(index_html)
 
-def check_csv_changes():
-    global previous_data
+def check_store_changes():
+    """Push rows the crawler appends to the store to the clients; anything else makes them reload."""
+    if os.path.exists(CSV_FILE):
+        # Results written before the crawler kept a store.
+        view.adopt_csv(CSV_FILE)
+    tail = StoreTail(view, LIVE_PUSH_LIMIT)
     while True:
-        if os.path.exists(CSV_FILE):
-            current_data = pd.read_csv(CSV_FILE)
-            if not current_data.equals(previous_data):
-                new_rows = current_data.loc[~current_data.apply(tuple, 1).isin(previous_data.apply(tuple, 1))]
-                socketio.emit("update_data", new_rows.iloc[-100:].to_dict(orient="records"))
-                previous_data = current_data
-        time.sleep(2)  # Check every 2 seconds
+        reset, added = tail.poll()
+        if reset:
+            # First poll, fresh crawl or refresh run, or too many new rows to push one by one.
+            socketio.emit("reset_data")
+        elif added:
+            socketio.emit("update_data", added)
+        time.sleep(POLL_INTERVAL)
 
 @app.route('/')
 def index():
@@ -101,13 +236,55 @@ def index():
 def tailwind():
     return send_from_directory('static', 'tailwind.css')
 
+@app.route('/api/licensees')
+def licensees():
+    """
+    One page of licensees.
+
+    Query parameters: limit, cursor (next_cursor of the previous page), sort (a column name or id),
+    order (asc/desc), status, license_type and name (a Full_Name prefix).
+    """
+    args = request.args
+    try:
+        page = view.page(limit=args.get('limit', 100), cursor=args.get('cursor'), sort=args.get('sort', 'id'),
+                         order=args.get('order', 'desc'), status=args.get('status'),
+                         license_type=args.get('license_type'), name=args.get('name'))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(page)
+
+@app.route('/api/facets')
+def facets():
+    return jsonify(view.facets())
+
+def crawl_summary():
+    """The crawler's latest run summary, or {} if no crawl has written one yet."""
+    try:
+        with open(METRICS_FILE, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+@app.route('/metrics')
+def metrics():
+    """Crawl metrics in Prometheus text format, plus the viewer's own row count."""
+    text = prometheus_text(crawl_summary())
+    text += ("# HELP tmb_viewer_rows Licensee rows in the store the viewer serves.\n"
+             "# TYPE tmb_viewer_rows gauge\n"
+             f"tmb_viewer_rows {len(view)}\n")
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/summary')
+def summary():
+    """The crawler's JSON run summary as written to results/metrics.json."""
+    return jsonify(crawl_summary())
+
 @socketio.on('connect')
 def handle_connect():
-    if os.path.exists(CSV_FILE):
-        df = pd.read_csv(CSV_FILE)
-        socketio.emit("initialize_data", df.to_dict(orient="records"))
+    # emit() inside a handler answers only the connecting client.
+    emit("initialize_data", view.page(limit=FIRST_PAGE_SIZE))
 
 if __name__ == '__main__':
     import threading
-    threading.Thread(target=check_csv_changes, daemon=True).start()
+    threading.Thread(target=check_store_changes, daemon=True).start()
     socketio.run(app, host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,156 @@
+"""
+Result-count-aware prefix splitting for advancedPrefixSearch.
+
+When a prefix comes back "MANY", AdaptiveSplitter:
+
+* orders children by the result counts the previous crawl's searches reported for them,
+  so the crowded ones go first,
+* adds space/hyphen/apostrophe children the plain alphabet misses, and
+* stops searching siblings as soon as their result counts add up to the total the
+  results page reported for the parent.
+
+The prior only orders children; it never drops one. Last run's counts cannot prove a child
+is still empty, since one licensee removed and one added under a new child leave the
+parent's total unchanged.
+"""
+import logging
+import os
+import threading
+from collections import Counter
+
+from crawlstate import CrawlState
+
+logger = logging.getLogger(__name__)
+
+EXTRA_CHARACTERS = [' ', '-', "'"]
+# Rows on a full results page; a MANY search recorded without a total stood for at least this many.
+FULL_PAGE = 50
+
+
+class PrefixPrior:
+    """
+    Result counts reported by earlier searches, keyed by the first-name prefix searched.
+
+    Built from the listings the crawl state records, so the counts are for exactly the
+    strings typed into tbFirstName (Full_Name has the spaces removed and the last name
+    appended, so it cannot stand in for them).
+    """
+
+    def __init__(self, counts=None):
+        self.counts = counts if counts is not None else Counter()
+
+    @classmethod
+    def from_listings(cls, listings):
+        """Build a prior from CrawlState.listings()."""
+        prior = cls(Counter({prefix: total if total is not None else max(count, FULL_PAGE)
+                             for prefix, (_, total, count, _) in listings.items()}))
+        logger.info(f"Prefix prior loaded from {len(prior.counts)} recorded searches")
+        return prior
+
+    @classmethod
+    def from_state(cls, path):
+        """Build a prior from a crawl state database; a missing file gives an empty prior."""
+        if not os.path.exists(path):
+            return cls()
+        state = CrawlState(path)
+        try:
+            return cls.from_listings(state.listings())
+        finally:
+            state.close()
+
+    def count(self, prefix):
+        return self.counts.get(prefix.upper(), 0)
+
+
+class AdaptiveSplitter:
+    """
+    Decide which children of a "MANY" prefix to search, and in what order.
+
+    Shared by every crawler worker, so all methods are thread-safe.
+
+    :param letters: Alphabet used to extend a prefix.
+    :param prior: PrefixPrior from earlier results, or None for no prior.
+    :param extra_characters: Non-letter characters that may follow a prefix.
+    """
+
+    def __init__(self, letters, prior=None, extra_characters=EXTRA_CHARACTERS):
+        self.letters = list(letters)
+        self.prior = prior or PrefixPrior()
+        self.extra_characters = list(extra_characters)
+        self.lock = threading.Lock()
+        self.parents = {}  # prefix -> {'total', 'covered', 'exact'} for every expanded MANY prefix
+        self.parent_of = {}  # child prefix -> parent prefix
+        self.observed = set()  # prefixes whose count is already in their parent's 'covered'
+        self.searches = 0
+        self.skipped = 0
+        self.licenses = set()
+
+    def children(self, prefix, total=None):
+        """
+        Return the child prefixes of a "MANY" prefix, most likely first.
+
+        :param total: Total result count shown on the results page, if known.
+        """
+        with self.lock:
+            parent = self.parents.get(self.parent_of.get(prefix))
+        if prefix[-1:] in self.extra_characters and parent and total is not None and total == parent['total']:
+            # The site ignored the trailing character, so this is the parent search again.
+            return []
+
+        candidates = [prefix + letter for letter in self.letters]
+        # Punctuation children are only worth a search when something says they may exist:
+        # either the prior has seen one, or the letters may not add up to the page total.
+        if prefix[-1:] not in self.extra_characters:
+            candidates += [prefix + character for character in self.extra_characters
+                           if total is not None or self.prior.count(prefix + character)]
+        candidates.sort(key=lambda child: -self.prior.count(child))
+
+        with self.lock:
+            self.parents[prefix] = {'total': total, 'covered': 0, 'exact': total is not None}
+            for child in candidates:
+                self.parent_of[child] = prefix
+        return candidates
+
+    def skip(self, prefix):
+        """True if the siblings searched so far already account for every result under the parent."""
+        with self.lock:
+            if prefix in self.observed:
+                # A retry: its own results are part of what the siblings seem to cover, so it must finish.
+                return False
+            parent = self.parents.get(self.parent_of.get(prefix))
+            if parent and parent['exact'] and parent['covered'] >= parent['total']:
+                self.skipped += 1
+                return True
+        return False
+
+    def observe(self, prefix, count):
+        """
+        Record one issued search and the number of results it stands for.
+
+        :param count: Result count for prefix, or None if it was "MANY" without a known total.
+        """
+        with self.lock:
+            self.searches += 1
+            parent = self.parents.get(self.parent_of.get(prefix))
+            if parent is None or prefix in self.observed:
+                return
+            self.observed.add(prefix)
+            if count is None:
+                parent['exact'] = False
+            elif prefix[-1:] in self.extra_characters and count == parent['total']:
+                # The site ignored the trailing character; counting this would end the siblings early.
+                return
+            else:
+                parent['covered'] += count
+
+    def note_license(self, license_number):
+        with self.lock:
+            self.licenses.add(license_number)
+
+    def summary(self):
+        """Searches issued per unique license found, plus how many searches were avoided."""
+        with self.lock:
+            found = len(self.licenses)
+            ratio = self.searches / found if found else float('inf')
+            return (f"{self.searches} searches issued, {self.skipped} skipped, {found} unique licenses, "
+                    f"{ratio:.2f} searches per license")
@@ -0,0 +1,103 @@
+import argparse
+import csv
+
+from coordinator import OUTCOME_FEW, Coordinator, ExportedRecords, record_key, serve
+from dedup import LicenseIndex
+from writer import FIELDNAMES
+
+LICENSED = {'Full_Name': 'ALICE SMITH', 'License_Type': 'Physician', 'License_Number': 'M1001', 'Status': 'Active',
+            'Professional': 'MD', 'Issued': '01/02/2003', 'Expired': '01/02/2030'}
+UNLICENSED = {'Full_Name': 'ALICE JONES', 'License_Type': 'Physician', 'License_Number': '', 'Status': None,
+              'Professional': 'MD', 'Issued': '', 'Expired': None}
+
+
+class CrashingWriter:
+    """Writes rows to the CSV but never confirms them, like a coordinator killed before the flags are set."""
+
+    def __init__(self, path):
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self.file, fieldnames=FIELDNAMES)
+        self.writer.writeheader()
+
+    def put(self, row, callback=None):
+        self.writer.writerow(row)
+        self.file.flush()
+
+
+class RecordingWriter:
+    def __init__(self):
+        self.rows = []
+
+    def put(self, row, callback=None):
+        self.rows.append(row)
+        if callback:
+            callback()
+
+
+def test_record_key_is_the_same_after_a_csv_round_trip(tmp_path):
+    path = tmp_path / 'results.csv'
+    CrashingWriter(path).put(UNLICENSED)
+    with open(path, newline='', encoding='utf-8') as csvfile:
+        row, = csv.DictReader(csvfile)
+    assert record_key(row) == record_key(UNLICENSED)
+    assert record_key(LICENSED) == 'M1001'
+
+
+def test_restart_does_not_export_written_records_again(tmp_path):
+    db, output = str(tmp_path / 'coordinator.sqlite3'), str(tmp_path / 'results.csv')
+    coordinator = Coordinator(db, writer=CrashingWriter(output))
+    coordinator.start(['A', 'B'])
+    lease, = coordinator.lease('w1')
+    assert coordinator.complete(lease['lease_id'], lease['prefix'], OUTCOME_FEW, records=[LICENSED, UNLICENSED]) == 'ok'
+    assert coordinator.status()['exported'] == 0
+    coordinator.writer.file.close()
+    coordinator.close()
+
+    for _ in range(2):
+        writer = RecordingWriter()
+        coordinator = Coordinator(db, writer=writer)
+        licenses = LicenseIndex()
+        licenses.seed_from_csv(output)
+        coordinator.start(['A', 'B'], exported=ExportedRecords(licenses, output))
+        assert writer.rows == []
+        assert coordinator.status()['exported'] == 2
+        coordinator.close()
+
+
+def test_restart_exports_records_missing_from_the_output(tmp_path):
+    db, output = str(tmp_path / 'coordinator.sqlite3'), str(tmp_path / 'results.csv')
+    coordinator = Coordinator(db, writer=RecordingWriter())
+    coordinator.writer.put = lambda row, callback=None: None
+    coordinator.start(['A', 'B'])
+    lease, = coordinator.lease('w1')
+    coordinator.complete(lease['lease_id'], lease['prefix'], OUTCOME_FEW, records=[LICENSED, UNLICENSED])
+    coordinator.close()
+
+    writer = RecordingWriter()
+    coordinator = Coordinator(db, writer=writer)
+    coordinator.start(['A', 'B'], exported=ExportedRecords(LicenseIndex(), output))
+    assert sorted(record_key(row) for row in writer.rows) == sorted([record_key(LICENSED), record_key(UNLICENSED)])
+    coordinator.close()
+
+
+def test_restart_after_a_finished_crawl_keeps_its_results(tmp_path):
+    db, output = str(tmp_path / 'coordinator.sqlite3'), str(tmp_path / 'results.csv')
+    coordinator = Coordinator(db, writer=RecordingWriter())
+    coordinator.start(['A'])
+    lease, = coordinator.lease('w1')
+    coordinator.complete(lease['lease_id'], lease['prefix'], OUTCOME_FEW, records=[LICENSED])
+    assert coordinator.status()['finished']
+    coordinator.close()
+    writer = CrashingWriter(output)
+    writer.put(LICENSED)
+    writer.file.close()
+
+    args = argparse.Namespace(seeds=['A'], store=str(tmp_path / 'licensees.sqlite3'), output=output,
+                              prior=str(tmp_path / 'crawl_state.sqlite3'), db=db, lease_seconds=120, max_attempts=5,
+                              fresh=False, output_format=['csv'])
+    serve(args)
+    with open(output, newline='', encoding='utf-8') as csvfile:
+        assert [row['License_Number'] for row in csv.DictReader(csvfile)] == ['M1001']
+    coordinator = Coordinator(db)
+    assert coordinator.status()['records'] == 1
+    coordinator.close()
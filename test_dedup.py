@@ -0,0 +1,85 @@
+import csv
+
+from dedup import LicenseIndex, compact_csv
+from licensestore import LicenseStore
+from writer import FIELDNAMES
+
+
+def licensee(license, name='ANN LEE', status='Active'):
+    return {'Full_Name': name, 'License_Type': 'Physician', 'License_Number': license, 'Status': status,
+            'Professional': 'MD', 'Issued': '01/02/2003', 'Expired': '01/02/2030'}
+
+
+def write_csv(path, rows, fieldnames=FIELDNAMES):
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        return next(reader), list(reader)
+
+
+def test_claim_and_seen(tmp_path):
+    index = LicenseIndex()
+    assert not index.claim('M1')
+    assert index.claim('M1')
+    assert not index.claim('') and not index.claim(None)
+
+    assert index.seen('row one', 'M1')
+    assert not index.seen('row two', 'M2')
+    index.add(license='M2', row_key='row two')
+    assert index.seen('row two') and index.seen('other row', 'M2')
+    assert (index.hits, index.misses) == (3, 1)
+    assert 'M2' in index and 'M3' not in index
+
+
+def test_seeding_without_a_store_reads_the_csv(tmp_path):
+    path = tmp_path / 'results.csv'
+    write_csv(path, [licensee('M1'), licensee(''), licensee('M2')])
+    index = LicenseIndex()
+    index.seed_from_csv(str(path))
+    assert index.licenses == {'M1', 'M2'}
+    LicenseIndex().seed_from_csv(str(tmp_path / 'missing.csv'))
+
+
+def test_seeding_with_a_store_fills_it_and_looks_licenses_up_there(tmp_path):
+    path = tmp_path / 'results.csv'
+    write_csv(path, [licensee('M1'), licensee('M2')])
+    store = LicenseStore(str(tmp_path / 'licensees.sqlite3'))
+    index = LicenseIndex(store)
+    index.seed_from_csv(str(path))
+    # Earlier runs' licenses stay in the store rather than in memory.
+    assert len(store) == 2 and index.licenses == set()
+    assert index.claim('M1') and 'M2' in index
+    assert not index.claim('M3') and index.licenses == {'M3'}
+    store.close()
+
+
+def test_compact_keeps_the_first_occurrence_in_order_across_partitions(tmp_path):
+    path = tmp_path / 'results.csv'
+    rows = [licensee(f'M{i % 40}', status='Active' if i < 40 else 'Duplicate') for i in range(100)]
+    # Rows without a license are only duplicates when every column matches.
+    rows += [licensee('', 'NO LICENSE'), licensee('', 'NO LICENSE'), licensee('', 'OTHER', 'Inactive'),
+             licensee('Q1', 'SMITH, JOHN')]
+    write_csv(path, rows)
+
+    # A tiny partition size spreads the rows over many partition files.
+    removed = compact_csv(str(path), partition_bytes=512)
+    header, kept = read_csv(path)
+    assert header == FIELDNAMES
+    assert removed == 61
+    assert [row[2] for row in kept] == [f'M{i}' for i in range(40)] + ['', '', 'Q1']
+    assert all(row[3] == 'Active' for row in kept[:40])
+    assert [row[0] for row in kept[40:]] == ['NO LICENSE', 'OTHER', 'SMITH, JOHN']
+
+
+def test_compact_to_another_file_leaves_the_input_alone(tmp_path):
+    path, output = tmp_path / 'results.csv', tmp_path / 'compacted.csv'
+    write_csv(path, [licensee('M1'), licensee('M1')])
+    assert compact_csv(str(path), output=str(output)) == 1
+    assert len(read_csv(path)[1]) == 2
+    assert read_csv(output) == (FIELDNAMES, [list(licensee('M1').values())])
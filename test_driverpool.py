@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+import driverpool
+from driverpool import DriverPool
+
+
+class FakeDriver:
+    browser_pid = -1
+
+    def __init__(self, launches):
+        self.launches = launches
+        self.quit_called = False
+
+    def set_page_load_timeout(self, seconds):
+        pass
+
+    def set_script_timeout(self, seconds):
+        pass
+
+    def execute_script(self, script):
+        return 'complete'
+
+    def quit(self):
+        self.quit_called = True
+        with self.launches.lock:
+            self.launches.alive -= 1
+
+
+class FakeManager:
+    def install(self):
+        return '/fake/chromedriver'
+
+
+class Launches:
+    """Counts browsers alive at once; set fail_next to make the next launch raise."""
+
+    def __init__(self):
+        self.fail_next = False
+        self.alive = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def chrome(self, **kwargs):
+        time.sleep(0.01)
+        with self.lock:
+            if self.fail_next:
+                self.fail_next = False
+                raise RuntimeError('chrome did not start')
+            self.alive += 1
+            self.peak = max(self.peak, self.alive)
+        return FakeDriver(self)
+
+
+@pytest.fixture
+def launches(monkeypatch):
+    launches = Launches()
+    monkeypatch.setattr(driverpool.uc, 'Chrome', launches.chrome)
+    monkeypatch.setattr(driverpool, 'ChromeDriverManager', FakeManager)
+    return launches
+
+
+def test_failed_launch_gives_its_slot_back(launches):
+    pool = DriverPool(1, prewarm=False)
+    launches.fail_next = True
+    with pytest.raises(RuntimeError):
+        pool.acquire()
+    assert pool.created == 0
+    driver = pool.acquire()
+    assert isinstance(driver, FakeDriver)
+    assert pool.created == 1
+
+
+def test_concurrent_acquires_never_start_more_than_size(launches):
+    pool = DriverPool(2, prewarm=False)
+    leased = []
+
+    def worker():
+        for _ in range(5):
+            driver = pool.acquire()
+            leased.append(driver)
+            time.sleep(0.005)
+            pool.release(driver)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+    assert not any(thread.is_alive() for thread in threads)
+    assert len(leased) == 40
+    assert launches.peak <= 2
+    assert pool.created <= 2
+    assert sum(pool.leases.values()) == 40
+
+
+def test_waiting_acquire_gets_a_replacement_for_a_worn_out_browser(launches):
+    pool = DriverPool(1, prewarm=False, max_leases=1)
+    first = pool.acquire()
+    result = []
+    thread = threading.Thread(target=lambda: result.append(pool.acquire()))
+    thread.start()
+    pool.release(first)
+    thread.join(timeout=10)
+    assert result and result[0] is not first
+    assert first.quit_called
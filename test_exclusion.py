@@ -0,0 +1,70 @@
+import json
+
+from exclusion import ExclusionIndex
+
+
+def snapshot(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def journal(index):
+    with open(index.journal_path, encoding='utf-8') as file:
+        return file.read().splitlines()
+
+
+def test_covers_a_prefix_and_its_descendants(tmp_path):
+    index = ExclusionIndex(str(tmp_path / 'searcher.json'))
+    index.add('BQ')
+    assert index.covers('BQ') and index.covers('BQX')
+    assert not index.covers('B') and not index.covers('BR')
+    index.close()
+
+
+def test_journal_is_replayed_after_a_crash(tmp_path):
+    path = str(tmp_path / 'searcher.json')
+    index = ExclusionIndex(path)
+    index.add('AB')
+    index.add('CD')
+    # No close(): the process died. A partial last line from an interrupted write is dropped.
+    index.journal.write('EF')
+    index.journal.flush()
+
+    restarted = ExclusionIndex(path)
+    assert restarted.prefixes == {'AB', 'CD'}
+    assert restarted.pending == 2
+    restarted.close()
+    assert snapshot(path) == ['AB', 'CD']
+    assert journal(restarted) == []
+
+
+def test_journal_is_folded_into_the_snapshot_at_the_threshold(tmp_path):
+    path = str(tmp_path / 'searcher.json')
+    index = ExclusionIndex(path, compact_every=3)
+    index.add('A')
+    index.add('B')
+    index.add('B')  # already there: not journaled again
+    assert journal(index) == ['A', 'B']
+    index.add('C')
+    assert snapshot(path) == ['A', 'B', 'C']
+    assert journal(index) == [] and index.pending == 0
+
+    # The threshold grows with the index: half of it once that exceeds compact_every.
+    for prefix in ['D', 'E', 'F']:
+        index.add(prefix)
+    assert snapshot(path) == ['A', 'B', 'C', 'D', 'E', 'F']
+    for prefix in ['G', 'H', 'I']:
+        index.add(prefix)
+    assert journal(index) == ['G', 'H', 'I']
+    index.close()
+
+
+def test_clear_forgets_everything_on_disk_too(tmp_path):
+    path = str(tmp_path / 'searcher.json')
+    index = ExclusionIndex(path)
+    index.add('AB')
+    index.clear()
+    assert len(index) == 0 and not index.covers('AB')
+    index.close()
+    assert snapshot(path) == []
+    assert len(ExclusionIndex(path)) == 0
@@ -0,0 +1,39 @@
+import random
+
+import pytest
+
+from latency import LatencyHistogram
+
+
+def test_sub_millisecond_percentiles_track_the_samples():
+    histogram = LatencyHistogram()
+    rng = random.Random(1)
+    samples = [rng.uniform(0.0002, 0.0004) for _ in range(1000)]
+    for seconds in samples:
+        histogram.record(seconds)
+    summary = histogram.summary()
+    samples.sort()
+    assert summary['p50'] == pytest.approx(samples[499], rel=0.1)
+    assert summary['p99'] == pytest.approx(samples[989], rel=0.1)
+    assert summary['p50'] < 0.001
+    assert summary['mean'] == pytest.approx(sum(samples) / len(samples))
+
+
+def test_percentiles_stay_within_observed_range():
+    histogram = LatencyHistogram()
+    for seconds in (0.05, 0.05, 0.05):
+        histogram.record(seconds)
+    assert histogram.percentile(0.5) == pytest.approx(0.05)
+    assert histogram.percentile(0.99) == pytest.approx(0.05)
+    assert LatencyHistogram().percentile(0.5) is None
+
+
+def test_percentiles_are_ordered_across_buckets():
+    histogram = LatencyHistogram()
+    for seconds in [0.001] * 50 + [0.1] * 40 + [2.0] * 10:
+        histogram.record(seconds)
+    p50, p90, p99 = histogram.percentile(0.5), histogram.percentile(0.9), histogram.percentile(0.99)
+    # One bucket is ~19% wide.
+    assert 0.00084 <= p50 <= 0.0012
+    assert 0.084 <= p90 <= 0.12
+    assert 1.6 <= p99 <= 2.0
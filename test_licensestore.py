@@ -0,0 +1,127 @@
+import pytest
+
+from licensestore import (LicenseStore, StoreTail, decode_cursor, decode_date, encode_cursor, encode_date,
+                          prefix_upper_bound)
+
+STATUSES = ['Active', 'Inactive', 'Cancelled']
+ROWS = [
+    {'Full_Name': name, 'License_Type': 'MD' if i % 3 else 'DO', 'License_Number': f'L{i}', 'Status': STATUSES[i % 3],
+     'Professional': 'Physician and Surgeon', 'Issued': f'{i % 12 + 1:02d}/01/2000', 'Expired': '12/31/2030'}
+    for i, name in enumerate(['SMITHJOHN', 'SMYTHANNE', 'JONESBOB', 'SMITHAMY', 'ADAMSZOE', 'SMALLEVE', 'BAKERIAN'])
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LicenseStore(str(tmp_path / 'licensees.sqlite3'))
+    store.add(ROWS)
+    yield store
+    store.close()
+
+
+def all_pages(store, **query):
+    rows, cursor = [], None
+    while True:
+        page = store.page(limit=2, cursor=cursor, **query)
+        rows += page['rows']
+        cursor = page['next_cursor']
+        if not cursor:
+            return rows
+
+
+@pytest.mark.parametrize('name', [' ', '   ', '', None])
+def test_blank_name_does_not_filter(store, name):
+    assert store.page(name=name)['total'] == len(ROWS)
+
+
+def test_name_prefix_is_case_insensitive(store):
+    names = [row['Full_Name'] for row in all_pages(store, name=' smi ', sort='Full_Name', order='asc')]
+    assert names == ['SMITHAMY', 'SMITHJOHN']
+
+
+@pytest.mark.parametrize('sort', ['id', 'Full_Name', 'License_Number', 'Status', 'License_Type', 'Issued', 'Expired'])
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+def test_cursor_walks_every_row_once_in_order(store, sort, order):
+    rows = all_pages(store, sort=sort, order=order)
+    assert sorted(row['License_Number'] for row in rows) == sorted(row['License_Number'] for row in ROWS)
+    keys = [(row['Issued'][6:] + row['Issued'][:5] if sort == 'Issued' else row[sort], row['id']) for row in rows]
+    if order == 'desc':
+        # Ties on the sort value are broken by id in the same direction.
+        keys = keys[::-1]
+    assert keys == sorted(keys)
+
+
+def test_coded_sort_orders_by_value_and_respects_filters(store):
+    rows = all_pages(store, sort='Status', order='asc', license_type='MD')
+    assert [row['Status'] for row in rows] == sorted(row['Status'] for row in ROWS if row['License_Type'] == 'MD')
+
+
+def test_unknown_filter_value_matches_nothing(store):
+    assert store.page(status='Revoked') == {'rows': [], 'next_cursor': None, 'total': 0}
+
+
+def test_rows_decode_to_what_was_stored(store):
+    assert {key: value for key, value in store.get('L3').items() if key != 'id'} == ROWS[3]
+    assert store.get('L99') is None
+    assert store.facets()['Status'] == {'Active': 3, 'Inactive': 2, 'Cancelled': 2}
+
+
+def test_upsert_and_delete_change_the_generation(store):
+    generation = store.generation()
+    store.add([dict(ROWS[0], Status='Inactive')])
+    assert store.get('L0')['Status'] == 'Active'
+    assert store.generation() == generation
+
+    store.upsert([dict(ROWS[0], Status='Inactive')])
+    assert store.get('L0')['Status'] == 'Inactive'
+    assert store.generation() == generation + 1
+
+    store.delete(['L0'])
+    assert not store.has_license('L0') and store.has_license('L1')
+    assert len(store) == len(ROWS) - 1
+    assert store.generation() == generation + 2
+
+
+def test_prefix_lookups(store):
+    assert store.count_prefix('SM') == 4
+    assert store.count_prefix('SMITH') == 2
+    assert store.has_prefix('JON') and not store.has_prefix('JOZ')
+    assert store.count_prefix('') == len(ROWS)
+
+
+def test_dates_round_trip_and_keep_malformed_text():
+    assert encode_date('03/09/2021') == 20210309
+    assert decode_date(20210309) == '03/09/2021'
+    assert encode_date('2021-03-09') == '2021-03-09'
+    assert encode_date('02/30/2021') == '02/30/2021'
+    assert encode_date(None) == ''
+
+
+def test_cursor_helpers():
+    assert decode_cursor(encode_cursor('SMITH', 7)) == ('SMITH', 7)
+    with pytest.raises(ValueError):
+        decode_cursor('not a cursor')
+    assert prefix_upper_bound('SMI') == 'SMJ'
+
+
+def test_tail_pushes_only_appended_rows(store):
+    tail = StoreTail(store, limit=3)
+    assert tail.poll() == (True, [])
+    assert tail.poll() == (False, [])
+    store.add([dict(ROWS[0], License_Number='N1'), dict(ROWS[1], License_Number='N2')])
+    reset, added = tail.poll()
+    assert not reset
+    assert [row['License_Number'] for row in added] == ['N1', 'N2']
+    assert tail.poll() == (False, [])
+
+
+def test_tail_resets_on_rewrites_and_large_deltas(store):
+    tail = StoreTail(store, limit=3)
+    tail.poll()
+    store.upsert([dict(ROWS[0], Status='Cancelled')])
+    assert tail.poll() == (True, [])
+    store.add([dict(ROWS[0], License_Number=f'N{i}') for i in range(4)])
+    assert tail.poll() == (True, [])
+    assert tail.poll() == (False, [])
+    store.add([dict(ROWS[0], License_Number='N9')])
+    assert [row['License_Number'] for row in tail.poll()[1]] == ['N9']
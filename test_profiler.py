@@ -0,0 +1,47 @@
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+from profiler import SamplingProfiler
+
+
+def busy(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_hottest_counts_crawler_threads(tmp_path):
+    stop = threading.Event()
+    worker = threading.Thread(target=busy, args=(stop,), name='crawler-0')
+    worker.start()
+    profiler = SamplingProfiler(interval=0.002, path=str(tmp_path / 'profile.txt')).start()
+    time.sleep(0.2)
+    stop.set()
+    worker.join()
+    profiler.stop()
+    assert profiler.samples > 0
+    assert any('busy' in label for label, _ in profiler.hottest())
+    assert os.path.getsize(tmp_path / 'profile.txt') > 0
+
+
+@pytest.mark.skipif(not hasattr(signal, 'SIGUSR1'), reason='no SIGUSR1 on this platform')
+def test_signal_while_the_lock_is_held_does_not_deadlock(tmp_path):
+    path = tmp_path / 'profile.txt'
+    profiler = SamplingProfiler(interval=0.002, path=str(path)).start()
+    previous = signal.getsignal(signal.SIGUSR1)
+    profiler.install_signal()
+    try:
+        with profiler.lock:
+            # The handler runs here, on the main thread, while it holds the profiler's lock.
+            os.kill(os.getpid(), signal.SIGUSR1)
+            time.sleep(0.01)
+        deadline = time.monotonic() + 5
+        while not path.exists() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert path.exists()
+    finally:
+        signal.signal(signal.SIGUSR1, previous)
+        profiler.stop()
@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+import ratelimit
+from ratelimit import AdaptiveRateLimiter, AimdController, TokenBucket
+
+
+class Clock:
+    def __init__(self, now=1.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # A monotonic clock that starts near zero, as it does on a freshly booted host.
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, 'monotonic', clock)
+    return clock
+
+
+def controller(rate=10.0, concurrency=4, **options):
+    return AimdController(TokenBucket(rate), concurrency, **options)
+
+
+def test_error_halves_rate_and_concurrency_once_per_cooldown(clock):
+    aimd = controller(cooldown=5.0)
+    aimd.acquire()
+    aimd.release(0.1, ok=False)
+    assert (aimd.bucket.rate, int(aimd.concurrency), aimd.decreases) == (5.0, 2, 1)
+
+    clock.now += 1
+    aimd.acquire()
+    aimd.release(0.1, ok=False)
+    assert (aimd.bucket.rate, aimd.decreases) == (5.0, 1)
+
+    clock.now += 5
+    aimd.acquire()
+    aimd.release(0.1, ok=False)
+    assert (aimd.bucket.rate, int(aimd.concurrency), aimd.decreases) == (2.5, 1, 2)
+
+
+def test_rate_never_drops_below_the_floor(clock):
+    aimd = controller(rate=1.0, min_rate=0.5, cooldown=0)
+    for _ in range(5):
+        aimd.acquire()
+        aimd.release(0.1, ok=False)
+    assert aimd.bucket.rate == 0.5
+    assert aimd.concurrency == 1.0
+
+
+def test_successes_increase_up_to_the_ceiling(clock):
+    aimd = controller(rate=4.0, concurrency=2, max_rate=6.0, max_concurrency=3)
+    for _ in range(200):
+        aimd.acquire()
+        aimd.release(0.1, ok=True)
+    assert aimd.bucket.rate == 6.0
+    assert aimd.concurrency == 3
+    assert aimd.decreases == 0
+
+
+def test_latency_spike_counts_as_overload(clock):
+    aimd = controller(latency_factor=3.0)
+    for _ in range(5):
+        aimd.acquire()
+        aimd.release(0.1, ok=True)
+    rate = aimd.bucket.rate
+    aimd.acquire()
+    aimd.release(1.0, ok=True)
+    assert aimd.decreases == 1
+    assert aimd.bucket.rate == pytest.approx(rate / 2)
+
+
+def test_acquire_waits_for_a_free_slot():
+    aimd = controller(concurrency=1)
+    aimd.acquire()
+    entered = threading.Event()
+    thread = threading.Thread(target=lambda: (aimd.acquire(), entered.set()))
+    thread.start()
+    assert not entered.wait(0.1)
+    aimd.release(0.1, ok=True)
+    assert entered.wait(5)
+    thread.join()
+
+
+def test_adaptive_limiter_keeps_one_controller_per_host(clock):
+    limiter = AdaptiveRateLimiter(10, concurrency=2)
+    limiter.acquire('http://a.example/search')
+    limiter.release('http://a.example/search', 0.1, ok=False)
+    limiter.acquire('http://b.example/search')
+    limiter.release('http://b.example/search', 0.1, ok=True)
+    summary = limiter.summary()
+    assert summary['a.example'] == {'rate': 5.0, 'concurrency': 1}
+    assert summary['b.example']['rate'] > 10
+
+
+def test_zero_rate_disables_limiting():
+    limiter = AdaptiveRateLimiter(0)
+    start = time.monotonic()
+    for _ in range(100):
+        assert limiter.acquire('http://a.example/') == 0.0
+        limiter.release('http://a.example/', 5.0, ok=False)
+    assert time.monotonic() - start < 1
+    assert limiter.summary() == {}
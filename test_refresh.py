@@ -0,0 +1,119 @@
+import csv
+import string
+from datetime import date
+from types import SimpleNamespace
+
+from crawlstate import CrawlState
+from refresh import ADDED, REMOVED, STATUS_CHANGED, RefreshPlan, RefreshWorker, is_due
+from splitting import AdaptiveSplitter
+from tmb_http import SearchResponse, SearchResult
+from writer import FIELDNAMES
+
+TODAY = date(2026, 6, 1)
+
+
+def licensee(license, name, status='Active', expired='01/01/2030'):
+    return {'Full_Name': name, 'License_Type': 'Physician', 'License_Number': license, 'Status': status,
+            'Professional': 'MD', 'Issued': '01/01/2000', 'Expired': expired}
+
+
+def grid(names):
+    return [SearchResult(text=name, row_text=f'{name} {license}') for name, license in names]
+
+
+class FakeCrawler:
+    """The parts of TexasLicenseeCrawler a RefreshWorker uses, answering searches from a dict."""
+
+    def __init__(self, state, pages, details=None):
+        self.state = state
+        self.pages = pages
+        self.details = details or {}
+        self.splitter = AdaptiveSplitter(string.ascii_uppercase)
+        self.metrics = SimpleNamespace(search=lambda *args: None, record=lambda *args: None)
+
+    def searchResults(self, prefix):
+        results, total = self.pages[prefix]
+        return SearchResponse(results, total)
+
+    def listing_row_key(self, user):
+        return user.row_text
+
+    def fetch_detail(self, user):
+        return {'license': user.row_text.split()[-1]}
+
+    def record_fields(self, license):
+        return self.details[license]
+
+    def release_driver(self):
+        pass
+
+
+def plan_for(tmp_path, previous=()):
+    results = tmp_path / 'results.csv'
+    with open(results, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        writer.writerows(previous)
+    state = CrawlState(str(tmp_path / 'state.sqlite3'))
+    return state, results
+
+
+def many_page(offset=0):
+    return grid([(f'BA NAME{i:03}', f'L{i:05}') for i in range(offset, offset + 50)])
+
+
+def test_is_due():
+    assert is_due(licensee('L1', 'A', expired='06/15/2026'), TODAY)
+    assert not is_due(licensee('L1', 'A', expired='06/15/2027'), TODAY)
+    assert is_due(licensee('L1', 'A', status='Expired', expired='05/20/2026'), TODAY)
+    assert not is_due(licensee('L1', 'A', status='Expired', expired='01/01/2020'), TODAY)
+    assert not is_due(licensee('L1', 'A', expired=''), TODAY)
+
+
+def test_many_prefix_with_same_total_and_first_page_is_not_expanded(tmp_path):
+    state, results = plan_for(tmp_path)
+    state.record_listing('BA', 1, 120, page=[user.row_text for user in many_page()])
+    plan = RefreshPlan(state, str(results), today=TODAY)
+    worker = RefreshWorker(FakeCrawler(state, {'BA': (many_page(), 120)}), plan)
+    assert worker.searchPrefix('BA', 1) == []
+    assert plan.unchanged == 1 and not plan.expanded
+
+
+def test_many_prefix_with_same_total_but_new_rows_is_expanded(tmp_path):
+    # One licensee left and another arrived: the total is the same, the first page is not.
+    state, results = plan_for(tmp_path)
+    state.record_listing('BA', 1, 120, page=[user.row_text for user in many_page()])
+    plan = RefreshPlan(state, str(results), today=TODAY)
+    worker = RefreshWorker(FakeCrawler(state, {'BA': (many_page(offset=1), 120)}), plan)
+    children = worker.searchPrefix('BA', 1)
+    assert set('BA' + letter for letter in string.ascii_uppercase) <= set(children)
+    assert plan.expanded == {'BA'}
+
+
+def test_many_prefix_recorded_without_a_page_hash_is_expanded(tmp_path):
+    state, results = plan_for(tmp_path)
+    state.record_listing('BA', 1, 120)
+    plan = RefreshPlan(state, str(results), today=TODAY)
+    worker = RefreshWorker(FakeCrawler(state, {'BA': (many_page(), 120)}), plan)
+    assert worker.searchPrefix('BA', 1)
+    # The page hash is now recorded, so the next refresh can stop here.
+    plan = RefreshPlan(state, str(results), today=TODAY)
+    worker = RefreshWorker(FakeCrawler(state, {'BA': (many_page(), 120)}), plan)
+    assert worker.searchPrefix('BA', 1) == []
+
+
+def test_short_list_opens_only_new_rows_and_reports_changes(tmp_path):
+    kept, gone, changed = licensee('L00001', 'BOB KEPT'), licensee('L00002', 'BOB GONE'), licensee('L00003', 'BOB LATE', expired='06/10/2026')
+    state, results = plan_for(tmp_path, [kept, gone, changed])
+    state.record_listing('BOB', 2, 3, [('BOB KEPT L00001', 'L00001'), ('BOB GONE L00002', 'L00002'),
+                                      ('BOB LATE L00003', 'L00003')])
+    added = licensee('L00004', 'BOB NEW')
+    crawler = FakeCrawler(state, {'BOB': (grid([('BOB KEPT', 'L00001'), ('BOB LATE', 'L00003'), ('BOB NEW', 'L00004')]), 3)},
+                          {'L00003': dict(changed, Status='Expired'), 'L00004': added})
+    plan = RefreshPlan(state, str(results), today=TODAY)
+    RefreshWorker(crawler, plan).searchPrefix('BOB', 2)
+
+    # L00001 is unchanged and not due, so only the due license and the new row were opened.
+    assert set(plan.updates) == {'L00003', 'L00004'}
+    assert sorted(plan.changes()) == sorted([(ADDED, 'L00004', '', '', ''), (REMOVED, 'L00002', '', '', ''),
+                                             (STATUS_CHANGED, 'L00003', 'Status', 'Active', 'Expired')])
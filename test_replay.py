@@ -0,0 +1,46 @@
+import os
+
+from fixture_server import FixtureServer, create_app, generate_licensees
+from replay import PageArchive, compare, create_replay_app, crawl, set_hidden
+
+
+def test_recorded_crawl_replays_to_the_same_results(tmp_path, monkeypatch):
+    archive_path = str(tmp_path / 'pages.jsonl.gz')
+    licensees = generate_licensees(300, seed=5)
+    (tmp_path / 'record').mkdir()
+    (tmp_path / 'replay').mkdir()
+
+    monkeypatch.chdir(tmp_path / 'record')
+    with FixtureServer(create_app(licensees)) as fixture:
+        recorded = crawl(fixture.base_url, workers=2, record=archive_path)
+
+    archive = PageArchive(archive_path)
+    assert archive.form_page and archive.searches
+    assert len(archive.details) == recorded['records'] == recorded['unique_records']
+    # View states are blanked in the archive; replay issues its own.
+    assert 'name="__VIEWSTATE" value=""' in next(iter(archive.searches.values()))
+
+    monkeypatch.chdir(tmp_path / 'replay')
+    app = create_replay_app(archive)
+    with FixtureServer(app) as server:
+        replayed = crawl(server.base_url, workers=2)
+    assert app.config['MISSES'] == 0
+    assert replayed['records'] == replayed['unique_records'] == recorded['records']
+    assert replayed['searches'] == recorded['searches']
+    with open(os.path.join(tmp_path, 'record', 'results', 'results.csv'), encoding='utf-8') as first, \
+            open(os.path.join(tmp_path, 'replay', 'results', 'results.csv'), encoding='utf-8') as second:
+        assert sorted(first.read().splitlines()) == sorted(second.read().splitlines())
+
+
+def test_set_hidden_only_touches_the_named_fields():
+    page = ('<input type="hidden" name="__VIEWSTATE" value="abc" />'
+            '<input type="text" name="ctl00$BodyContent$tbFirstName" value="SMI" />')
+    assert set_hidden(page, {'__VIEWSTATE': ''}) == page.replace('value="abc"', 'value=""')
+
+
+def test_compare_flags_each_regression():
+    baseline = {'records_per_second': 100.0, 'searches_per_record': 1.5, 'peak_rss_mib': 80.0, 'completeness': 1.0}
+    assert compare(dict(baseline, records_per_second=95.0), baseline) == []
+    regressions = compare({'records_per_second': 80.0, 'searches_per_record': 2.0, 'peak_rss_mib': 100.0,
+                           'completeness': 0.99}, baseline)
+    assert len(regressions) == 4
@@ -0,0 +1,67 @@
+import asyncio
+import threading
+
+from retry import PrefixIncomplete, RetryPolicy
+from scheduler import CrawlScheduler
+
+
+class FakeCrawler:
+    """Answers searchPrefix from a tree of children, failing the prefixes in `failures` that many times."""
+
+    def __init__(self, tree, failures=None):
+        self.tree = tree
+        self.failures = dict(failures or {})
+        self.log = []
+        self.lock = threading.Lock()
+
+    def searchPrefix(self, prefix, depth=0):
+        with self.lock:
+            self.log.append((prefix, depth))
+            if self.failures.get(prefix):
+                self.failures[prefix] -= 1
+                raise PrefixIncomplete(prefix, 1)
+        return self.tree.get(prefix, [])
+
+
+def no_wait(max_attempts=3):
+    return RetryPolicy(max_attempts=max_attempts, base=0, jitter=0)
+
+
+def test_one_worker_searches_depth_first_in_alphabetical_order():
+    tree = {'A': ['AA', 'AB'], 'AA': ['AAA', 'AAB'], 'B': ['BA']}
+    crawler = FakeCrawler(tree)
+    CrawlScheduler([crawler], [('A', 0), ('B', 0)]).run()
+    assert crawler.log == [('A', 0), ('AA', 1), ('AAA', 2), ('AAB', 2), ('AB', 1), ('B', 0), ('BA', 1)]
+
+
+def test_failed_prefix_is_queued_again_until_it_succeeds():
+    crawler = FakeCrawler({'A': ['AA']}, failures={'A': 2})
+    scheduler = CrawlScheduler([crawler], [('A', 0)], no_wait())
+    scheduler.run()
+    assert crawler.log == [('A', 0), ('A', 0), ('A', 0), ('AA', 1)]
+    assert (scheduler.retries, scheduler.searches, scheduler.failed) == (2, 2, [])
+
+
+def test_prefix_is_given_up_after_its_attempts():
+    crawler = FakeCrawler({}, failures={'A': 10})
+    scheduler = CrawlScheduler([crawler], [('A', 0), ('B', 0)], no_wait(max_attempts=3))
+    scheduler.run()
+    assert crawler.log.count(('A', 0)) == 3
+    assert scheduler.failed == ['A']
+    assert ('B', 0) in crawler.log
+
+
+def test_crawl_waits_for_pending_retries_then_stops_every_worker():
+    crawler = FakeCrawler({'A': ['AA', 'AB'], 'B': ['BA']}, failures={'AB': 1})
+    log = crawler.log
+    scheduler = CrawlScheduler([crawler] * 3, [('A', 0), ('B', 0)], RetryPolicy(max_attempts=3, base=0.05, jitter=0))
+
+    async def crawl():
+        await scheduler.crawl()
+        # Only this coroutine is left: the workers were cancelled and the retry timers have fired.
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    assert asyncio.run(crawl()) == []
+    assert sorted(set(log)) == [('A', 0), ('AA', 1), ('AB', 1), ('B', 0), ('BA', 1)]
+    assert log.count(('AB', 1)) == 2
+    assert scheduler.queue_depth() == 0 and not scheduler.pending_retries
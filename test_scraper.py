@@ -0,0 +1,145 @@
+"""Checkpointed crawl against fixture_server.py: retries and resumes in process, and a kill-and-restart run."""
+import csv
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+import requests
+
+from crawlstate import CrawlState
+from dedup import LicenseIndex
+from exclusion import ExclusionIndex
+from fixture_server import FixtureServer, create_app, generate_licensees
+from retry import RetryPolicy
+from scheduler import CrawlScheduler
+from scraper import TexasLicenseeCrawler
+from writer import CsvSink, ResultWriter
+
+SCRAPER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scraper.py')
+
+# Three licensees whose results-grid rows differ only in the license number.
+NAMESAKES = [{'first': 'BQQ', 'name': 'BQQ SMITH, MD', 'license': f'Q9999{i}', 'status': 'Active',
+              'professional': 'Physician and Surgeon', 'issued': '01/02/2003', 'expired': '01/02/2030'}
+             for i in range(3)]
+
+
+def crawl(directory, base_url, *extra):
+    return subprocess.Popen([sys.executable, SCRAPER, '--base-url', base_url, '--workers', '2', '--rate', '0', *extra],
+                            cwd=directory, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def licenses(directory):
+    with open(os.path.join(directory, 'results', 'results.csv'), newline='', encoding='utf-8') as file:
+        return [row['License_Number'] for row in csv.DictReader(file)]
+
+
+def saved_rows(directory):
+    try:
+        with open(os.path.join(directory, 'results', 'results.csv'), encoding='utf-8') as file:
+            return sum(1 for _ in file) - 1
+    except FileNotFoundError:
+        return 0
+
+
+class Run:
+    """One in-process crawl over the crawl state, exclusions and output kept in the current directory."""
+
+    def __init__(self, base_url, seeds, fresh=False):
+        self.state = CrawlState('results/crawl_state.sqlite3')
+        self.exclusions = ExclusionIndex('excep/searcher.json')
+        self.writer = ResultWriter([CsvSink('results/results.csv')], flush_interval=0.05)
+        self.crawler = TexasLicenseeCrawler(seeds, 'http', base_url, state=self.state, exclusions=self.exclusions,
+                                            licenses=LicenseIndex(), writer=self.writer)
+        self.frontier = self.crawler.start_or_resume(fresh)
+        self.details = []
+        self.failures = {}  # license -> detail fetches still to fail
+        fetch_detail = self.crawler.http.fetch_detail
+
+        def failing_fetch_detail(result):
+            self.details.append(result.license)
+            if self.failures.get(result.license):
+                self.failures[result.license] -= 1
+                raise requests.ConnectionError('connection reset')
+            return fetch_detail(result)
+
+        self.crawler.http.fetch_detail = failing_fetch_detail
+
+    def crawl(self, attempts=3):
+        scheduler = CrawlScheduler([self.crawler], self.frontier, RetryPolicy(attempts, base=0, jitter=0))
+        scheduler.run()
+        self.writer.close()
+        self.exclusions.close()
+        self.state.close()
+        return scheduler
+
+
+def test_retry_keeps_licensees_who_share_a_name(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with FixtureServer(create_app(generate_licensees(50, seed=3) + NAMESAKES)) as fixture:
+        run = Run(fixture.base_url, ['BQQ'], fresh=True)
+        run.failures['Q99991'] = 1
+        scheduler = run.crawl()
+    assert scheduler.retries == 1
+    assert sorted(licenses(tmp_path)) == ['Q99990', 'Q99991', 'Q99992']
+    # The retry opened only the row that had failed.
+    assert run.details == ['Q99990', 'Q99991', 'Q99992', 'Q99991']
+
+
+def test_unfinished_prefixes_are_resumed_in_process(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    population = generate_licensees(400, seed=4) + NAMESAKES
+    with FixtureServer(create_app(population)) as fixture:
+        first = Run(fixture.base_url, ['B', 'C'], fresh=True)
+        # A detail page that keeps failing leaves its prefix unfinished after the last attempt.
+        first.failures['Q99991'] = 10
+        failed = first.crawl(attempts=2).failed
+        assert len(failed) == 1 and 'BQQ'.startswith(failed[0])
+        saved = licenses(tmp_path)
+        assert 'Q99991' not in saved and {'Q99990', 'Q99992'} <= set(saved)
+
+        second = Run(fixture.base_url, ['B', 'C'])
+        assert [prefix for prefix, _ in second.frontier] == failed
+        second.crawl()
+    resumed = licenses(tmp_path)
+    expected = {row['license'] for row in population if row['first'][0] in 'BC'}
+    assert len(resumed) == len(set(resumed))
+    assert set(resumed) == expected
+    # Only the row that never made it was opened again.
+    assert second.details == ['Q99991']
+
+    # A finished crawl is left alone.
+    third = Run(fixture.base_url, ['B', 'C'])
+    assert third.frontier == []
+    third.crawl()
+    assert sorted(licenses(tmp_path)) == sorted(resumed)
+
+
+def test_killed_crawl_resumes_without_losing_or_duplicating_rows(tmp_path):
+    clean, killed = tmp_path / 'clean', tmp_path / 'killed'
+    clean.mkdir()
+    killed.mkdir()
+    with FixtureServer(create_app(generate_licensees(1500, seed=1), latency=0.005)) as fixture:
+        assert crawl(clean, fixture.base_url).wait(timeout=600) == 0
+        expected = licenses(clean)
+        assert expected
+
+        process = crawl(killed, fixture.base_url)
+        deadline = time.monotonic() + 300
+        while saved_rows(killed) < len(expected) // 3:
+            assert process.poll() is None, 'the crawl finished before it could be killed'
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        os.kill(process.pid, signal.SIGKILL)
+        process.wait()
+
+        assert crawl(killed, fixture.base_url).wait(timeout=600) == 0
+        resumed = licenses(killed)
+        assert len(resumed) == len(set(resumed))
+        assert set(resumed) == set(expected)
+
+        # Running again after the crawl finished must not wipe its results.
+        assert crawl(killed, fixture.base_url).wait(timeout=600) == 0
+        assert sorted(licenses(killed)) == sorted(resumed)
@@ -0,0 +1,58 @@
+import string
+
+from crawlstate import CrawlState
+from splitting import FULL_PAGE, AdaptiveSplitter, PrefixPrior
+
+
+def splitter(counts=None):
+    return AdaptiveSplitter(string.ascii_uppercase, PrefixPrior(counts))
+
+
+def test_prior_orders_children_but_never_drops_them():
+    # The prior saw 60 names under BA and none under BAQ; a new BAQ* licensee must still be searched.
+    counts = {'BA': 60, 'BAR': 40, 'BAT': 20}
+    children = splitter(counts).children('BA', 60)
+    assert children[:2] == ['BAR', 'BAT']
+    assert set('BA' + letter for letter in string.ascii_uppercase) <= set(children)
+    assert 'BAQ' in children
+
+
+def test_punctuation_children_need_a_total_or_a_prior():
+    assert 'AL ' not in splitter().children('AL')
+    assert 'AL ' in splitter({'AL ': 3}).children('AL')
+    assert {'AL ', 'AL-', "AL'"} <= set(splitter().children('AL', 120))
+
+
+def test_siblings_are_skipped_once_the_page_total_is_covered():
+    split = splitter()
+    first, second, third = split.children('A', 30)[:3]
+    split.observe(first, 20)
+    assert not split.skip(second)
+    split.observe(second, 10)
+    assert split.skip(third)
+    # A retried prefix that was already counted still has to finish.
+    assert not split.skip(first)
+
+
+def test_unknown_total_keeps_every_sibling():
+    split = splitter()
+    children = split.children('A', 30)
+    split.observe(children[0], None)
+    split.observe(children[1], 30)
+    assert not split.skip(children[2])
+
+
+def test_prior_is_keyed_on_the_searched_prefix(tmp_path):
+    state = CrawlState(str(tmp_path / 'state.sqlite3'))
+    state.record_listing('AL', 1, 300)
+    state.record_listing('AL ', 2, 2, [('AL BERT SMITH', 'A1'), ('AL JONES', 'A2')])
+    state.record_listing('ALQ', 2, 0, [])
+    state.record_listing('ALB', 2, None)
+    state.close()
+
+    prior = PrefixPrior.from_state(str(tmp_path / 'state.sqlite3'))
+    assert prior.count('AL') == 300
+    assert prior.count('al ') == 2
+    assert prior.count('ALQ') == 0
+    assert prior.count('ALB') == FULL_PAGE
+    assert PrefixPrior.from_state(str(tmp_path / 'missing.sqlite3')).counts == {}
@@ -0,0 +1,87 @@
+import pytest
+import requests
+from lxml import html
+
+from fixture_server import MAX_RESULTS, FixtureServer, create_app
+from tmb_http import (DETAIL_FIELD_XPATHS, DETAIL_XPATHS, SearchPageError, TMBHttpBackend, form_state, listing_license,
+                      parse_results, result_total)
+
+
+def licensee(index, first, last='SMITH'):
+    return {'first': first, 'name': f'{first} {last}, MD', 'license': f'Q{index:05d}', 'status': 'Active',
+            'professional': 'Physician and Surgeon', 'issued': '01/02/2003', 'expired': f'03/{index % 28 + 1:02d}/2030'}
+
+
+LICENSEES = [licensee(i, 'BOB') for i in range(3)] + [licensee(10 + i, f'CAR{i:03d}') for i in range(MAX_RESULTS + 10)]
+
+
+@pytest.fixture(scope='module')
+def fixture():
+    with FixtureServer(create_app(LICENSEES)) as fixture:
+        yield fixture
+
+
+@pytest.fixture
+def backend(fixture):
+    return TMBHttpBackend(fixture.base_url)
+
+
+def test_short_list_rows_and_details(backend):
+    response = backend.search('bob')
+    assert response.total == 3
+    assert [result.license for result in response.results] == ['Q00000', 'Q00001', 'Q00002']
+    assert all(result.event_target and result.form_state['__VIEWSTATE'] for result in response.results)
+    assert response.results[1].row_text == 'BOB SMITH, MD Q00001'
+
+    detail = backend.fetch_detail(response.results[1])
+    assert detail == {'name': 'BOB SMITH, MD', 'license': 'Q00001', 'status': 'Active',
+                      'professional': 'Physician and Surgeon', 'issuance_date': '01/02/2003',
+                      'expiration_date': '03/02/2030'}
+
+
+def test_many_results_report_the_page_total(backend):
+    response = backend.search('CAR')
+    assert len(response.results) == MAX_RESULTS
+    assert response.total == MAX_RESULTS + 10
+
+
+def test_empty_search(backend):
+    response = backend.search('ZZZ')
+    assert response.results == [] and response.total is None
+
+
+def test_view_state_is_carried_through_the_postback(backend):
+    result = backend.search('BOB').results[0]
+    # The fixture rejects a postback whose __EVENTVALIDATION does not belong to its __VIEWSTATE.
+    result.form_state = dict(result.form_state, __EVENTVALIDATION='forged')
+    with pytest.raises(requests.HTTPError):
+        backend.fetch_detail(result)
+
+
+def test_page_without_view_state_is_rejected():
+    with pytest.raises(SearchPageError):
+        form_state(html.fromstring('<html><body><form></form></body></html>'))
+
+
+def test_grid_pager_links_are_not_licensees():
+    document = html.fromstring(
+        '<html><body><form><input type="hidden" name="__VIEWSTATE" value="v" /><table>'
+        '<tr><td><a href="javascript:__doPostBack(\'grid\',\'Select$0\')">ANN LEE</a></td><td>M12345</td></tr>'
+        '<tr><td><a href="javascript:__doPostBack(\'grid\',\'Page$2\')">2</a></td></tr>'
+        '</table><span>1,234 records found</span></form></body></html>')
+    response = parse_results(document, 'http://example/Search.aspx')
+    assert [(result.text, result.license) for result in response.results] == [('ANN LEE', 'M12345')]
+    assert response.total == 1234
+
+
+def test_listing_license_and_total_helpers():
+    assert listing_license('ANN LEE M12345 Active', 'ANN LEE') == 'M12345'
+    assert listing_license('ANN LEE', 'ANN LEE') is None
+    assert result_total('No records found.') is None
+
+
+def test_served_xpaths_are_the_browser_xpaths_without_tbody():
+    assert DETAIL_FIELD_XPATHS.keys() == DETAIL_XPATHS.keys()
+    for key, xpath in DETAIL_FIELD_XPATHS.items():
+        assert 'tbody' not in xpath and xpath.startswith('//form/')
+        assert xpath.replace('//tr', '/tbody/tr').replace('//form', '/html/body/form') == DETAIL_XPATHS[key]
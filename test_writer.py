@@ -0,0 +1,85 @@
+import csv
+import sqlite3
+import threading
+
+from writer import FIELDNAMES, CsvSink, ResultWriter, SqliteSink, create_sinks
+
+
+def licensee(license):
+    return {'Full_Name': 'ANN LEE', 'License_Type': 'Physician', 'License_Number': license, 'Status': 'Active',
+            'Professional': 'MD', 'Issued': '01/02/2003', 'Expired': '01/02/2030'}
+
+
+class MemorySink:
+    def __init__(self, fail=False):
+        self.rows = []
+        self.batches = 0
+        self.fail = fail
+        self.closed = False
+
+    def write(self, rows):
+        if self.fail:
+            raise OSError('disk full')
+        self.batches += 1
+        self.rows += rows
+
+    def close(self):
+        self.closed = True
+
+
+def test_callback_runs_after_every_sink_has_the_row():
+    sinks = [MemorySink(), MemorySink()]
+    seen = []
+    writer = ResultWriter(sinks, batch_size=3, flush_interval=60)
+    for i in range(6):
+        license = f'M{i}'
+        writer.put(licensee(license),
+                   lambda license=license: seen.append(all(license in [row['License_Number'] for row in sink.rows]
+                                                           for sink in sinks)))
+    writer.close()
+    assert seen == [True] * 6
+    assert [sink.batches for sink in sinks] == [2, 2]
+    assert all(sink.closed for sink in sinks)
+
+
+def test_no_callback_runs_when_a_sink_fails():
+    good, bad = MemorySink(), MemorySink(fail=True)
+    called = []
+    with ResultWriter([good, bad], batch_size=2) as writer:
+        writer.put(licensee('M1'), lambda: called.append('M1'))
+        writer.put(None, lambda: called.append('marker'))
+    assert called == []
+    assert [row['License_Number'] for row in good.rows] == ['M1']
+
+
+def test_marker_callback_waits_for_the_rows_queued_before_it():
+    sink = MemorySink()
+    done = threading.Event()
+    writer = ResultWriter([sink], batch_size=100, flush_interval=0.05)
+    writer.put(licensee('M1'))
+    writer.put(licensee('M2'))
+    writer.put(None, lambda: done.set() if len(sink.rows) == 2 else None)
+    # Flushed by the interval, long before the batch would fill.
+    assert done.wait(5)
+    writer.close()
+
+
+def test_file_sinks_hold_the_rows_when_the_callback_runs(tmp_path):
+    output = str(tmp_path / 'results.csv')
+    with open(output, 'w', newline='', encoding='utf-8') as file:
+        csv.writer(file).writerow(FIELDNAMES)
+    sinks = create_sinks(['csv', 'sqlite'], output)
+    assert [type(sink) for sink in sinks] == [CsvSink, SqliteSink]
+    found = []
+
+    def on_written():
+        with open(output, newline='', encoding='utf-8') as file:
+            in_csv = [row['License_Number'] for row in csv.DictReader(file)]
+        connection = sqlite3.connect(str(tmp_path / 'results.sqlite3'))
+        in_sqlite = [license for license, in connection.execute('SELECT License_Number FROM licensees')]
+        connection.close()
+        found.append((in_csv, in_sqlite))
+
+    with ResultWriter(sinks) as writer:
+        writer.put(licensee('M1'), on_written)
+    assert found == [(['M1'], ['M1'])]
@@ -0,0 +1,230 @@
+"""
+HTTP-only search backend for the Texas Medical Board Search.aspx page.
+
+Instead of driving a Chrome instance, this talks to the ASP.NET WebForms page
+directly: it GETs the search form, carries __VIEWSTATE / __EVENTVALIDATION
+through every postback, and parses the results grid and detail page with lxml.
+
+Requirements:
+pip install requests lxml
+"""
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urljoin
+
+import requests
+from lxml import html
+from requests.adapters import HTTPAdapter
+
+from latency import timed
+
+logger = logging.getLogger(__name__)
+
+FIRST_NAME_FIELD = 'ctl00$BodyContent$tbFirstName'
+LICENSE_TYPE_FIELD = 'ctl00$BodyContent$ddLicenseType'
+SEARCH_BUTTON_FIELD = 'ctl00$BodyContent$btnSearch'
+
+# Detail fields as the browser DOM lays them out; waits.py reads these through Selenium.
+DETAIL_XPATHS = {
+    'name': '/html/body/form/div[2]/div[2]/div[1]/table/tbody/tr[1]/td/label[2]',
+    'license': '/html/body/form/div[2]/div[2]/div[1]/table/tbody/tr[2]/td/label[2]',
+    'status': '/html/body/form/div[2]/div[2]/div[1]/table/tbody/tr[4]/td/label[2]',
+    'professional': '/html/body/form/div[2]/div[2]/div[1]/div[2]/div[2]/div/table/tbody/tr[3]/td/label[3]',
+    'issuance_date': '/html/body/form/div[2]/div[2]/div[1]/div[2]/div[2]/div/table/tbody/tr[4]/td/label[2]',
+    'expiration_date': '/html/body/form/div[2]/div[2]/div[1]/div[2]/div[2]/div/table/tbody/tr[5]/td/label[2]',
+}
+# The same fields in the served HTML, which has no tbody elements (browsers insert them) and may
+# carry markup before <form>.
+DETAIL_FIELD_XPATHS = {key: xpath.replace('/html/body/form', '//form').replace('/tbody/', '//')
+                       for key, xpath in DETAIL_XPATHS.items()}
+
+POSTBACK_RE = re.compile(r"__doPostBack\('([^']*)','([^']*)'\)")
+LICENSE_RE = re.compile(r'\b[A-Z]{1,2}\d{4,7}\b')
+# Statuses with which the site asks us to slow down rather than reporting a broken page.
+THROTTLE_STATUSES = (429, 503)
+RESULT_COUNT_RE = re.compile(r'(\d[\d,]*)\s+(?:records?|results?|matches)', re.IGNORECASE)
+
+
+class SearchPageError(Exception):
+    """Raised when a Search.aspx response does not look like the page we expect."""
+
+
+@dataclass
+class SearchResult:
+    """One row of the results grid, with everything needed to open its detail page."""
+    text: str
+    href: str = None
+    event_target: str = None
+    event_argument: str = None
+    form_state: dict = field(default_factory=dict, repr=False)
+    page_url: str = None
+    row_text: str = ''
+    license: str = None
+
+
+@dataclass
+class SearchResponse:
+    """The rows of a results grid plus the total count the page reports, if any."""
+    results: list
+    total: int = None
+
+
+def form_state(document):
+    """Collect every hidden ASP.NET state field (__VIEWSTATE, __EVENTVALIDATION, ...) from a page."""
+    state = {}
+    for element in document.xpath('//input[@type="hidden"][@name]'):
+        state[element.get('name')] = element.get('value', '')
+    if '__VIEWSTATE' not in state:
+        raise SearchPageError('Page has no __VIEWSTATE field.')
+    return state
+
+
+def license_type_value(document, label='Physician'):
+    """Return the option value of the license type dropdown whose text starts with label."""
+    for option in document.xpath(f'//select[@name="{LICENSE_TYPE_FIELD}"]/option'):
+        if option.text_content().strip().startswith(label):
+            return option.get('value', option.text_content().strip())
+    return label
+
+
+def listing_license(row_text, name_text=''):
+    """Return the license number shown in a results grid row next to the name, if the grid has one."""
+    match = LICENSE_RE.search(row_text.replace(name_text, ' ', 1))
+    return match.group(0) if match else None
+
+
+def throttled(error):
+    """Whether a request error means the site is throttling us, so a retry later beats a fallback now."""
+    response = getattr(error, 'response', None)
+    return response is not None and response.status_code in THROTTLE_STATUSES
+
+
+def result_total(text):
+    """Return the total result count a results page reports (e.g. '153 records found'), or None."""
+    count = RESULT_COUNT_RE.search(text)
+    return int(count.group(1).replace(',', '')) if count else None
+
+
+def parse_results(document, page_url):
+    """Parse the results grid ('tr td a' links) into SearchResult rows."""
+    state = form_state(document)
+    results = []
+    for link in document.xpath('//tr/td//a'):
+        text = link.text_content().strip()
+        if not text:
+            continue
+        href = link.get('href', '')
+        row = link.xpath('ancestor::tr[1]')
+        # Cells joined by whitespace, as the browser's innerText shows them, so both backends key a row alike.
+        row_text = ' '.join(' '.join(row[0].itertext()).split()) if row else text
+        listing = {'page_url': page_url, 'row_text': row_text, 'license': listing_license(row_text, text)}
+        match = POSTBACK_RE.search(href)
+        if match:
+            if match.group(2).startswith('Page$'):
+                continue  # Grid pager, not a licensee.
+            results.append(SearchResult(text, event_target=match.group(1), event_argument=match.group(2),
+                                        form_state=state, **listing))
+        elif href:
+            results.append(SearchResult(text, href=urljoin(page_url, href), **listing))
+
+    # text_content() runs adjacent cells together, which would glue a grid's digits onto the count.
+    return SearchResponse(results, result_total(' '.join(document.itertext())))
+
+
+def parse_detail(document):
+    """Extract the six detail fields from a licensee detail page in a single parse."""
+    detail = {}
+    for key, xpath in DETAIL_FIELD_XPATHS.items():
+        found = document.xpath(xpath)
+        if not found:
+            raise SearchPageError(f'Detail page is missing field {key!r}.')
+        detail[key] = found[0].text_content().strip()
+    return detail
+
+
+class TMBHttpBackend:
+    """
+    Drives Search.aspx over plain HTTP with one pooled requests.Session per thread.
+
+    The session cookie ties the postback chain together, so every thread keeps its own
+    session while sharing the same connection pool sizing. Pass a replay.PageArchive as
+    `recorder` to keep a copy of every form, results and detail page for offline replay.
+    """
+
+    def __init__(self, base_url, license_type='Physician', timeout=30, pool_size=10, rate_limiter=None, recorder=None):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.rate_limiter = rate_limiter
+        self.license_type = license_type
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers['User-Agent'] = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0 Safari/537.36'
+            self._local.session = session
+        return session
+
+    def _request(self, method, url, **kwargs):
+        if self.rate_limiter is None:
+            return self.session.request(method, url, timeout=self.timeout, **kwargs)
+        self.rate_limiter.acquire(url)
+        start = time.perf_counter()
+        ok = False
+        try:
+            response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            ok = response.status_code < 500 and response.status_code not in THROTTLE_STATUSES
+            return response
+        finally:
+            # Latency and errors feed the adaptive limiter's backoff.
+            self.rate_limiter.release(url, time.perf_counter() - start, ok)
+
+    def _document(self, response):
+        response.raise_for_status()
+        return html.fromstring(response.content, base_url=response.url)
+
+    def search(self, prefix):
+        """Run one search postback for prefix and return the parsed results grid."""
+        with timed('search_submit'):
+            response = self._request('GET', self.base_url)
+            document = self._document(response)
+            if self.recorder is not None:
+                self.recorder.form(response.text)
+            payload = form_state(document)
+            payload.update({
+                FIRST_NAME_FIELD: prefix,
+                LICENSE_TYPE_FIELD: license_type_value(document, self.license_type),
+                SEARCH_BUTTON_FIELD: 'Search',
+            })
+            response = self._request('POST', response.url, data=payload)
+        with timed('grid_render'):
+            document = self._document(response)
+            if self.recorder is not None:
+                self.recorder.search(prefix, response.text)
+            return parse_results(document, response.url)
+
+    def fetch_detail(self, result):
+        """Open a result row's detail page and return its raw field texts."""
+        with timed('detail_load'):
+            if result.event_target:
+                payload = dict(result.form_state)
+                payload['__EVENTTARGET'] = result.event_target
+                payload['__EVENTARGUMENT'] = result.event_argument
+                response = self._request('POST', result.page_url, data=payload)
+            else:
+                response = self._request('GET', result.href)
+            document = self._document(response)
+            if self.recorder is not None:
+                self.recorder.detail(result.row_text or result.text, response.text)
+        with timed('field_extract'):
+            return parse_detail(document)
@@ -0,0 +1,66 @@
+"""
+Event-driven wait conditions for the Selenium path.
+
+Instead of sleeping a fixed two seconds after every interaction, each step waits for
+the thing it actually needs: the old document going stale after a postback, the
+results grid (or the empty-result page) finishing rendering, or the detail labels
+appearing. Detail fields are then read in a single JavaScript pass over the DOM.
+"""
+from selenium.common.exceptions import StaleElementReferenceException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from tmb_http import DETAIL_XPATHS
+
+EXTRACT_SCRIPT = """
+const xpaths = arguments[0];
+const values = {};
+for (const [key, xpath] of Object.entries(xpaths)) {
+    const node = document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    if (node === null) { return null; }
+    values[key] = node.innerText.trim();
+}
+return values;
+"""
+
+
+def document_ready(driver):
+    return driver.execute_script('return document.readyState') == 'complete'
+
+
+def causes_postback(element):
+    """True if changing this input submits the form (ASP.NET AutoPostBack)."""
+    return '__doPostBack' in (element.get_attribute('onchange') or '')
+
+
+def wait_for_postback(driver, old_element, timeout=30):
+    """Block until the document holding old_element has been replaced and the new one has loaded."""
+    WebDriverWait(driver, timeout).until(EC.staleness_of(old_element))
+    WebDriverWait(driver, timeout).until(document_ready)
+
+
+def results_rendered(driver):
+    """
+    Wait condition for the results page: returns a 1-tuple holding the grid links (possibly
+    empty once the page has fully loaded without a grid), or False while still loading.
+    """
+    try:
+        if not document_ready(driver):
+            return False
+        return (driver.find_elements(By.CSS_SELECTOR, 'tr td a'),)
+    except StaleElementReferenceException:
+        return False
+
+
+def wait_for_results(driver, timeout=30):
+    return WebDriverWait(driver, timeout).until(results_rendered)[0]
+
+
+def detail_fields(driver):
+    """Wait condition for the detail page: every field's text in one DOM pass, or None while missing."""
+    return driver.execute_script(EXTRACT_SCRIPT, DETAIL_XPATHS)
+
+
+def wait_for_detail(driver, timeout=10):
+    return WebDriverWait(driver, timeout).until(detail_fields)
@@ -0,0 +1,235 @@
+"""
+Crawl worker for distributed mode: leases prefixes from coordinator.py and scrapes them.
+
+Each worker thread holds its own TexasLicenseeCrawler (HTTP with Selenium fallback, or
+Selenium only) and loops: lease a prefix, search it, and report back. A MANY prefix is
+reported with its result total and the coordinator decides the children. For a short
+list, the listing's licenses are checked with the coordinator first, and only the
+unknown ones get their detail pages fetched. The rows go back in the same completion
+call. A heartbeat thread keeps the leases in flight alive. A prefix that fails is
+released so another worker can retry it.
+
+Run several of these, on one host or many, against one coordinator:
+
+    python coordinator.py --port 5050
+    python worker.py --coordinator http://coordinator-host:5050 --threads 3
+"""
+import argparse
+import logging
+import os
+import shutil
+import socket
+import string
+import tempfile
+import threading
+import time
+
+import requests
+
+from coordinator import OUTCOME_EMPTY, OUTCOME_FEW, OUTCOME_MANY
+from crawlstate import CrawlState
+from dedup import LicenseIndex
+from driverpool import DriverPool
+from exclusion import ExclusionIndex
+from ratelimit import AdaptiveRateLimiter
+from scraper import TexasLicenseeCrawler
+from splitting import AdaptiveSplitter
+from tmb_http import listing_license
+from writer import ResultWriter
+
+logger = logging.getLogger(__name__)
+
+
+class CoordinatorUnavailable(Exception):
+    """The coordinator could not be reached even after retrying."""
+
+
+class CoordinatorClient:
+    """
+    JSON client for the coordinator API, retrying transport errors with backoff.
+
+    Every call is safe to repeat: completions are deduplicated by lease id on the coordinator.
+    """
+
+    def __init__(self, url, timeout=30, retries=6):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        # Worker threads share the client; requests.Session is not thread-safe, so each thread gets its own.
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _call(self, method, path, payload=None):
+        for attempt in range(self.retries):
+            try:
+                response = self.session.request(method, self.url + path, json=payload, timeout=self.timeout)
+                if response.status_code < 500:
+                    return response.json()
+                logger.warning(f"Coordinator {path} returned {response.status_code}")
+            except requests.RequestException as e:
+                logger.warning(f"Coordinator {path} failed: {e}")
+            time.sleep(min(30, 0.5 * 2 ** attempt))
+        raise CoordinatorUnavailable(f'Coordinator unreachable at {self.url}')
+
+    def lease(self, worker, count=1):
+        return self._call('POST', '/lease', {'worker': worker, 'count': count})
+
+    def extend(self, lease_ids):
+        return self._call('POST', '/extend', {'lease_ids': list(lease_ids)})['held']
+
+    def release(self, lease_id):
+        self._call('POST', '/release', {'lease_id': lease_id})
+
+    def known(self, licenses):
+        return set(self._call('POST', '/known', {'licenses': list(licenses)})['known'])
+
+    def complete(self, lease_id, prefix, outcome, total=None, records=()):
+        return self._call('POST', '/complete', {'lease_id': lease_id, 'prefix': prefix, 'outcome': outcome,
+                                                'total': total, 'records': list(records)})['status']
+
+    def status(self):
+        return self._call('GET', '/status')
+
+
+class CrawlWorker:
+    """
+    One lease-search-report loop around a crawler.
+
+    :param client: CoordinatorClient shared by the worker threads of this process.
+    :param crawler: TexasLicenseeCrawler used only for its search and detail backends.
+    :param name: Worker id recorded on the coordinator's leases.
+    :param heartbeat: Seconds between lease extensions while a prefix is in flight.
+    :param poll_interval: Seconds to wait when the coordinator has nothing to lease yet.
+    """
+
+    def __init__(self, client, crawler, name, heartbeat=20, poll_interval=0.25):
+        self.client = client
+        self.crawler = crawler
+        self.name = name
+        self.heartbeat = heartbeat
+        self.poll_interval = poll_interval
+        self.held = set()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.prefixes = 0
+        self.records = 0
+
+    def _keep_alive(self):
+        while not self.stopped.wait(self.heartbeat):
+            with self.lock:
+                held = list(self.held)
+            if held:
+                try:
+                    self.client.extend(held)
+                except CoordinatorUnavailable:
+                    logger.warning("Lease heartbeat failed")
+
+    def scrape(self, prefix):
+        """Search prefix and return (outcome, total, records)."""
+        response = self.crawler.searchResults(prefix)
+        results = response.results
+        if not results:
+            return OUTCOME_EMPTY, 0, []
+        if len(results) >= 50:
+            return OUTCOME_MANY, response.total, []
+        listing = [(user, listing_license(self.crawler.listing_row_key(user), user.text.strip())) for user in results]
+        known = self.client.known(license for _, license in listing if license)
+        records = []
+        for user, license in listing:
+            if license and license in known:
+                continue
+            records.append(self.crawler.record_fields(**self.crawler.fetch_detail(user)))
+        return OUTCOME_FEW, len(results), records
+
+    def work(self, lease):
+        prefix, lease_id = lease['prefix'], lease['lease_id']
+        with self.lock:
+            self.held.add(lease_id)
+        try:
+            outcome, total, records = self.scrape(prefix)
+            status = self.client.complete(lease_id, prefix, outcome, total, records)
+            if status == 'lost':
+                logger.warning(f"Lease on {prefix!r} expired before it was completed; another worker has it")
+            else:
+                self.prefixes += 1
+                self.records += len(records)
+                logger.info(f"{prefix}: {outcome} ({len(records)} records)")
+        except CoordinatorUnavailable:
+            raise
+        except Exception:
+            logger.exception(f"Prefix {prefix!r} failed; releasing it for retry")
+            self.client.release(lease_id)
+        finally:
+            with self.lock:
+                self.held.discard(lease_id)
+            self.crawler.release_driver()
+
+    def run(self):
+        """Work until the coordinator reports the crawl finished."""
+        heartbeat = threading.Thread(target=self._keep_alive, name=f'{self.name}-heartbeat', daemon=True)
+        heartbeat.start()
+        try:
+            while True:
+                reply = self.client.lease(self.name)
+                if reply['leases']:
+                    for lease in reply['leases']:
+                        self.work(lease)
+                elif reply['finished']:
+                    break
+                else:
+                    # Everything left is leased to other workers; one of them may still expand it.
+                    time.sleep(self.poll_interval)
+        finally:
+            self.stopped.set()
+        logger.info(f"Worker {self.name} done: {self.prefixes} prefixes, {self.records} records")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Lease and scrape prefixes for a coordinator.py crawl.')
+    parser.add_argument('--coordinator', required=True, help='coordinator URL, e.g. http://10.0.0.5:5050')
+    parser.add_argument('--name', default=f'{socket.gethostname()}-{os.getpid()}', help='worker id shown in leases')
+    parser.add_argument('--threads', type=int, default=1, help='crawlers in this process')
+    parser.add_argument('--backend', choices=['http', 'selenium'], default='http')
+    parser.add_argument('--base-url', default=None, help='Search.aspx URL override, e.g. a local fixture_server.py')
+    parser.add_argument('--rate', type=float, default=5.0, help='starting requests per second from this process, adapted to the site\'s health (0 = unlimited)')
+    parser.add_argument('--browsers', type=int, default=None, help='Chrome session pool size (default: one per thread)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    client = CoordinatorClient(args.coordinator)
+    rate_limiter = AdaptiveRateLimiter(args.rate, args.threads)
+    driver_pool = DriverPool(args.browsers or args.threads, prewarm=args.backend == 'selenium')
+    # The coordinator owns the frontier, exclusions and dedup; the crawler's own copies are throwaway.
+    scratch = tempfile.mkdtemp(prefix='tmb-worker-')
+    state = CrawlState(os.path.join(scratch, 'crawl_state.sqlite3'))
+    exclusions = ExclusionIndex(os.path.join(scratch, 'searcher.json'))
+    writer = ResultWriter([])
+    workers = []
+    for index in range(args.threads):
+        crawler = TexasLicenseeCrawler([], args.backend, args.base_url, rate_limiter, AdaptiveSplitter(string.ascii_uppercase),
+                                       exclusions, state, LicenseIndex(), writer, driver_pool)
+        workers.append(CrawlWorker(client, crawler, f'{args.name}-{index}'))
+    threads = [threading.Thread(target=worker.run, name=worker.name) for worker in workers]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        for worker in workers:
+            worker.crawler.close()
+        driver_pool.close()
+        writer.close()
+        exclusions.close()
+        state.close()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
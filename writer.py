@@ -0,0 +1,243 @@
+"""
+Buffered result writer with pluggable sinks.
+
+Crawler workers hand finished records to ResultWriter.put(), which only enqueues them.
+A single background thread drains the queue, groups records into batches, and flushes
+a batch to every sink once it reaches `batch_size` rows or has waited `flush_interval`
+seconds. Each sink keeps its file or connection open for the whole run and fsyncs on
+close. Callbacks passed to put() run after the batch holding their row is written, so
+checkpoints never get ahead of the output.
+
+Sinks:
+- CsvSink: the results.csv the viewer reads.
+- ParquetSink: columnar part files with typed Issued/Expired dates (needs pyarrow).
+- SqliteSink: a licensees table keyed by License_Number.
+- StoreSink: the indexed licensestore.LicenseStore the crawler and the viewer query.
+"""
+import csv
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+FIELDNAMES = ["Full_Name", "License_Type", "License_Number", "Status", "Professional", "Issued", "Expired"]
+DATE_FIELDS = ("Issued", "Expired")
+
+
+def parse_date(value):
+    """Parse the site's MM/DD/YYYY dates; anything else becomes None."""
+    try:
+        return datetime.strptime(value.strip(), '%m/%d/%Y').date()
+    except (AttributeError, ValueError):
+        return None
+
+
+def iso_date(value):
+    date = parse_date(value)
+    return date.isoformat() if date else None
+
+
+class CsvSink:
+    """Append rows to a CSV file through one long-lived handle."""
+
+    def __init__(self, path, fieldnames=FIELDNAMES):
+        self.path = path
+        self.file = open(path, 'a', newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self.file, fieldnames=fieldnames)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        # Flush each batch so readers tailing the file see it without waiting for close.
+        self.file.flush()
+
+    def close(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+
+class ParquetSink:
+    """
+    Write each run as a Parquet part file under a dataset directory.
+
+    Issued/Expired are stored as date32 and the low-cardinality columns are dictionary
+    encoded, so readers get typed columns without re-parsing strings.
+    """
+
+    def __init__(self, directory):
+        if pa is None:
+            raise ImportError('ParquetSink requires pyarrow: pip install pyarrow')
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f'part-{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}.parquet')
+        self.schema = pa.schema([(name, pa.date32() if name in DATE_FIELDS else pa.string()) for name in FIELDNAMES])
+        self.writer = pq.ParquetWriter(self.path, self.schema, compression='zstd',
+                                       use_dictionary=['License_Type', 'Status', 'Professional'])
+
+    def write(self, rows):
+        columns = {name: [parse_date(row.get(name)) if name in DATE_FIELDS else row.get(name) for row in rows]
+                   for name in FIELDNAMES}
+        self.writer.write_table(pa.table(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+        with open(self.path, 'rb') as file:
+            os.fsync(file.fileno())
+
+
+class SqliteSink:
+    """Upsert rows into a licensees table keyed by License_Number, with ISO dates."""
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS licensees ('
+            'License_Number TEXT PRIMARY KEY, Full_Name TEXT, License_Type TEXT, Status TEXT, '
+            'Professional TEXT, Issued DATE, Expired DATE)')
+
+    def write(self, rows):
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO licensees (License_Number, Full_Name, License_Type, Status, Professional, Issued, Expired) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(row["License_Number"], row["Full_Name"], row["License_Type"], row["Status"], row["Professional"],
+                  iso_date(row["Issued"]), iso_date(row["Expired"])) for row in rows])
+
+    def close(self):
+        self.connection.execute('PRAGMA wal_checkpoint(FULL)')
+        self.connection.close()
+
+
+class StoreSink:
+    """Add rows to a LicenseStore. The store outlives the writer (the crawler still queries it), so close() only checkpoints it."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def write(self, rows):
+        self.store.add(rows)
+
+    def close(self):
+        self.store.checkpoint()
+
+
+_STOP = object()
+
+
+class ResultWriter:
+    """
+    Background stage that batches records and writes them to every sink.
+
+    :param sinks: Objects with write(rows) and close().
+    :param batch_size: Flush once this many rows are waiting.
+    :param flush_interval: Flush rows that have waited this many seconds.
+    :param max_pending: Queue size at which put() blocks, so a slow sink applies backpressure.
+    """
+
+    def __init__(self, sinks, batch_size=500, flush_interval=2.0, max_pending=10000):
+        self.sinks = sinks
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.written = 0
+        self.thread = threading.Thread(target=self._run, name='result-writer', daemon=True)
+        self.thread.start()
+
+    def put(self, row, on_written=None):
+        """
+        Queue a row for writing.
+
+        :param row: Record dict, or None to only queue on_written behind the rows already queued.
+        :param on_written: Called from the writer thread once the row's batch has been written.
+        """
+        self.queue.put((row, on_written))
+
+    def _flush(self, batch):
+        rows = [row for row, _ in batch if row is not None]
+        failed = False
+        if rows:
+            for sink in self.sinks:
+                try:
+                    sink.write(rows)
+                except Exception:
+                    failed = True
+                    logger.exception(f"Writing {len(rows)} rows to {type(sink).__name__} failed")
+            self.written += len(rows)
+        if failed:
+            # Leave the checkpoints unrecorded so a resumed crawl redoes these rows.
+            return
+        for _, on_written in batch:
+            if on_written is not None:
+                try:
+                    on_written()
+                except Exception:
+                    logger.exception("Writer callback failed")
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if batch else None
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                break
+            if item is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+            if len(batch) >= self.batch_size or (batch and time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+
+    def close(self):
+        """Flush everything still queued, then fsync and close every sink."""
+        if self.thread.is_alive():
+            self.queue.put(_STOP)
+            self.thread.join()
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception:
+                logger.exception(f"Closing {type(sink).__name__} failed")
+        logger.info(f"Result writer closed after {self.written} rows")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def create_sinks(formats, output_file='results/results.csv', store=None):
+    """
+    Build sinks for a list of format names ('csv', 'parquet', 'sqlite') next to output_file.
+
+    :param store: LicenseStore to keep in step with the output as well, if any.
+    """
+    base = os.path.splitext(output_file)[0]
+    factories = {
+        'csv': lambda: CsvSink(output_file),
+        'parquet': lambda: ParquetSink(base + '_parquet'),
+        'sqlite': lambda: SqliteSink(base + '.sqlite3'),
+    }
+    sinks = [factories[name]() for name in formats]
+    if store is not None:
+        sinks.append(StoreSink(store))
+    return sinks